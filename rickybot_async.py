@@ -0,0 +1,113 @@
+# the asyncio engine for the add follows lambda. the network calls (feed pages, likes pages, image downloads, applyWrites batches) run as tasks on an
+# event loop with atproto's AsyncClient, while the lambda still makes every follow/like decision in feed order on its own thread
+import asyncio
+import threading
+import logging
+
+logger = logging.getLogger()
+
+# how many of each kind of call can be in flight at once. the rate limiter still paces all of them against the same budget as the sync client
+FEED_CONCURRENCY = 2
+LIKES_CONCURRENCY = 4
+WRITES_CONCURRENCY = 2
+
+
+class AsyncBluesky:
+	"""an atproto AsyncClient running on an event loop in a background thread, picked up from the sync client's session so it doesn't log in again.
+
+	submit() starts a coroutine on the loop and hands back a concurrent.futures.Future, run() waits for it, and iterate() walks an async generator
+	(like paginate_pages_async) from the calling thread, so the pages it prefetches come in while the caller is busy with the last one.
+	the calls themselves go through get_feed, get_likes and apply_writes, each behind its own semaphore.
+	prefetch_likes() starts the first page of likes on a post early, and get_likes hands that page back when it's asked for.
+
+	close() gives the (possibly refreshed) session back to the sync client and stops the loop.
+	"""
+	def __init__(self, client, rate_limiter=None):
+		from atproto import AsyncClient
+		self.sync_client = client
+		self.loop = asyncio.new_event_loop()
+		self.thread = threading.Thread(target=self.loop.run_forever, name='rickybot-asyncio', daemon=True)
+		self.thread.start()
+		self.client = AsyncClient()
+		if rate_limiter is not None:
+			rate_limiter.attach_async(self.client)
+		try:
+			# no profile lookup, we already have it from the sync client's login
+			self.run(self.client.login(session_string=client.export_session_string(), fetch_bsky_profile=False))
+		except Exception:
+			self.stop()
+			raise
+		self.client.me = client.me
+		self.semaphores = self.run(self.make_semaphores())
+		self.early_likes = {} # (post uri, limit) -> future of the first page of likes
+		self.closed = False
+
+	async def make_semaphores(self):
+		return {
+			'feed': asyncio.Semaphore(FEED_CONCURRENCY),
+			'likes': asyncio.Semaphore(LIKES_CONCURRENCY),
+			'writes': asyncio.Semaphore(WRITES_CONCURRENCY)
+		}
+
+	def submit(self, coroutine):
+		return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+	def run(self, coroutine):
+		return self.submit(coroutine).result()
+
+	def iterate(self, async_generator):
+		# the sync side of an async generator. leaving the loop early closes it, which cancels whatever it had in flight
+		try:
+			while True:
+				try:
+					yield self.run(async_generator.__anext__())
+				except StopAsyncIteration:
+					return
+		finally:
+			if not self.closed:
+				self.run(async_generator.aclose())
+
+	async def bounded(self, kind, make_call):
+		async with self.semaphores[kind]:
+			return await make_call()
+
+	async def get_feed(self, params):
+		return await self.bounded('feed', lambda: self.client.app.bsky.feed.get_feed(params, headers={}))
+
+	async def get_likes(self, uri, limit, cursor=None):
+		early = self.early_likes.pop((uri, limit), None) if cursor is None else None
+		if early is not None:
+			return await asyncio.wrap_future(early)
+		return await self.bounded('likes', lambda: self.client.get_likes(uri=uri, limit=limit, cursor=cursor))
+
+	def prefetch_likes(self, uri, limit):
+		# can be called from any thread. the page is only used if get_likes asks for exactly this first page
+		if not self.closed and (uri, limit) not in self.early_likes:
+			self.early_likes[(uri, limit)] = self.submit(self.bounded('likes', lambda: self.client.get_likes(uri=uri, limit=limit)))
+
+	async def apply_writes(self, data):
+		return await self.bounded('writes', lambda: self.client.com.atproto.repo.apply_writes(data))
+
+	def close(self):
+		if self.closed:
+			return
+		self.closed = True
+		for future in self.early_likes.values():
+			future.cancel()
+		self.early_likes.clear()
+		try:
+			# the async client may have refreshed the session, which retires the refresh token the sync client has
+			me = self.sync_client.me
+			self.sync_client.login(session_string=self.client.export_session_string(), fetch_bsky_profile=False)
+			self.sync_client.me = me
+		except Exception as e:
+			logger.warning(f'WARNING - failed to hand the asyncio session back to the sync client: {repr(e)}: {e}')
+		self.stop()
+
+	def stop(self):
+		try:
+			self.run(self.client.request.close())
+		finally:
+			self.loop.call_soon_threadsafe(self.loop.stop)
+			self.thread.join()
+			self.loop.close()
@@ -0,0 +1,174 @@
+# the follows each add follows run made, kept in their own dynamodb table until the aggregator rolls the day up into s3.
+# a cohort (the weekday key, FRI+SAT for both friday and saturday) is one partition, and each run's follows are split into chunk items under it
+# sorted by run timestamp, so a day can hold any number of runs and follows, and the aggregator reads it back a page at a time with query.
+# the rolled up cohort goes into s3 as a compact object: a small header and block index, then blocks of newline separated dids that are each
+# zlib compressed, so the delete lambda can range get just the blocks it's going to work through instead of the whole week's list
+import json
+import struct
+import zlib
+import logging
+
+logger = logging.getLogger()
+
+FOLLOWS_TABLE = 'rickybot-follows' # partition key COHORT_KEY (string), sort key RUN_KEY (string)
+COHORT_KEY = 'COHORT'
+RUN_KEY = 'RUN' # <run timestamp>#<chunk number>
+DIDS_ATTRIBUTE = 'DIDS' # string set of the dids followed
+CHUNK_SIZE = 2000 # dids per item, about 70KB, well under dynamodb's 400KB item limit
+
+COHORT_MAGIC = b'RBCO'
+COHORT_VERSION = 1
+BLOCK_DIDS = 1000 # dids per compressed block in the s3 object, about 35KB before compression
+HEADER = struct.Struct('>4sBIII') # magic, version, did count, dids per block, block count
+BLOCK_ENTRY = struct.Struct('>QI') # where the block starts in the object, and its compressed length
+HEADER_READ = 4096 # bytes asked for on the first range get, the whole block index up to 500 blocks (500k dids)
+COHORT_CONTENT_TYPE = 'application/octet-stream'
+
+
+def run_key(run_timestamp, chunk):
+	# zero padded so a run's chunks sort in order after its timestamp
+	return f'{run_timestamp}#{chunk:04d}'
+
+
+def run_of(key):
+	return key.rpartition('#')[0]
+
+
+def write_run(table, cohort, run_timestamp, dids, chunk_size=CHUNK_SIZE):
+	"""stores a run's followed dids as chunk items under the cohort's partition, with batch writes.
+
+	writing the same run again puts the same chunks over the old ones.
+
+	Returns:
+		how many chunk items were written
+	"""
+	dids = sorted(dids)
+	chunk_size = max(1, chunk_size)
+	chunks = [dids[start : start + chunk_size] for start in range(0, len(dids), chunk_size)]
+	# batch_writer sends them 25 at a time and resends whatever dynamodb hands back unprocessed
+	with table.batch_writer() as batch:
+		for chunk, chunk_dids in enumerate(chunks):
+			batch.put_item(Item={COHORT_KEY: cohort, RUN_KEY: run_key(run_timestamp, chunk), DIDS_ATTRIBUTE: set(chunk_dids)})
+	return len(chunks)
+
+
+def query_cohort(table, cohort):
+	# yields the cohort's chunk items, a query page at a time until there's no LastEvaluatedKey
+	query = {
+			'KeyConditionExpression': '#cohort = :cohort',
+			'ExpressionAttributeNames': {'#cohort': COHORT_KEY},
+			'ExpressionAttributeValues': {':cohort': cohort},
+	}
+	while True:
+		response = table.query(**query)
+		for item in response.get('Items', []):
+			yield item
+		if 'LastEvaluatedKey' not in response:
+			return
+		query['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def read_cohort(table, cohort):
+	"""every did followed in the cohort's runs.
+
+	Returns:
+		(set of dids, set of run timestamps, [keys of the chunk items] to hand to delete_cohort once the dids are safe somewhere else)
+	"""
+	dids = set()
+	runs = set()
+	keys = []
+	for item in query_cohort(table, cohort):
+		dids.update(item.get(DIDS_ATTRIBUTE, ()))
+		runs.add(run_of(item[RUN_KEY]))
+		keys.append({COHORT_KEY: item[COHORT_KEY], RUN_KEY: item[RUN_KEY]})
+	return dids, runs, keys
+
+
+def delete_cohort(table, keys):
+	# deletes the chunk items read_cohort handed back, with batch writes
+	with table.batch_writer() as batch:
+		for key in keys:
+			batch.delete_item(Key=key)
+
+
+def encode_cohort(dids, block_dids=BLOCK_DIDS):
+	"""packs the dids into the compact cohort object format. they keep the order they're handed in, offsets into the object count from there.
+
+	Returns:
+		the object's bytes
+	"""
+	dids = list(dids)
+	block_dids = max(1, block_dids)
+	blocks = [zlib.compress('\n'.join(dids[start : start + block_dids]).encode(), 9) for start in range(0, len(dids), block_dids)]
+	offset = HEADER.size + BLOCK_ENTRY.size * len(blocks)
+	index = []
+	for block in blocks:
+		index.append(BLOCK_ENTRY.pack(offset, len(block)))
+		offset += len(block)
+	return HEADER.pack(COHORT_MAGIC, COHORT_VERSION, len(dids), block_dids, len(blocks)) + b''.join(index) + b''.join(blocks)
+
+
+class CohortObject:
+	"""a cohort object in s3, read with range gets.
+
+	opening it reads the header and block index, and dids(offset) reads blocks from there on only as they're iterated, so stopping partway
+	through never downloads the rest. the last block read is kept, since picking up from an offset usually starts in the block that was just
+	finished. objects from before the compact format (a json list) are read whole and work the same way.
+	"""
+	def __init__(self, s3, bucket, key, header_read=HEADER_READ):
+		self.s3 = s3
+		self.bucket = bucket
+		self.key = key
+		self.bytes_read = 0
+		self.requests = 0
+		self.legacy = None
+		self.blocks = []
+		self.last_block = (None, [])
+		data = self.get(0, header_read - 1)
+		if data[ : len(COHORT_MAGIC)] != COHORT_MAGIC:
+			# written before the compact format
+			self.legacy = json.loads(self.get())
+			self.count = len(self.legacy)
+			self.block_dids = max(1, self.count)
+			return
+		magic, version, self.count, self.block_dids, block_count = HEADER.unpack_from(data)
+		if version > COHORT_VERSION:
+			raise ValueError(f'cohort object {key} is version {version}, this only reads up to version {COHORT_VERSION}')
+		index_end = HEADER.size + BLOCK_ENTRY.size * block_count
+		if len(data) < index_end:
+			data += self.get(len(data), index_end - 1)
+		self.blocks = [BLOCK_ENTRY.unpack_from(data, HEADER.size + BLOCK_ENTRY.size * i) for i in range(block_count)]
+
+	def __len__(self):
+		return self.count
+
+	def get(self, start=None, end=None):
+		self.requests += 1
+		if start is None:
+			response = self.s3.get_object(Bucket=self.bucket, Key=self.key)
+		else:
+			response = self.s3.get_object(Bucket=self.bucket, Key=self.key, Range=f'bytes={start}-{end}')
+		data = response['Body'].read()
+		self.bytes_read += len(data)
+		return data
+
+	def block(self, number):
+		if self.last_block[0] != number:
+			offset, length = self.blocks[number]
+			data = zlib.decompress(self.get(offset, offset + length - 1)).decode()
+			self.last_block = (number, data.split('\n') if len(data) > 0 else [])
+		return self.last_block[1]
+
+	def dids(self, offset=0):
+		# yields the dids from offset to the end, a block at a time
+		if self.legacy is not None:
+			yield from self.legacy[offset : ]
+			return
+		number, skip = divmod(max(0, offset), self.block_dids)
+		while number < len(self.blocks):
+			yield from self.block(number)[skip : ]
+			skip = 0
+			number += 1
+
+	def report(self):
+		return f'{self.bytes_read} bytes in {self.requests} s3 gets'
@@ -0,0 +1,129 @@
+# schedules the liker dives in the add follows lambda. instead of paging through every liker of a cat post as soon as it's found, the successful
+# cat posts are queued and their likes are read a page at a time from whichever post is expected to give the most new follows for that page
+from rickybot_paging import PAGE_LIMIT
+
+DIVES_POST = 'post' # dive into each cat post's likers as soon as it's found, in feed order (how it used to work)
+DIVES_PAGE = 'page' # queue the cat posts from a feed page, and dive into them by expected yield at the end of the page
+DIVES_RUN = 'run' # keep queueing across pages until the queue is expected to cover the rest of the follow budget (or the feed runs out)
+DIVE_MODES = (DIVES_POST, DIVES_PAGE, DIVES_RUN)
+
+FRESH_PRIOR = 0.5 # share of likers we guess we haven't followed yet, before any likes have been read
+PRIOR_LIKERS = 20 # how many likers that guess is worth, so one short page of likes doesn't swing a post's estimate all the way
+
+
+class Dive:
+	"""one queued cat post. read and followed count its likers so far, which is what its fresh share is estimated from."""
+	def __init__(self, uri, like_count, feed, order):
+		self.uri = uri
+		self.like_count = like_count
+		self.feed = feed
+		self.order = order # ties go to the post that was found first
+		self.cursor = None
+		self.pages = 0
+		self.read = 0
+		self.followed = 0
+		self.done = False
+
+	def next_limit(self, page_limit=PAGE_LIMIT):
+		# how many likes to ask for on the next page
+		return max(1, min(page_limit, self.like_count - self.read))
+
+
+class LikerDives:
+	"""the queue of cat posts whose likers are still to be followed.
+
+	each post's expected new follows per page is its estimated fresh share (likers that aren't followed, following us, muted, or already
+	followed this run) times how many likes the next page will have. the estimate starts from the share seen across every page read so far
+	(FRESH_PRIOR before there are any) and moves toward the post's own share as its pages come in, so a post whose likers turn out to be people
+	we already have gets passed over for the next one.
+
+	take() hands back the post to read a page from next, and record() is called with what that page gave. allocate() splits a follow budget
+	across the queued posts by expected yield, which is what gets prefetched. whatever is still queued when the budget runs out is dropped.
+	"""
+	def __init__(self, page_limit=PAGE_LIMIT, fresh_prior=FRESH_PRIOR, prior_likers=PRIOR_LIKERS):
+		self.page_limit = page_limit
+		self.fresh_prior = fresh_prior
+		self.prior_likers = prior_likers
+		self.queue = []
+		self.queued = 0 # every post pushed this run
+		self.dived = 0 # posts at least one page of likes was read from
+		self.pages = 0
+		self.read = 0
+		self.followed = 0
+
+	def __len__(self):
+		return len(self.queue)
+
+	def push(self, uri, like_count, feed):
+		self.queue.append(Dive(uri, like_count, feed, self.queued))
+		self.queued += 1
+
+	def fresh_share(self, dive=None):
+		# the run's share of fresh likers so far, or with a dive, that post's own share pulled toward the run's
+		overall = (self.followed + self.fresh_prior * self.prior_likers) / (self.read + self.prior_likers)
+		if dive is None:
+			return overall
+		return (dive.followed + overall * self.prior_likers) / (dive.read + self.prior_likers)
+
+	def page_yield(self, dive):
+		return self.fresh_share(dive) * min(self.page_limit, max(0, dive.like_count - dive.read))
+
+	def expected(self, dive):
+		# new follows expected from the rest of the post's likers
+		return self.fresh_share(dive) * max(0, dive.like_count - dive.read)
+
+	def expected_total(self):
+		return sum(self.expected(dive) for dive in self.queue)
+
+	def ranked(self):
+		return sorted(self.queue, key=lambda dive: (-self.page_yield(dive), dive.order))
+
+	def take(self):
+		# the queued post whose next page of likes should give the most new follows, or None once the queue is empty
+		if len(self.queue) == 0:
+			return None
+		return self.ranked()[0]
+
+	def record(self, dive, cursor, read, followed):
+		# what a page of likes from dive gave. the post leaves the queue once its likes run out
+		if dive.pages == 0:
+			self.dived += 1
+		dive.pages += 1
+		dive.cursor = cursor
+		dive.read += read
+		dive.followed += followed
+		self.pages += 1
+		self.read += read
+		self.followed += followed
+		if not cursor or read == 0 or dive.read >= dive.like_count:
+			self.drop(dive)
+
+	def drop(self, dive):
+		dive.done = True
+		if dive in self.queue:
+			self.queue.remove(dive)
+
+	def allocate(self, budget):
+		"""splits budget new follows across the queued posts, best expected yield per page first.
+
+		Returns:
+			[(dive, share)] for the posts that get any of the budget, in the order they'd be dived into
+		"""
+		allocations = []
+		for dive in self.ranked():
+			if budget <= 0:
+				break
+			share = min(budget, max(1, round(self.expected(dive))))
+			allocations.append((dive, share))
+			budget -= share
+		return allocations
+
+	def clear(self):
+		# the budget is used up, nothing left in the queue gets dived into
+		for dive in self.queue:
+			dive.done = True
+		self.queue = []
+
+	def report(self):
+		per_page = self.followed / self.pages if self.pages > 0 else 0.0
+		return f'{self.queued} cat posts queued, {self.dived} dived into. {self.pages} pages of likes read ({self.read} likes) for {self.followed} follows, {per_page:.1f} per page.'
@@ -1,23 +1,23 @@
-# aws stuff
-import boto3
+# boto3 (aws), atproto (bluesky) and rickybot_vision (torch, transformers, PIL) are heavy, so they're imported inside the handler right where they're first needed.
+# that way a run that bails out early doesn't pay for them. see tools/startup_benchmark.py
 # json necessary to parse secret string, and write/read s3 objects
 import json
-# From the transformers package, import ViTImageProcessor and ViTForImageClassification
-from transformers import ViTImageProcessor, ViTForImageClassification
-# From the PIL package, import Image and Markdown, need bytesio to translate image
-from PIL import Image
-from io import BytesIO
 # import requests
 import requests
-# import torch
-import torch
-# url getter for mpl
-import urllib
-import numpy as np
-# import bluesky api
-from atproto import Client
 # datetime is necessary for caturday check and logging
 import datetime
+# time is for timing how long the model takes to get ready
+import time
+# the per stage timing spans for the run log
+from rickybot_timing import StageTimer, span
+# cursor paging for the feed and likes, the next page is fetched in the background while the current one is processed
+from rickybot_paging import paginate, paginate_pages, paginate_async, paginate_pages_async, interleave_pages, PAGE_LIMIT
+# the queue of cat posts whose likers get followed, read a page of likes at a time from the post expected to give the most new follows
+from rickybot_dives import LikerDives, DIVE_MODES, DIVES_POST, DIVES_PAGE, DIVES_RUN
+# the post cids seen over the last few runs, as rotating bloom filters in one dynamodb item
+from rickybot_seen import SeenPosts, SEEN_KEY, SEEN_WINDOW, SEEN_GENERATIONS, SEEN_CAPACITY, capacity_limit
+# each run's follows go in chunk items under the day's partition of the follows table
+from rickybot_cohorts import FOLLOWS_TABLE, write_run
 import zoneinfo
 # these imports are to use github apis to do logging, base64 is to parse the json
 # import requests # already imported for something else
@@ -42,6 +42,8 @@ EMBEDDED_VID = 'app.bsky.embed.video#view'
 FEED_CATPICS = 'at://did:plc:q6gjnaw2blty4crticxkmujt/app.bsky.feed.generator/cv:cat'
 FEED_CATS = 'at://did:plc:jfhpnnst6flqway4eaeqzj2a/app.bsky.feed.generator/cats'
 FEED_TUXEDOCATS = 'at://did:plc:eubjsqnf5edgvcc6zuoyixhw/app.bsky.feed.generator/tuxedo-cats'
+# the feeds that can go in the extra_feeds secret by name instead of by uri
+FEED_ALIASES = {'catpics': FEED_CATPICS, 'cats': FEED_CATS, 'tuxedocats': FEED_TUXEDOCATS}
 # FEED_CATURDAY = 'at://did:plc:pmyqirafcp3jqdhrl7crpq7t/app.bsky.feed.generator/aaad4sb7tyvjw' # this one is old idk why it disappeared but it was still working?
 URL_BEGIN = 'https://bsky.app/profile/'
 URL_POST = '/post/'
@@ -64,10 +66,26 @@ DDB = 'dynamodb'
 S3 = 's3'
 DDB_TABLE = 'rickybot-ddb'
 S3_BUCKET = 'rickybot-s3'
-DDB_CACHE_KEY = 'CACHE'
+VIT_DIR = './vit'
+
+DDB_CACHE_KEY = 'CACHE' # the old post cache, just the last run's cids. only read now, to start the seen post filters off the first time
 DDB_CACHE_ATTRIBUTE = 'CIDS'
+DDB_VERDICTS_KEY = 'VERDICTS' # cat test results by image blob cid, so reposted pics aren't downloaded and classified again
+DDB_VERDICTS_ATTRIBUTE = 'BLOBS'
+DDB_STREAM_KEY = 'STREAM' # the jetstream cursor the last stream mode run got up to
+DDB_STREAM_ATTRIBUTE = 'CURSOR'
+STREAM_FEED = 'jetstream' # stands in for the feed uri in stream mode
+# rickybot_async and rickybot_stream are only imported when their crawl_engine or ingest_mode is picked, since they need httpx and websockets
+ENGINE_THREADS = 'threads' # the sync client, with the background threads for the next feed page and the image downloads
+ENGINE_ASYNCIO = 'asyncio'
+ENGINES = (ENGINE_THREADS, ENGINE_ASYNCIO)
+INGEST_FEED = 'feed' # page through the day's feed (and any extra feeds)
+INGEST_STREAM = 'stream' # read new posts off jetstream
+INGEST_MODES = (INGEST_FEED, INGEST_STREAM)
+STREAM_RESERVE = 60 # seconds of the lambda's timeout left for saving and logging after the stream stops
 
 PRIMARY_KEY = 'DOW' # the dynamodb table's primary key. there is no sort key
+SUCCESSFUL_CAT_POST_LIKES = 3 # a cat post with at least this many likes gets its likers followed too
 DOW_KEYS = {
 		'Sunday': 'SUN',
 		'Monday': 'MON',
@@ -94,6 +112,7 @@ def lambda_handler(event, context):
 
 	# connect to aws
 	try:
+		import boto3
 		aws_session = boto3.session.Session()
 	except Exception as e:
 		err = f'ERROR - failed to begin AWS session: {e}'
@@ -126,7 +145,12 @@ def lambda_handler(event, context):
 	FEED_CATURDAY = secret_map['feed_caturday']
 	FEED_REGDAY = secret_map['feed_regday']
 	FEED_NAME_REGDAY = secret_map['feed_name_regday']
-	FEED_NAME = {FEED_CATURDAY: "'Caturday'", FEED_REGDAY: FEED_NAME_REGDAY}
+	FEED_NAME = {uri: f"'{alias}'" for alias, uri in FEED_ALIASES.items()}
+	FEED_NAME.update({FEED_CATURDAY: "'Caturday'", FEED_REGDAY: FEED_NAME_REGDAY})
+	# more feeds to crawl alongside the day's feed, comma separated uris or names from FEED_ALIASES. optional, without it just the day's feed is crawled
+	EXTRA_FEEDS = [FEED_ALIASES.get(feed.strip(), feed.strip()) for feed in secret_map.get('extra_feeds', '').split(',') if feed.strip() != '']
+	for feed in EXTRA_FEEDS:
+		FEED_NAME.setdefault(feed, feed.rsplit('/', 1)[-1])
 	# run settings are also imported from secretesmanager so they can be tuned without updating the function
 	POSTS_CATURDAY = int(secret_map['posts_caturday'])
 	FOLLOWS_CATURDAY = int(secret_map['follows_caturday']) #350 when automated to 1 run per 1 hour
@@ -172,12 +196,104 @@ def lambda_handler(event, context):
 		else:
 				logger.error(f"Error: {update_response.json()}")
 
-	# initialize the ViT model
+	# now we can log into the bluesky client. this happens before loading the model so a failed login doesn't pay for importing torch
+	try:
+		from atproto import Client
+		# the follows and likes are written in applyWrites batches
+		from rickybot_writes import RecordWriter, APPLY_WRITES_BATCH
+		# every call the client makes is paced against the rate limits, waiting for the budget instead of failing
+		from rickybot_ratelimit import RateLimiter, is_rate_limit_error, MAX_WAIT
+		rate_limiter = RateLimiter(max_wait=int(secret_map.get('ratelimit_max_wait', MAX_WAIT)))
+		client = rate_limiter.attach(Client())
+		# picks the saved session back up instead of logging in with the password every run
+		from rickybot_session import log_in, save_sessions
+		session_table = aws_session.resource(DDB).Table(DDB_TABLE)
+		log_in(client, BSKY_USERNAME, BSKY_PASSWORD, session_table, PRIMARY_KEY)
+	except Exception as e:
+		err = f'ERROR - failed to log in to the bluesky client: {e}'
+		logger.error(err)
+		running_logging_text += err + LINE_BREAK
+		logging_add(running_logging_text)
+		# return here, cannot proceed without bluesky
+		return {
+			'statusCode': 500,
+			'body': json.dumps(err)
+		}
+
+	# the cat test lives in rickybot_vision, which is what pulls in torch and transformers
+	try:
+		from rickybot_vision import test_bsky_images, image_url, blob_cid, get_model, get_feature_extractor, ImageFetcher, AsyncImageFetcher, VerdictCache, CatScore, CLASSIFY_BATCH_SIZE, DOWNLOAD_WORKERS, MAX_IMAGE_BYTES, FETCH_FULLSIZE, FETCH_MODES, BACKEND_HF
+	except Exception as e:
+		err = f'ERROR - failed to import the image classification libraries:\n{repr(e)}: {e}'
+		logger.error(err)
+		running_logging_text += err + LINE_BREAK
+		logging_add(running_logging_text)
+		return {
+			'statusCode': 500,
+			'body': json.dumps(err)
+		}
+	# how many images go through the ViT model per forward pass. optional so older secrets still work
+	CLASSIFY_BATCH = int(secret_map.get('classify_batch_size', CLASSIFY_BATCH_SIZE))
+	# how many images can be downloading in the background at once
+	DOWNLOAD_THREADS = int(secret_map.get('download_workers', DOWNLOAD_WORKERS))
+	# 'fullsize' or 'thumb'. thumb downloads the small version of the image and decodes it at reduced size, check it with tools/vision_parity.py before switching
+	IMAGE_FETCH_MODE = secret_map.get('image_fetch_mode', FETCH_FULLSIZE)
+	if IMAGE_FETCH_MODE not in FETCH_MODES:
+		logger.warning(f'WARNING - unknown image_fetch_mode {IMAGE_FETCH_MODE}, using {FETCH_FULLSIZE}')
+		IMAGE_FETCH_MODE = FETCH_FULLSIZE
+	IMAGE_MAX_BYTES = int(secret_map.get('max_image_bytes', MAX_IMAGE_BYTES))
+	# how many follow/like records go into each applyWrites call. 1 writes every record on its own like before
+	WRITE_BATCH = int(secret_map.get('write_batch_size', APPLY_WRITES_BATCH))
+	# 'hf', 'torchscript' or 'int8'. the exported ones are built into the docker image by tools/export_vit.py, check them with tools/backend_parity.py before switching
+	INFERENCE_BACKEND = secret_map.get('inference_backend', BACKEND_HF)
+	# 'threads' or 'asyncio'. asyncio runs the feed pages, likes pages, image downloads and writes as concurrent tasks, the follow decisions are the same either way
+	CRAWL_ENGINE = secret_map.get('crawl_engine', ENGINE_THREADS)
+	if CRAWL_ENGINE not in ENGINES:
+		logger.warning(f'WARNING - unknown crawl_engine {CRAWL_ENGINE}, using {ENGINE_THREADS}')
+		CRAWL_ENGINE = ENGINE_THREADS
+	# 'post', 'page' or 'run'. when the likers of the successful cat posts get followed: as soon as each post is found like before, at the end of each feed page
+	# with the best posts first, or once the posts queued across pages are expected to fill the rest of the follow budget
+	LIKER_DIVES = secret_map.get('liker_dives', DIVES_RUN)
+	if LIKER_DIVES not in DIVE_MODES:
+		logger.warning(f'WARNING - unknown liker_dives {LIKER_DIVES}, using {DIVES_RUN}')
+		LIKER_DIVES = DIVES_RUN
+	# 'feed' or 'stream'. stream reads new posts off jetstream for up to stream_seconds, picking up from where the last stream run left off, and keeps the image
+	# posts from the stream_authors (comma separated dids) or with the stream_keywords (comma separated, empty for authors only). the budgets are the same
+	INGEST_MODE = secret_map.get('ingest_mode', INGEST_FEED)
+	if INGEST_MODE not in INGEST_MODES:
+		logger.warning(f'WARNING - unknown ingest_mode {INGEST_MODE}, using {INGEST_FEED}')
+		INGEST_MODE = INGEST_FEED
+	FEED_NAME[STREAM_FEED] = "'jetstream'"
+	# how long each seen post filter covers, how many are kept, and how many posts each one is sized for. changing the capacity starts the filters over
+	SEEN_WINDOW_SECONDS = int(float(secret_map.get('seen_window_hours', SEEN_WINDOW / 3600)) * 3600)
+	SEEN_FILTERS = int(secret_map.get('seen_generations', SEEN_GENERATIONS))
+	SEEN_FILTER_CAPACITY = int(secret_map.get('seen_capacity', SEEN_CAPACITY))
+	# the filters all go in one dynamodb item, so together they have to stay under its 400KB limit
+	if SEEN_FILTER_CAPACITY > capacity_limit(SEEN_FILTERS):
+		warning = f'WARNING - seen_capacity {SEEN_FILTER_CAPACITY} with {SEEN_FILTERS} seen_generations is too big for one dynamodb item, using {capacity_limit(SEEN_FILTERS)}'
+		logger.warning(warning)
+		running_logging_text += warning + LINE_BREAK
+		SEEN_FILTER_CAPACITY = capacity_limit(SEEN_FILTERS)
+
+	# initialize the ViT model. these are kept at module scope by rickybot_vision, so on a warm container this just hands back what the last invocation loaded
 	try:
+		init_start = time.perf_counter()
 		# # Load the feature extractor for the vision transformer
-		feature_extractor = ViTImageProcessor.from_pretrained('./vit', local_files_only=True)
-		# # Load the pre-trained weights from vision transformer
-		model = ViTForImageClassification.from_pretrained('./vit', local_files_only=True)
+		feature_extractor = get_feature_extractor(VIT_DIR)
+		# # Load the pre-trained weights from vision transformer, in whichever backend we're set to use
+		model_backend = INFERENCE_BACKEND
+		try:
+			model, model_warm = get_model(VIT_DIR, INFERENCE_BACKEND)
+		except Exception as e:
+			# if the exported backend is missing or broken we can still do the run with the stock model, it's just slower
+			warning = f'WARNING - failed to load the {INFERENCE_BACKEND} inference backend, falling back to {BACKEND_HF}: {repr(e)}: {e}'
+			logger.warning(warning)
+			running_logging_text += warning + LINE_BREAK
+			model_backend = BACKEND_HF
+			model, model_warm = get_model(VIT_DIR, BACKEND_HF)
+		init_line = f'model init: {"warm" if model_warm else "cold"} start, {model_backend} model ready in {time.perf_counter() - init_start:.3f}s'
+		logger.info(init_line)
+		running_logging_text += init_line + LINE_BREAK
 	except Exception as e:
 		err = f'ERROR - failed to initialize ViT model:\n{repr(e)}: {e}'
 		logger.error(err)
@@ -193,6 +309,7 @@ def lambda_handler(event, context):
 	try:
 		dynamodb = aws_session.resource(DDB)
 		table = dynamodb.Table(DDB_TABLE)
+		follows_table = dynamodb.Table(FOLLOWS_TABLE)
 	except Exception as e:
 		err = f'ERROR - failed to connect to the dynamoDB table: {e}'
 		logger.error(err)
@@ -204,13 +321,13 @@ def lambda_handler(event, context):
 			'body': json.dumps(err)
 		}
 
-	# pull the cache of post CIDs seen in the previous run from dynamodb - if we fail any step here just leave a warning that we couldn't check the cache
-	cached_posts = set() # in case the ddb fails to retrieve, initialize an empty set
+	# pull the filters of post CIDs seen over the last few runs from dynamodb - if we fail any step here just leave a warning that we couldn't check the cache
+	cached_posts = SeenPosts(window=SEEN_WINDOW_SECONDS, generations=SEEN_FILTERS, capacity=SEEN_FILTER_CAPACITY) # in case the ddb fails to retrieve, start with empty filters
 	ddb_response = {} # same reason
-	seen_posts = set() # initialize the seen posts set, we'll be using it to replace our cache at the end of the run
+	seen_posts = set() # initialize the seen posts set, these get added to the filters at the end of the run
 	try:
 		ddb_response = table.get_item(
-				Key={'DOW': DDB_CACHE_KEY},
+				Key={'DOW': SEEN_KEY},
 		)
 	except Exception as e:
 		warning = f"WARNING - failed to check post cache key's existence: {e}"
@@ -225,83 +342,47 @@ def lambda_handler(event, context):
 			warning = 'WARNING - successful response from dynamodb but there were no items in the post cache key.'
 			logger.warning(warning)
 			running_logging_text += warning + LINE_BREAK
+			# the first run with the filters starts them off with the old cache's cids
+			try:
+				ddb_response = table.get_item(
+						Key={'DOW': DDB_CACHE_KEY},
+				)
+				if 'Item' in ddb_response and DDB_CACHE_ATTRIBUTE in ddb_response['Item']:
+					cached_posts.add_all(ddb_response['Item'][DDB_CACHE_ATTRIBUTE])
+					logger.info(f'imported {len(cached_posts)} prior seen posts from the old post cache')
+			except Exception as e:
+				logger.warning(f'WARNING - failed to read the old post cache: {e}')
 	else:
-		if DDB_CACHE_ATTRIBUTE in ddb_response['Item']:
-			cached_posts = ddb_response['Item'][DDB_CACHE_ATTRIBUTE]
-			logger.info(f'imported {len(cached_posts)} prior seen posts from the dynamodb table')
-		else:
-			warning = 'WARNING - somehow there were items in the dynamodb cache key, but the attribute for cached posts was not present'
-			logger.warning(warning)
-			running_logging_text += warning + LINE_BREAK
+		cached_posts = SeenPosts(ddb_response['Item'], window=SEEN_WINDOW_SECONDS, generations=SEEN_FILTERS, capacity=SEEN_FILTER_CAPACITY)
+		logger.info(f'imported {len(cached_posts)} prior seen posts from the dynamodb table')
 
-	# and now we can log into the bluesky client
+	# same thing for the verdict cache. if it fails we just classify everything like before
+	verdict_cache = VerdictCache(fetch_mode=IMAGE_FETCH_MODE)
 	try:
-		client = Client()
-		client.login(BSKY_USERNAME, BSKY_PASSWORD)
+		ddb_response = table.get_item(
+				Key={'DOW': DDB_VERDICTS_KEY},
+		)
+		if 'Item' in ddb_response and DDB_VERDICTS_ATTRIBUTE in ddb_response['Item']:
+			verdict_cache = VerdictCache(ddb_response['Item'][DDB_VERDICTS_ATTRIBUTE], fetch_mode=IMAGE_FETCH_MODE)
+			logger.info(f'imported {len(verdict_cache)} cached image verdicts from the dynamodb table')
 	except Exception as e:
-		err = f'ERROR - failed to log in to the bluesky client: {e}'
-		logger.error(err)
-		running_logging_text += err + LINE_BREAK
-		logging_add(running_logging_text)
-		# return here, cannot proceed without bluesky
-		return {
-			'statusCode': 500,
-			'body': json.dumps(err)
-		}
+		warning = f"WARNING - failed to load the image verdict cache: {e}"
+		logger.warning(warning)
+		running_logging_text += warning + LINE_BREAK
 
-	# this is our code to identify post images as catposts
-
-	# 281: 'tabby, tabby cat'
-	# 282: 'tiger cat', 283: 'Persian cat', 284: 'Siamese cat, Siamese', 285: 'Egyptian cat', 286: 'cougar, puma, catamount, mountain lion, painter, panther, Felis concolor', 287: 'lynx, catamount', 288: 'leopard, Panthera pardus', 289: 'snow leopard, ounce, Panthera uncia', 290: 'jaguar, panther, Panthera onca, Felis onca', 291: 'lion, king of beasts, Panthera leo', 292: 'tiger, Panthera tigris', 293: 'cheetah, chetah, Acinonyx jubatus',
-	# 281 to 293
-	cat_labels = set()
-	for i in range(281, 294):
-		cat_labels.add(i)
-
-	# these labels are to remove drawings, memes/reposts, and images with a lot of text respectively
-	bad_labels = {
-	917 : 'comic book', 916 : 'web site, website, internet site, site', 921 : 'book jacket, dust cover, dust jacket, dust wrapper'}
-
-	def test_bsky_image(url):
-		f = urllib.request.urlopen(url)
-		image_data = f.read()
-		image = Image.open(BytesIO(image_data))
-		inputs = feature_extractor(images=image, return_tensor="pt")
-		pixel_values = inputs["pixel_values"]
-		pixel_values = np.array(pixel_values)
-		pixel_values = torch.tensor(pixel_values)
-		outputs = model(pixel_values)
-		logits = outputs.logits
-		predicted_class_idx = logits.argmax(-1).item()
-		sorted_preds = torch.argsort(logits, descending=True)[0]
-		top_predictions = [sorted_preds[i].item() for i in range(50)] # 50 is semi-arbitrary based on our findings from testing pics # could see tuning this down to 40 but can't tell if it would pick up more or less cats
-		top_values = [logits[0][pred].item() for pred in top_predictions]
-		# logger.info('label predictions', top_predictions)
-		# logger.info('values of predictions', top_values)
-		found_cat_label = -1
-		found_bad_label = -1
-		bad_labels_found = []
-		cat_score = 0
-		for i, pred in enumerate(top_predictions):
-			predicted_class = model.config.id2label[pred]
-			# logger.info(predicted_class)
-			if pred in cat_labels:
-				if found_cat_label == -1:
-					found_cat_label = i
-				cat_score += top_values[i]
-			if pred in bad_labels:
-				if found_bad_label == -1:
-					found_bad_label = i
-				bad_labels_found.append(pred)
-				bad_labels_found.append(bad_labels[pred])
-				cat_score -= top_values[i]
-		# print(' ')
-		logger.info('    found cat label:', found_cat_label)
-		logger.info('    found bad label:', found_bad_label, bad_labels_found)
-		would_pass = found_cat_label >= 0 and found_bad_label < 0
-		# logger.info('AI cat score: ', cat_score)
-		# logger.info('    passed cat test:', would_pass)
-		return would_pass
+	# and the stream cursor, so stream mode picks up where the last run left off. without it the stream starts from now
+	stream_cursor = None
+	if INGEST_MODE == INGEST_STREAM:
+		try:
+			ddb_response = table.get_item(
+					Key={'DOW': DDB_STREAM_KEY},
+			)
+			if 'Item' in ddb_response and DDB_STREAM_ATTRIBUTE in ddb_response['Item']:
+				stream_cursor = int(ddb_response['Item'][DDB_STREAM_ATTRIBUTE])
+		except Exception as e:
+			warning = f"WARNING - failed to load the stream cursor, starting the stream from now: {e}"
+			logger.warning(warning)
+			running_logging_text += warning + LINE_BREAK
 
 	# just getting a previous count of our followers and following for the logs
 	try:
@@ -315,77 +396,188 @@ def lambda_handler(event, context):
 		logger.warning(warning)
 		running_logging_text += warning + LINE_BREAK
 
-	# after successfully identifying a cat post, this function likes the post and follows the user, returning the follow uri string
-	def like_post_and_add_user(post):
-		user_did = post.author.did
-		post_cid = post.cid
-		post_uri = post.uri
-		followed_user = ''
-		try:
-			followed_user = client.follow(user_did).uri
-			liked_post = client.like(uri=post_uri, cid=post_cid).uri
-			logger.info(f'      ✓✓✓ ✅ Successfully liked post and followed user: {post.author.handle}')
-		except Exception as e:
-			logger.info(f'      ✓✓✗ ❌ Failed at either liking post or following user: {post.author.handle}. error: {e}')
-		return followed_user
+	# after successfully identifying a cat post, this function queues the like on the post and the follow of the user.
+	# they're written with the next applyWrites batch, and the callbacks hear back whether each one worked
+	def like_post_and_add_user(post, on_follow_result, on_like_result):
+		record_writer.follow(post.author.did, on_follow_result)
+		record_writer.like(post.uri, post.cid, on_like_result)
+		logger.info(f'      ✓✓✓ ✅ Queued like on post and follow of user: {post.author.handle}')
+
+	# follows a user that liked a cat post, unless they're muted or we already have them. true if they were followed
+	def follow_liker(like, users_followed, follow_result):
+		you_follow_them = like.actor.viewer.following
+		you_are_followed_by = like.actor.viewer.followed_by
+		user_did = like.actor.did
+		user_handle = like.actor.handle
+		user_muted = like.actor.viewer.muted
+		if user_muted:
+			logger.info(f'        User is muted. DO NOT FOLLOW. handle: {user_handle}')
+			return False
+		elif you_follow_them or you_are_followed_by or user_did == MY_DID or user_did in users_followed:
+			logger.info(f'        Already seen user. handle: {user_handle}')
+			return False
+		# follow the user. it gets written with the next batch, and follow_result takes them back out of users_followed if it fails
+		users_followed.add(user_did) # now we only need to save the user_did in the set instead of the whole string, and so we don't need a whole second already added dids set
+		record_writer.follow(user_did, follow_result(user_did, True))
+		logger.info(f'        Followed post-liker. handle: {user_handle}')
+		return True
+
+	# one page of likes for a queued liker dive. the asyncio engine hands back the first page if it was prefetched
+	def get_dive_likes_page(dive, limit):
+		logger.info(f'        Starting new page of likes on post {dive.uri}.')
+		with span(stage_timer, 'get likes page'):
+			if bluesky_io is not None:
+				return bluesky_io.run(bluesky_io.get_likes(dive.uri, limit, dive.cursor))
+			return client.get_likes(uri= dive.uri, limit= limit, cursor= dive.cursor)
 
-	def get_post_follow_likers(post_uri, like_count, users_followed, max_new_followers):
+	# in the 'post' liker dive mode, this pages through all of a cat post's likers as soon as the post is found
+	def get_post_follow_likers(post_uri, like_count, users_followed, max_new_followers, follow_result):
 		# need to try opening post, get the list of likers, iterate through following them, add each to the users added
 		new_follows_count = 0
-		likes_remaining = like_count
+		def get_likes_page(cursor, limit):
+			logger.info(f'        Starting new page of likes on this post.')
+			with span(stage_timer, 'get likes page'):
+				return client.get_likes(uri = post_uri, limit= limit, cursor= cursor)
+		async def get_likes_page_async(cursor, limit):
+			logger.info(f'        Starting new page of likes on this post.')
+			with span(stage_timer, 'get likes page'):
+				return await bluesky_io.get_likes(post_uri, limit, cursor)
+		if bluesky_io is not None:
+			likes = bluesky_io.iterate(paginate_async(get_likes_page_async, 'likes', max_items=like_count))
+		else:
+			likes = paginate(get_likes_page, 'likes', max_items=like_count)
 		try:
-			while likes_remaining > 0:
-				if (likes_remaining > 100):
-					logger.info(f'        Starting new page of likes. {likes_remaining} likes remaining to check on this post.')
-				limit = min(likes_remaining, 100)
-				likes_remaining -= limit
-				next_page = ''
-				response = client.get_likes(uri = post_uri, limit= limit, cursor= next_page)
-				likes = response.likes
-				next_page = response.cursor
-
-				for like in likes:
-					you_follow_them = like.actor.viewer.following
-					you_are_followed_by = like.actor.viewer.followed_by
-					user_did = like.actor.did
-					user_handle = like.actor.handle
-					user_muted = like.actor.viewer.muted
-					if user_muted:
-						logger.info(f'        User is muted. DO NOT FOLLOW. handle: {user_handle}')
-						continue
-					elif you_follow_them or you_are_followed_by or user_did == MY_DID or user_did in users_followed:
-						logger.info(f'        Already seen user. handle: {user_handle}')
-						continue
-					else:
-						# like the user
-						follow_uri = client.follow(user_did).uri
-						users_followed.add(user_did) # now we only need to save the user_did in the set instead of the whole string, and so we don't need a whole second already added dids set
-						logger.info(f'        Followed post-liker. handle: {user_handle}')
-						new_follows_count += 1
-						if new_follows_count >= max_new_followers:
-							break
-				# logger.info(f'from {len(likes)} likes on this post you followed {new_followers_count}, saw {follow_them_count} users you already follow, and saw {followed_by_count} users that already follow you')
+			for like in likes:
+				if follow_liker(like, users_followed, follow_result):
+					new_follows_count += 1
+					# this stops the paging too, no more pages of likes get requested
+					if new_follows_count >= max_new_followers:
+						break
+			# logger.info(f'from {len(likes)} likes on this post you followed {new_followers_count}, saw {follow_them_count} users you already follow, and saw {followed_by_count} users that already follow you')
 		except Exception as e:
+			# running out of rate limit budget ends the run, so pass that one up
+			if is_rate_limit_error(e):
+				raise
 			logger.error(f'ERROR: THERE WAS AN ISSUE CHECKING THIS POST FOR LIKES. \n{e}')
+		finally:
+			# stops the paging now instead of whenever the generator gets cleaned up
+			likes.close()
 		return new_follows_count
 
+	# hydrates a page of post uris from the stream into post views, the same as the feed hands back
+	def get_stream_posts(uris):
+		with span(stage_timer, 'stream posts'):
+			return client.get_posts(uris=uris).posts
+
 	def createPostUrl(feed_post):
 		url_handle = feed_post.post.author.handle
 		url_ending_index = feed_post.post.uri.find('.feed.post/') + 11
 		url_ending = feed_post.post.uri[url_ending_index : ]
 		return URL_BEGIN + url_handle + URL_POST + url_ending
 
-	def follow_more_users(post_count, follows_count, feed):
+	# true if a post would make it all the way to the cat test in follow_more_users. used to look ahead on the page so the images can be classified in batches
+	def needs_cat_test(feed_post, users_followed):
+		post = feed_post.post
+		if post.author.did == MY_DID or post.author.did in users_followed:
+			return False
+		if post.cid in cached_posts or post.cid in seen_posts:
+			return False
+		if post.author.viewer.following or post.author.viewer.followed_by:
+			return False
+		return bool(post.embed) and post.embed.py_type == EMBEDDED_PIC
+
+	# classifies the pic at feed_page[start] along with the next posts on the page that will also need it, up to the batch size
+	# results go into verdicts keyed by post cid, so the decisions made post by post afterwards are the same as classifying one image at a time
+	# pics that are already in the verdict cache get their verdict straight from there and are never downloaded
+	def classify_upcoming(feed_page, start, verdicts, cached_verdicts, users_followed, fetcher):
+		batch_cids = []
+		batch_urls = []
+		batch_posts = []
+		for index, f in enumerate(feed_page[start : ]):
+			if len(batch_cids) >= CLASSIFY_BATCH:
+				break
+			# the post at start already passed all the checks on its way here
+			if index > 0 and (f.post.cid in verdicts or f.post.cid in batch_cids or not needs_cat_test(f, users_followed)):
+				continue
+			url = image_url(f.post.embed.images[0], IMAGE_FETCH_MODE)
+			cached = verdict_cache.get(blob_cid(url))
+			if cached is not None:
+				verdicts[f.post.cid] = cached
+				cached_verdicts.add(f.post.cid)
+				continue
+			batch_cids.append(f.post.cid)
+			batch_urls.append(url)
+			batch_posts.append(f.post)
+		if len(batch_urls) == 0:
+			logger.info('    verdict found in the image verdict cache')
+			return
+		logger.info(f'    classifying a batch of {len(batch_urls)} images')
+		results = test_bsky_images(batch_urls, feature_extractor, model, batch_size=CLASSIFY_BATCH, fetcher=fetcher, timer=stage_timer)
+		for post, url, result in zip(batch_posts, batch_urls, results):
+			verdicts[post.cid] = result
+			if isinstance(result, CatScore):
+				verdict_cache.put(blob_cid(url), result)
+
+	# gets a page of the feed and starts downloading every image on it that looks like it will need the cat test.
+	# this runs on the feed thread for the next page, so those images are coming in while we're still working on the current page
+	def get_feed_page(feed, limit, cursor, users_followed, claimed, fetcher):
+		with span(stage_timer, 'feed page'):
+			data = client.app.bsky.feed.get_feed(feed_params(feed, limit, cursor), headers={})
+		prefetch_page_images(data, feed, users_followed, claimed, fetcher)
+		return data
+
+	# the asyncio engine's version, which runs on its event loop
+	async def get_feed_page_async(feed, limit, cursor, users_followed, claimed, fetcher):
+		with span(stage_timer, 'feed page'):
+			data = await bluesky_io.get_feed(feed_params(feed, limit, cursor))
+		prefetch_page_images(data, feed, users_followed, claimed, fetcher)
+		return data
+
+	def feed_params(feed, limit, cursor):
+		return {
+				'feed': feed,
+				'limit': limit,
+				'cursor': cursor
+		}
+
+	def prefetch_page_images(data, feed, users_followed, claimed, fetcher):
+		# posts another feed has already handed us will be dropped, so don't download their pics
+		urls = [image_url(f.post.embed.images[0], IMAGE_FETCH_MODE) for f in data.feed if needs_cat_test(f, users_followed) and claimed.get(f.post.cid, feed) == feed and claimed.get(f.post.author.did, feed) == feed]
+		fetcher.prefetch([url for url in urls if blob_cid(url) not in verdict_cache])
+
+	# claims a post's cid and author for the feed it came from. false if another feed already had either one, which makes it a cross feed duplicate.
+	# within one feed nothing changes, the same author can still come up more than once
+	def claim_post(feed_post, feed, claimed):
+		cid_owner = claimed.setdefault(feed_post.post.cid, feed)
+		author_owner = claimed.setdefault(feed_post.post.author.did, feed)
+		return cid_owner == feed and author_owner == feed
+
+	def follow_more_users(post_count, follows_count, feeds):
 		if post_count == 0 or follows_count == 0:
 			return []
-		posts_to_check = post_count
-		successful_cat_post_like_count = 3
+		# image downloads go on the fetcher's pool (or the asyncio engine's event loop), and the next feed page is requested in the background while we go through the current one
+		if bluesky_io is not None:
+			fetcher = AsyncImageFetcher(bluesky_io, feature_extractor, workers=DOWNLOAD_THREADS, fetch_mode=IMAGE_FETCH_MODE, max_bytes=IMAGE_MAX_BYTES, timer=stage_timer)
+		else:
+			fetcher = ImageFetcher(feature_extractor, workers=DOWNLOAD_THREADS, fetch_mode=IMAGE_FETCH_MODE, max_bytes=IMAGE_MAX_BYTES, timer=stage_timer)
+		try:
+			return crawl_feed(post_count, follows_count, feeds, fetcher)
+		finally:
+			fetcher.close()
+			# crawl_feed flushes before it logs its results, this is just in case it didn't get that far
+			record_writer.flush()
+
+	def crawl_feed(post_count, follows_count, feeds, fetcher):
+		posts_to_check = post_count # across all the feeds
+		successful_cat_post_like_count = SUCCESSFUL_CAT_POST_LIKES
 		max_errors_allowed = 5
-		next_page = ''
 		new_follow_count_from_posts = 0
 		new_follow_count_from_likes = 0
 		page_count = 0
 		users_followed = set()
+		claimed = {} # post cid or author did -> the feed that handed it to us first
+		feed_stats = {feed: {'posts': 0, 'duplicates': 0, 'cats': 0, 'follows': 0} for feed in feeds}
+		liker_dives = LikerDives()
 
 		logging_posts = 0
 		logging_pics = 0
@@ -399,11 +591,57 @@ def lambda_handler(event, context):
 		logging_mutuals = 0
 		logging_myposts = 0
 		logging_seenpost = 0
+		logging_cachedpics = 0
+		logging_failed_follows = 0
+		logging_failed_likes = 0
+		logging_duplicates = 0
+		last_write_error = None
+		out_of_budget = False # set once a call ran out of rate limit budget, there's no point going on after that
 		global running_logging_text
-		running_logging_text += f'Feed {FEED_NAME[feed]}:' + LINE_BREAK
+		running_logging_text += f'Feed{"s" if len(feeds) > 1 else ""} {", ".join(FEED_NAME[feed] for feed in feeds)}:' + LINE_BREAK
+
+		# follows and likes are written in batches, so whether they worked only comes back when the batch gets written.
+		# a failed write is taken back out of the counts (and out of users_followed), and each failed batch counts as one error
+		def write_failed(error):
+			nonlocal logging_errors_count, last_write_error, out_of_budget
+			if is_rate_limit_error(error):
+				out_of_budget = True
+			if error is not last_write_error:
+				last_write_error = error
+				logging_errors_count += 1
+				logger.error(f'    ‼️ writing a batch of follows and likes caused an error. {logging_errors_count} errors seen this run.\n{error}')
+				logging_errors_description.append(f'pg{page_count} applyWrites. {repr(error)}: {error}')
+
+		def follow_result(did, from_likes, feed):
+			def on_result(uri, error):
+				nonlocal new_follow_count_from_posts, new_follow_count_from_likes, logging_failed_follows
+				if error is None:
+					return
+				users_followed.discard(did)
+				logging_failed_follows += 1
+				feed_stats[feed]['follows'] -= 1
+				if from_likes:
+					new_follow_count_from_likes -= 1
+				else:
+					new_follow_count_from_posts -= 1
+				write_failed(error)
+			return on_result
+
+		def like_result(mutual):
+			def on_result(uri, error):
+				nonlocal logging_mutuals, logging_failed_likes
+				if error is None:
+					return
+				logging_failed_likes += 1
+				if mutual:
+					logging_mutuals -= 1
+				write_failed(error)
+			return on_result
 
 		def log_results():
 			global running_logging_text
+			# write whatever is still queued first, so the counts below are final
+			record_writer.flush()
 			sum_new_follows = new_follow_count_from_posts + new_follow_count_from_likes
 			sum_skipped_posts = logging_seenpost + logging_alreadyfollowed + logging_myposts
 			sum_unprocessed = logging_nomedia + logging_vid
@@ -411,30 +649,118 @@ def lambda_handler(event, context):
 			running_logging_text += f'  Followed {sum_new_follows} new user{"s" if sum_new_follows != 1 else ""}{"!" if sum_new_follows > 0 else "."}' + LINE_BREAK
 			running_logging_text += f'    Of those follows, {new_follow_count_from_posts} were posters and {new_follow_count_from_likes} were from likes.' + LINE_BREAK
 			running_logging_text += f'  {logging_posts} posts in total were viewed during this run.' + LINE_BREAK
+			if len(feeds) > 1:
+				running_logging_text += f'  Feeds: {logging_duplicates} posts were dropped because another feed already had the post or its author.' + LINE_BREAK
+				for feed, stats in feed_stats.items():
+					running_logging_text += f'    {FEED_NAME[feed]}: {stats["posts"]} posts ({stats["duplicates"]} duplicates), {stats["cats"]} cat pics, {stats["follows"]} follows.' + LINE_BREAK
 			running_logging_text += f'  Skipped Posts: ({sum_skipped_posts}) - {logging_seenpost} posts were previously seen, {logging_alreadyfollowed} were from users already followed, {logging_myposts} were your posts.' + LINE_BREAK
 			running_logging_text += f'  Mutuals: {logging_mutuals} posts were from users that follow you, and these posts were liked.' + LINE_BREAK
+			if LIKER_DIVES != DIVES_POST:
+				running_logging_text += f'  Liker dives ({LIKER_DIVES}): {liker_dives.report()}' + LINE_BREAK
+			running_logging_text += f'  Writes: {record_writer.written} follows and likes were written in {record_writer.batches} applyWrites calls.{f" {logging_failed_follows} follows and {logging_failed_likes} likes failed and were not counted." if logging_failed_follows + logging_failed_likes > 0 else ""}' + LINE_BREAK
 			running_logging_text += f'  Unprocessed: ({sum_unprocessed}) - {logging_nomedia} posts had no media attached, and {logging_vid} posts had videos attached.' + LINE_BREAK
 			running_logging_text += f'  Processed: {logging_pics} posts had pics attached: {logging_cat} were identified as cat pics and {logging_notcat} were not cats.' + LINE_BREAK
+			running_logging_text += f'    {logging_cachedpics} of those pics were already in the image verdict cache and were not downloaded.' + LINE_BREAK
 			running_logging_text += f'  {"No errors were encountered while processing pics." if logging_errors_count == 0 else str(logging_errors_count) + " ERROR(S) ENCOUNTERED PROCESSING PICS FROM THIS FEED"} ' + LINE_BREAK
 			if logging_errors_count > 0:
 				running_logging_text += '\n'.join(logging_errors_description) + LINE_BREAK
 
-		while posts_to_check > 0:
-			logger.info(f'[checking page {page_count} of feed {FEED_NAME[feed]}, {posts_to_check} posts left to check, and have found {new_follow_count_from_posts + new_follow_count_from_likes} new users to follow]')
-			page_count += 1
-			limit = min(posts_to_check, 100)
-			posts_to_check -= limit
-			try:
-				# logger.info('next page', next_page)
-				data = client.app.bsky.feed.get_feed({
-						'feed': 'at://did:plc:jfhpnnst6flqway4eaeqzj2a/app.bsky.feed.generator/cats',
-						'limit': limit,
-						'cursor': next_page
-				}, headers={})
-				next_page = data.cursor
+		# follows the likers of the queued cat posts until the follow budget is used up or the queue runs out, a page of likes at a time from whichever post
+		# is expected to give the most new follows for it. the asyncio engine keeps the first pages of the next few posts that get a share of the budget coming in
+		def dive_likers():
+			nonlocal new_follow_count_from_likes, logging_errors_count, out_of_budget
+			budget = follows_count - (new_follow_count_from_posts + new_follow_count_from_likes)
+			if budget <= 0 or len(liker_dives) == 0:
+				return
+			logger.info(f'    diving into the likers of {len(liker_dives)} queued cat posts, {len(liker_dives.allocate(budget))} of them expected to fill the {budget} follows left. expecting {liker_dives.expected_total():.0f} new follows from the queue.')
+			while budget > 0:
+				# same as before every post, a failed write batch or running out of rate limit budget stops the dives
+				record_writer.poll()
+				if logging_errors_count >= max_errors_allowed or out_of_budget:
+					return
+				if bluesky_io is not None:
+					# only a few ahead, the estimates get better with every page and the rest of the allocation may not be needed
+					for dive, share in liker_dives.allocate(budget)[ : LIKES_CONCURRENCY]:
+						if dive.pages == 0:
+							bluesky_io.prefetch_likes(dive.uri, dive.next_limit())
+				dive = liker_dives.take()
+				if dive is None:
+					return
+				limit = dive.next_limit()
+				try:
+					page = get_dive_likes_page(dive, limit)
+				except Exception as e:
+					# running out of rate limit budget ends the run, anything else just gives up on this post
+					if is_rate_limit_error(e):
+						out_of_budget = True
+						logging_errors_count += 1
+						logging_errors_description.append(f'pg{page_count} likes. {repr(e)}: {e}')
+						return
+					logger.error(f'ERROR: THERE WAS AN ISSUE CHECKING THIS POST FOR LIKES. \n{e}')
+					liker_dives.drop(dive)
+					continue
+				read = 0
+				likers_added = 0
+				for like in page.likes[ : limit]:
+					read += 1
+					if follow_liker(like, users_followed, lambda user_did, from_likes: follow_result(user_did, from_likes, dive.feed)):
+						likers_added += 1
+						if likers_added >= budget:
+							break
+				liker_dives.record(dive, page.cursor, read, likers_added)
+				logger.info(f'      {"✅" if likers_added > 0 else "0️⃣"} Added {likers_added} of {read} users that liked that post.')
+				new_follow_count_from_likes += likers_added
+				feed_stats[dive.feed]['follows'] += likers_added
+				budget -= likers_added
+			# the budget is used up, the rest of the queue is dropped
+			liker_dives.clear()
+
+		# every feed is paged on its own, with its next page (and its image downloads) started as soon as we get this one, and they all stop being fetched when we return.
+		# the pages are taken from each feed in turn, and are small enough that every feed gets a share of post_count
+		feed_page_limit = min(PAGE_LIMIT, -(-post_count // len(feeds)))
+		def feed_pages(feed):
+			if feed == STREAM_FEED:
+				# the stream's pages come in on its own thread, which starts the image downloads for each one
+				return post_stream.pages(stream_deadline, on_page=lambda data: prefetch_page_images(data, feed, users_followed, claimed, fetcher))
+			if bluesky_io is not None:
+				return bluesky_io.iterate(paginate_pages_async(lambda cursor, limit: get_feed_page_async(feed, limit, cursor, users_followed, claimed, fetcher), 'feed', max_items=post_count, page_limit=feed_page_limit))
+			return paginate_pages(lambda cursor, limit: get_feed_page(feed, limit, cursor, users_followed, claimed, fetcher), 'feed', max_items=post_count, page_limit=feed_page_limit)
+
+		# with more than one feed, a feed that fails just drops out and the rest keep going
+		def feed_failed(feed, e):
+			nonlocal logging_errors_count
+			logging_errors_count += 1
+			logger.error(f'error encountered from trying to get feed {FEED_NAME[feed]}, continuing with the other feeds.\n{repr(e)}: {e}')
+			logging_errors_description.append(f'feed {FEED_NAME[feed]}. {repr(e)}: {e}')
+
+		pages = interleave_pages({feed: feed_pages(feed) for feed in feeds}, on_error=feed_failed if len(feeds) > 1 else None)
+		try:
+			for feed, data in pages:
+				if posts_to_check <= 0:
+					break
+				logger.info(f'[checking page {page_count} of feed {FEED_NAME[feed]}, {posts_to_check} posts left to check, and have found {new_follow_count_from_posts + new_follow_count_from_likes} new users to follow]')
+				page_count += 1
+				data.feed = data.feed[ : posts_to_check]
+				posts_to_check -= len(data.feed)
+				stats = feed_stats[feed]
+				stats['posts'] += len(data.feed)
+				# drop the posts (and authors) that another feed already gave us, before any of them get to the cat test
+				unclaimed = [f for f in data.feed if claim_post(f, feed, claimed)]
+				stats['duplicates'] += len(data.feed) - len(unclaimed)
+				logging_duplicates += len(data.feed) - len(unclaimed)
+				data.feed = unclaimed
 				# logger.info(data)
+				verdicts = {} # post cid -> cat test result for this page, filled a batch at a time
+				cached_verdicts = set() # post cids whose verdict came from the verdict cache
 
 				for i, f in enumerate(data.feed):
+					# failed write batches are only found out about when a batch is written, so check for too many errors before every post.
+					# with the asyncio engine the batches are written in the background, and poll() hands back the ones that are done
+					record_writer.poll()
+					if logging_errors_count >= max_errors_allowed or out_of_budget:
+						logger.error(f'seen more errors ({logging_errors_count}) than the acceptable number of errors ({max_errors_allowed}), or ran out of rate limit budget. terminating run.')
+						log_results()
+						return users_followed
 					you_follow_them = f.post.author.viewer.following
 					you_are_followed_by = f.post.author.viewer.followed_by
 					did = f.post.author.did
@@ -454,18 +780,8 @@ def lambda_handler(event, context):
 						# TODO: the way I have it if you are following them you never check the photo to see if it's a good one to get the likes from.
 						if you_follow_them and you_are_followed_by:
 							logger.info(f'{i} 💕 user: {f.post.author.handle} is a mutual follower. Liking this post. {createPostUrl(f)}')
-							# this can break if you get rate limited. So far hasn't broken when posts are deleted but should have been wrapped in one just in case
-							try:
-								liked_post = client.like(uri=f.post.uri, cid=f.post.cid).uri
-							except Exception as e:
-								logging_errors_count += 1
-								logger.error(f'    ✓✗ ‼️ liking post {i} caused an error. {logging_errors_count} errors seen this run.\n{e}')
-								logging_errors_description.append(f'pg{page_count} #{i}. {repr(e)}: {e}')
-								# got rate limited and know that if you hit like 100 errors or so you'll eventually get a timeout and the entire nootebook will be borked.
-								if logging_errors_count >= max_errors_allowed:
-									logger.error(f'seen more errors ({logging_errors_count}) than the acceptable number of errors ({max_errors_allowed}). terminating run.')
-									log_results()
-									return users_followed
+							# this can break if you get rate limited. the like goes out with the next batch, and like_result counts it as an error if it fails
+							record_writer.like(f.post.uri, f.post.cid, like_result(True))
 							logging_mutuals += 1
 						elif did in users_followed:
 							logger.info(f'{i} ✗ 👀 user: {f.post.author.handle} was already followed in this batch.')
@@ -474,7 +790,7 @@ def lambda_handler(event, context):
 							logger.info(f'{i} ✗ 👀 user: {f.post.author.handle} {"already follows you." if you_are_followed_by else ""}{"is already being followed." if you_follow_them else ""}')
 							logging_alreadyfollowed += 1
 						elif not f.post.embed or f.post.embed.py_type != EMBEDDED_PIC:
-							if f.post.embed.py_type == EMBEDDED_VID:
+							if f.post.embed and f.post.embed.py_type == EMBEDDED_VID:
 								logger.info(f'{i} ✗ 🎥 video post: {createPostUrl(f)}')
 								logging_vid += 1
 							else:
@@ -487,19 +803,38 @@ def lambda_handler(event, context):
 							try:
 								handle = f.post.author.handle
 								logger.info(f'    user: {handle}')
-								is_cat = test_bsky_image(f.post.embed.images[0].fullsize)
+								if post_cid not in verdicts:
+									classify_upcoming(data.feed, i, verdicts, cached_verdicts, users_followed, fetcher)
+								if post_cid in cached_verdicts:
+									logging_cachedpics += 1
+								cat_test = verdicts[post_cid]
+								if isinstance(cat_test, Exception):
+									raise cat_test
+								logger.info(f'    found cat label: {cat_test.cat_rank} | found bad label: {cat_test.bad_rank} {list(cat_test.bad_labels)} | cat score: {cat_test.cat_score:.2f}')
+								is_cat = cat_test.passed
 								if is_cat:
 									logger.info(f'    ✓✓ 😺 successfully found cat pic at post {i}. It has {f.post.like_count} likes.')
 									new_follow_count_from_posts += 1
 									logging_cat += 1
-									follow_uri = like_post_and_add_user(f.post)
+									stats['cats'] += 1
+									stats['follows'] += 1
+									# added before queueing, a failed follow takes them back out when its batch is written
 									users_followed.add(did)
+									# the asyncio engine starts on the first page of likes now, so it comes in while the follow and like are queued. not any earlier,
+									# a cat post whose author gets followed first is skipped and its page would be wasted. queued dives are prefetched when they get their share of the budget
+									if bluesky_io is not None and LIKER_DIVES == DIVES_POST and f.post.like_count >= successful_cat_post_like_count:
+										bluesky_io.prefetch_likes(f.post.uri, min(PAGE_LIMIT, f.post.like_count))
+									like_post_and_add_user(f.post, follow_result(did, False, feed), like_result(False))
 									# so we have a cat post. If it is a solid or particularly good cat post it should probably have a lot of likes, and we can go in and follow all those likers
-									if f.post.like_count >= successful_cat_post_like_count:
+									if f.post.like_count >= successful_cat_post_like_count and LIKER_DIVES != DIVES_POST:
+										logger.info(f'      👍🏻 This cat post got {f.post.like_count}, and I would call it successful, so queueing it to follow its likers.')
+										liker_dives.push(f.post.uri, f.post.like_count, feed)
+									elif f.post.like_count >= successful_cat_post_like_count:
 										logger.info(f'      👍🏻 This cat post got {f.post.like_count}, and I would call it successful, so following its likers.')
-										likers_added = get_post_follow_likers(f.post.uri, f.post.like_count, users_followed, follows_count - (new_follow_count_from_posts + new_follow_count_from_likes))
+										likers_added = get_post_follow_likers(f.post.uri, f.post.like_count, users_followed, follows_count - (new_follow_count_from_posts + new_follow_count_from_likes), lambda user_did, from_likes: follow_result(user_did, from_likes, feed))
 										logger.info(f'      {"✅" if likers_added > 0 else "0️⃣"} Added {likers_added} users that liked that post.')
 										new_follow_count_from_likes += likers_added
+										stats['follows'] += likers_added
 									if new_follow_count_from_posts + new_follow_count_from_likes >= follows_count:
 										logger.info(f'Successfully followed the desired number of new users! terminating run.') # break wasn't working here, it kept going around to the while loop instead
 										log_results()
@@ -509,20 +844,40 @@ def lambda_handler(event, context):
 									logging_notcat += 1
 							except Exception as e:
 								logging_errors_count += 1
+								out_of_budget = out_of_budget or is_rate_limit_error(e)
 								logger.error(f'    ✓✗ ❓ post {i} image caused an error. {logging_errors_count} errors seen this run.\n{e}')
 								logger.error(f'errors ({logging_errors_count}), acceptable number of errors ({max_errors_allowed}).')
 								logging_errors_description.append(f'pg{page_count} #{i}. {repr(e)}: {e}')
 								# got rate limited and know that if you hit like 100 errors or so you'll eventually get a timeout and the entire notebook will be borked.
-								if logging_errors_count >= max_errors_allowed:
-									logger.error(f'seen more errors ({logging_errors_count}) than the acceptable number of errors ({max_errors_allowed}). terminating run.')
+								if logging_errors_count >= max_errors_allowed or out_of_budget:
+									logger.error(f'seen more errors ({logging_errors_count}) than the acceptable number of errors ({max_errors_allowed}), or ran out of rate limit budget. terminating run.')
 									log_results()
 									return users_followed
-			except Exception as e:
-				logger.error(f'error encountered from trying to get feed. terminating run.\n{repr(e)}: {e}')
-				logging_errors_count += 1
-				logging_errors_description.append(f'CRITICAL ERROR ENCOUNTERED WHILE GETTING FEED:\n{repr(e)}: {e}')
-				log_results()
-				return users_followed
+
+				# the queued liker dives go at the end of the page. the 'run' mode keeps reading pages until the queue looks like it can fill the budget by itself
+				remaining = follows_count - (new_follow_count_from_posts + new_follow_count_from_likes)
+				if LIKER_DIVES == DIVES_PAGE or (LIKER_DIVES == DIVES_RUN and liker_dives.expected_total() >= remaining):
+					dive_likers()
+					if logging_errors_count >= max_errors_allowed or out_of_budget:
+						logger.error(f'seen more errors ({logging_errors_count}) than the acceptable number of errors ({max_errors_allowed}), or ran out of rate limit budget. terminating run.')
+						log_results()
+						return users_followed
+					if new_follow_count_from_posts + new_follow_count_from_likes >= follows_count:
+						logger.info(f'Successfully followed the desired number of new users! terminating run.')
+						log_results()
+						return users_followed
+		except Exception as e:
+			logger.error(f'error encountered from trying to get feed. terminating run.\n{repr(e)}: {e}')
+			logging_errors_count += 1
+			logging_errors_description.append(f'CRITICAL ERROR ENCOUNTERED WHILE GETTING FEED:\n{repr(e)}: {e}')
+			# the likes are a different endpoint, so whatever was queued still gets its dive
+			dive_likers()
+			log_results()
+			return users_followed
+		finally:
+			pages.close()
+		# out of posts (or feed pages), so the rest of the queue gets the rest of the budget
+		dive_likers()
 		log_results()
 		return users_followed
 
@@ -531,13 +886,63 @@ def lambda_handler(event, context):
 	# FINALLY THE ACTUAL RUN! determine whether you're checking the caturday feed or the regular cat feed
 	ddb_attr_run_timestamp = str(datetime.datetime.now(zoneinfo.ZoneInfo(USER_TIMEZONE))) # you don't want to use the static string attribute because what if you re-run this cell? won't be necessary when automated though.
 	is_caturday = dow == CATURDAY_DOW
+	# the day's feed first, then any extra ones, each only once. stream mode reads the stream instead
+	def run_feeds(day_feed):
+		if post_stream is not None:
+			return [STREAM_FEED]
+		return list(dict.fromkeys([day_feed] + EXTRA_FEEDS))
 	followed_users = set()
+	# times every feed page, image download, preprocess, forward pass, scoring, applyWrites batch and likes page during the run
+	stage_timer = StageTimer()
+	rate_limiter.timer = stage_timer
+	bluesky_io = None
+	if CRAWL_ENGINE == ENGINE_ASYNCIO:
+		try:
+			# the asyncio engine does the network calls with an AsyncClient on an event loop, picking up the same session
+			from rickybot_async import AsyncBluesky, LIKES_CONCURRENCY
+			bluesky_io = AsyncBluesky(client, rate_limiter)
+			save_sessions(bluesky_io.client, BSKY_USERNAME, session_table, PRIMARY_KEY)
+		except Exception as e:
+			warning = f'WARNING - failed to start the asyncio engine, using the {ENGINE_THREADS} engine: {repr(e)}: {e}'
+			logger.warning(warning)
+			running_logging_text += warning + LINE_BREAK
+	post_stream = None
+	if INGEST_MODE == INGEST_STREAM:
+		try:
+			# stream mode reads new posts off jetstream instead of paging through the feeds
+			from rickybot_stream import PostStream, JETSTREAM_URL, STREAM_KEYWORDS, STREAM_SECONDS
+			STREAM_URL = secret_map.get('stream_url', JETSTREAM_URL)
+			STREAM_RUN_SECONDS = int(secret_map.get('stream_seconds', STREAM_SECONDS))
+			STREAM_AUTHORS = [did.strip() for did in secret_map.get('stream_authors', '').split(',') if did.strip() != '']
+			STREAM_WORDS = [word.strip() for word in secret_map.get('stream_keywords', ','.join(STREAM_KEYWORDS)).split(',') if word.strip() != '']
+			post_stream = PostStream(get_stream_posts, url=STREAM_URL, cursor=stream_cursor, authors=STREAM_AUTHORS, keywords=STREAM_WORDS)
+			# the stream stops in time to save everything, even if stream_seconds is more than the lambda has left
+			stream_seconds = STREAM_RUN_SECONDS if context is None else min(STREAM_RUN_SECONDS, context.get_remaining_time_in_millis() / 1000 - STREAM_RESERVE)
+			stream_deadline = time.monotonic() + max(0, stream_seconds)
+		except Exception as e:
+			# without the stream the run can still page through the feeds like before
+			warning = f'WARNING - failed to start the stream, using the {INGEST_FEED} ingest mode: {repr(e)}: {e}'
+			logger.warning(warning)
+			running_logging_text += warning + LINE_BREAK
+			post_stream = None
+	# follows and likes are queued here and written in applyWrites batches
+	record_writer = RecordWriter(client, batch_size=WRITE_BATCH, timer=stage_timer, engine=bluesky_io)
 	if is_caturday:
 		logger.info("IT'S CATURDAY! Checking the Caturday feed for new followers.")
-		followed_users = follow_more_users(POSTS_CATURDAY, FOLLOWS_CATURDAY, FEED_CATURDAY)
+		followed_users = follow_more_users(POSTS_CATURDAY, FOLLOWS_CATURDAY, run_feeds(FEED_CATURDAY))
 	else:
 		logger.info("Just a regular day, but we're still following more cats. :3")
-		followed_users = follow_more_users(POSTS_OTHERCAT, FOLLOWS_OTHERCAT, FEED_REGDAY)
+		followed_users = follow_more_users(POSTS_OTHERCAT, FOLLOWS_OTHERCAT, run_feeds(FEED_REGDAY))
+	if bluesky_io is not None:
+		bluesky_io.close()
+	if post_stream is not None:
+		stream_line = f'Stream: {post_stream.report()}'
+		logger.info(stream_line)
+		running_logging_text += stream_line + LINE_BREAK
+	# p50/p95/total for each stage, plus the same numbers as json so the logs can be compared between runs
+	timing_report = stage_timer.report() + rate_limiter.report()
+	logger.info(timing_report)
+	running_logging_text += timing_report
 
 	# just in case we said we followed ourselves somehow, we'll discard that value
 	followed_users.discard(MY_DID)
@@ -545,16 +950,8 @@ def lambda_handler(event, context):
 	# and add the results to our dynamodb
 	if len(followed_users) > 0:
 		try:
-			table.update_item(
-					Key={'DOW': ddb_key},
-					UpdateExpression='SET #attr = :val',
-					ExpressionAttributeNames={
-							'#attr': ddb_attr_run_timestamp
-					},
-					ExpressionAttributeValues={
-							':val': followed_users
-					}
-			)
+			# one partition per day and a chunk item per couple thousand follows, so a day's runs aren't squeezed into one item's 400KB any more
+			write_run(follows_table, ddb_key, ddb_attr_run_timestamp, followed_users)
 		except Exception as e:
 			err = f'ERROR - failed to store followed users in dynamodb.\n{e}'
 			logger.error(err)
@@ -565,23 +962,46 @@ def lambda_handler(event, context):
 
 	# now we also need to update the cached posts with what we saw this run
 	ddb_update_cache_failed = False
+	try:
+		# only the newest filter is written, and the expired ones are removed. the stream's posts go in too, they turn up in the feeds later
+		cached_posts.add_all(seen_posts)
+		cached_posts.save(table, SEEN_KEY)
+		running_logging_text += f'seen post cache: {cached_posts.report()}' + LINE_BREAK
+		# and stream mode saves how far it got
+		if post_stream is not None and post_stream.cursor is not None:
+			table.update_item(
+					Key={'DOW': DDB_STREAM_KEY},
+					UpdateExpression='SET #attr = :val',
+					ExpressionAttributeNames={
+							'#attr': DDB_STREAM_ATTRIBUTE
+					},
+					ExpressionAttributeValues={
+							':val': post_stream.cursor
+					}
+			)
+	except Exception as e:
+		warning = f'WARNING - failed to store followed users in dynamodb.\n{e}'
+		logger.warning(warning)
+		running_logging_text += warning + LINE_BREAK
+		# same here, we won't end early to try to log in github, but we can flag it for the response
+		ddb_update_cache_failed = True
+
+	# and save the image verdicts so reposted pics can be skipped next run. not critical, so this is just a warning if it fails
 	try:
 		table.update_item(
-				Key={'DOW': DDB_CACHE_KEY},
+				Key={'DOW': DDB_VERDICTS_KEY},
 				UpdateExpression='SET #attr = :val',
 				ExpressionAttributeNames={
-						'#attr': DDB_CACHE_ATTRIBUTE
+						'#attr': DDB_VERDICTS_ATTRIBUTE
 				},
 				ExpressionAttributeValues={
-						':val': seen_posts
+						':val': verdict_cache.to_item()
 				}
 		)
 	except Exception as e:
-		warning = f'WARNING - failed to store followed users in dynamodb.\n{e}'
+		warning = f'WARNING - failed to store the image verdict cache in dynamodb.\n{e}'
 		logger.warning(warning)
 		running_logging_text += warning + LINE_BREAK
-		# same here, we won't end early to try to log in github, but we can flag it for the response
-		ddb_update_cache_failed = True
 
 	end_timestamp = datetime.datetime.now(zoneinfo.ZoneInfo(USER_TIMEZONE))
 	time_diff = end_timestamp - cur_timestamp
@@ -1,6 +1,4 @@
-# aws stuff
-import boto3
-from botocore.exceptions import ClientError
+# boto3 (aws) is imported inside the handler where it's first needed, see tools/startup_benchmark.py
 
 # json necessary to parse secret string, and write/read s3 objects
 import json
@@ -9,6 +7,11 @@ import json
 import datetime
 import zoneinfo
 
+# the add follows runs' follows, in chunk items under each day's partition of the follows table
+from rickybot_cohorts import FOLLOWS_TABLE, read_cohort, delete_cohort
+# and the day's follows go into s3 as a compact cohort object, see rickybot_cohorts.py
+from rickybot_cohorts import CohortObject, encode_cohort, COHORT_CONTENT_TYPE
+
 # for github logging
 import base64
 import requests
@@ -26,6 +29,11 @@ DDB = 'dynamodb'
 S3 = 's3'
 DDB_TABLE = 'rickybot-ddb'
 S3_BUCKET = 'rickybot-s3'
+# the delete lambda's checkpoint, see rickybot_lambda_delete.py. if it's partway through the object we're adding to, only what it hasn't gotten to carries over
+DDB_DELSTATS_KEY = 'DEL-STATS'
+DDB_ATTR_COHORT = 'COHORT'
+DDB_ATTR_OFFSET = 'OFFSET'
+DDB_ATTR_RETRY = 'RETRY'
 
 PRIMARY_KEY = 'DOW' # the dynamodb table's primary key. there is no sort key
 DOW_KEYS = {
@@ -56,6 +64,7 @@ def lambda_handler(event, context):
 
 	# connect to aws
 	try:
+		import boto3
 		aws_session = boto3.session.Session()
 	except:
 		err = 'ERROR - failed to begin AWS session'
@@ -127,6 +136,7 @@ def lambda_handler(event, context):
 	try:
 		dynamodb = aws_session.resource(DDB)
 		table = dynamodb.Table(DDB_TABLE)
+		follows_table = dynamodb.Table(FOLLOWS_TABLE)
 	except:
 		err = 'ERROR - failed to get dynamo db table'
 		logging.error(err)
@@ -152,8 +162,9 @@ def lambda_handler(event, context):
 	follows_aggregation = set()
 
 	# there should NOT be anything in the current s3 object for this bucket. But just in case there is, like one week didn't properly get cleared out or something, we will add it to the beginning of the aggregation
+	delete_checkpoint = None # the delete lambda's checkpoint for the object, if it's partway through it
 	try:
-		s3.head_object(Bucket=S3_BUCKET, Key=ddbs3_key)
+		head = s3.head_object(Bucket=S3_BUCKET, Key=ddbs3_key)
 		# except on saturdays - there should be the stuff from friday in the bucket when we check on saturday
 		if yesterday == 'Saturday':
 			good = f"Items were found in the {ddbs3_key} s3 bucket from Friday's runs. Aggregating Saturday's results to that existing data."
@@ -163,11 +174,17 @@ def lambda_handler(event, context):
 			warning = "WARNING - Object existed in s3 bucket when there should have been nothing found. Aggregating with current results."
 			logging.warning(warning)
 			logging_aggregator(warning)
-		response = s3.get_object(Bucket=S3_BUCKET, Key=ddbs3_key)
-		# creates a list from the json info in the s3 bucket
-		data = json.loads(response["Body"].read())
-		# add all items from the list into our current set
-		follows_aggregation.update(data)
+		# add the dids from the object into our current set, it reads either the compact format or an old json list
+		existing_follows = CohortObject(s3, S3_BUCKET, ddbs3_key)
+		ddb_response = table.get_item(Key={'DOW': DDB_DELSTATS_KEY})
+		checkpoint = ddb_response.get('Item')
+		if checkpoint is not None and checkpoint.get(DDB_ATTR_COHORT) == f'{ddbs3_key} {head.get("ETag", "")}':
+			# the delete lambda already went through the start of the list, so just the rest of it and its retries carry over
+			delete_checkpoint = checkpoint
+			follows_aggregation.update(existing_follows.dids(int(checkpoint[DDB_ATTR_OFFSET])))
+			follows_aggregation.update(checkpoint.get(DDB_ATTR_RETRY, []))
+		else:
+			follows_aggregation.update(existing_follows.dids())
 	except s3.exceptions.ClientError as e:
 		if e.response["Error"]["Code"] == "404":
 				logging.info("Clear to proceed - object did not exist in s3 bucket")
@@ -180,8 +197,22 @@ def lambda_handler(event, context):
 			'body': json.dumps(err)
 		}
 
-	# now it's time to iterate through our the attributes on our dynamodb key
+	# now it's time to read the day's runs out of the follows table, a query page at a time
 	count_runs_combined = 0 # for logging purposes
+	try:
+		cohort_follows, cohort_runs, cohort_keys = read_cohort(follows_table, ddbs3_key)
+	except Exception as e:
+		err = f"ERROR - failed to query the day's runs from the follows table: {e}"
+		logging.error(err)
+		logging_aggregator(err)
+		return {
+			'statusCode': 500,
+			'body': json.dumps(err)
+		}
+	count_runs_combined += len(cohort_runs)
+	follows_aggregation.update(cohort_follows)
+
+	# runs from before the follows table were attributes on a single item under the day's key in the main table, so pick up any of those too
 	try:
 		ddb_response = table.get_item(
 				Key={'DOW': ddbs3_key},
@@ -195,39 +226,28 @@ def lambda_handler(event, context):
 			'body': json.dumps(err)
 		}
 	logging.info('ddb response:', ddb_response)
-	# this if else checks to see if there is anything
-	if 'Item' not in ddb_response:
-		warning = 'WARNING - found no items in this key, runs may have failed yesterday'
-		logger.warning(warning)
-		logging_aggregator(warning)
-	else:
-		count_runs_combined = len(ddb_response['Item'])
+	if 'Item' in ddb_response:
 		for attribute in ddb_response['Item']: # this iterates through all the attributes in the key
-			# for val in ddb_response['Item'][attribute]: # and this iterates through all of the values in the value of that key
-			# instead of iterating through all the values we'll just add them all into the set directly
-			# print('attr', ddb_response['Item'][attribute])
+			if attribute == PRIMARY_KEY:
+				continue
+			count_runs_combined += 1
 			follows_aggregation.update(ddb_response['Item'][attribute])
 
-		# after finishing iterating through all of the attributes we can delete this key from the dynamodb to clear out all the previous runs
-		try:
-			table.delete_item(
-				Key={'DOW': ddbs3_key}
-			)
-		except Exception as e:
-			err = f"ERROR - failed to delete item {ddbs3_key} from dynamodb: {e}"
-			logging.error(err)
-			logging_aggregator(err)
-			# don't want to skip putting the list in so we won't return here
+	# this checks to see if there was anything
+	if count_runs_combined == 0:
+		warning = 'WARNING - found no items in this key, runs may have failed yesterday'
+		logger.warning(warning)
+		logging_aggregator(warning)
 	# print(follows_aggregation)
 
 	# now we've aggregated all the values, so we just need to put that into s3
-	aggregate_list = list(follows_aggregation)
+	aggregate_list = sorted(follows_aggregation)
 	try:
-		s3.put_object(
+		put_response = s3.put_object(
 			Bucket=S3_BUCKET,
 			Key=ddbs3_key,
-			Body=json.dumps(aggregate_list),
-			ContentType="application/json"
+			Body=encode_cohort(aggregate_list),
+			ContentType=COHORT_CONTENT_TYPE
 		)
 		logging_aggregator(f'Successfully aggregated follows from {ddbs3_key}. Today there were {count_runs_combined} runs, with a total of {len(aggregate_list)} follows.')
 	except Exception as e:
@@ -239,6 +259,57 @@ def lambda_handler(event, context):
 				'body': json.dumps(err)
 			}
 
+	# the day's runs are safe in s3 now, so they can be cleared out of the follows table and the old single item. if the put failed we returned
+	# above and they're all still there for the next try
+	if 'Item' in ddb_response:
+		try:
+			table.delete_item(
+				Key={'DOW': ddbs3_key}
+			)
+		except Exception as e:
+			err = f"ERROR - failed to delete item {ddbs3_key} from dynamodb: {e}"
+			logging.error(err)
+			logging_aggregator(err)
+			# the list is already in so we won't return here
+	if len(cohort_keys) > 0:
+		try:
+			delete_cohort(follows_table, cohort_keys)
+		except Exception as e:
+			err = f"ERROR - failed to delete the {ddbs3_key} runs from the follows table: {e}"
+			logging.error(err)
+			logging_aggregator(err)
+			# the list is already in so we won't return here
+
+	# the delete lambda's checkpoint moves over to the new object: its retries are in there now, so it starts it from the top and keeps its running stats
+	if delete_checkpoint is not None:
+		try:
+			table.update_item(
+				Key={'DOW': DDB_DELSTATS_KEY},
+				UpdateExpression='SET #cohort = :cohort, #offset = :offset, #retry = :retry',
+				# only if the delete lambda hasn't moved it since we read it
+				ConditionExpression='#cohort = :old_cohort AND #offset = :old_offset',
+				ExpressionAttributeNames={
+					'#cohort': DDB_ATTR_COHORT,
+					'#offset': DDB_ATTR_OFFSET,
+					'#retry': DDB_ATTR_RETRY
+				},
+				ExpressionAttributeValues={
+					':cohort': f'{ddbs3_key} {put_response.get("ETag", "")}',
+					':offset': 0,
+					':retry': [],
+					':old_cohort': delete_checkpoint[DDB_ATTR_COHORT],
+					':old_offset': delete_checkpoint[DDB_ATTR_OFFSET]
+				}
+			)
+		except Exception as e:
+			err = f"ERROR - failed to move the delete lambda's checkpoint over to the new {ddbs3_key} object, it will start the list over: {e}"
+			logger.error(err)
+			logging_aggregator(err)
+			return {
+				'statusCode': 207,
+				'body': json.dumps(err)
+			}
+
 	return {
 		'statusCode': 200,
 		'body': json.dumps('Successfully aggregated follows.')
@@ -2,17 +2,17 @@
 checks all of the follows from this day one week ago, and unfollows any users that did not follow back.
 	logging should record stats of follows-follow backs from that day as well as number of accounts that were deleted.
 	Should consume as much of the list in the s3 bucket as possible, and return early if there's nothing in the bucket to delete.
-	After processing as much as possible the function will log how much it did, how much is remaining, and it will save in the dynamodb deletions stats what the current counts of everything are.
-	When the s3 bucket is completely emptied out, the s3 object will be deleted, and the dynamodb deletions stats will be finished and logged for the sum of the day.
+	After processing as much as possible the function will log how much it did, how much is remaining, and it will save a checkpoint in dynamodb with how far into the list it got, the users to retry, and the current counts of everything.
+	The next call picks up from the checkpoint, the s3 object itself is never rewritten.
+	When the whole list (and the retries) is done, the s3 object will be deleted, and the checkpoint will be cleared and its stats logged for the sum of the day.
 
 	Args:
 		None
 	Returns:
 		None
 """
-# aws stuff
-import boto3
-from botocore.exceptions import ClientError
+# boto3 (aws) and atproto (bluesky) are heavy, so they're imported inside the handler right where they're first needed.
+# that way the saturday skip and the nothing-left-to-delete runs don't pay for atproto at all. see tools/startup_benchmark.py
 # json necessary to parse secret string, and write/read s3 objects
 import json
 # datetime is necessary for our ddb and s3 schema
@@ -21,10 +21,13 @@ import zoneinfo
 # for logging
 import base64
 import requests
-# import bluesky api
-from atproto import Client
-# this is the exception that is raised when we try to find a
-from atproto.exceptions import BadRequestError
+# the most a list call hands back in one page
+from rickybot_paging import PAGE_LIMIT
+# the followback checks are looked up a chunk of profiles at a time, a few chunks at once
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice, chain
+# the week old follows are a compact cohort object in s3, read a block at a time as the list is worked through
+from rickybot_cohorts import CohortObject
 # replace prints with logging
 import logging
 
@@ -38,7 +41,10 @@ DDB = 'dynamodb'
 S3 = 's3'
 DDB_TABLE = 'rickybot-ddb'
 S3_BUCKET = 'rickybot-s3'
-DDB_DELSTATS_KEY = 'DEL-STATS'
+DDB_DELSTATS_KEY = 'DEL-STATS' # the checkpoint for the cohort being worked through: where we got to, what needs a retry, and the running stats
+DDB_ATTR_COHORT = 'COHORT' # which s3 object the checkpoint is for, its key and etag
+DDB_ATTR_OFFSET = 'OFFSET' # how far into the object we've processed
+DDB_ATTR_RETRY = 'RETRY' # dids we failed to delete, tried again once the object is done
 DDB_ATTR_PROCESSED = 'PROCESSED'
 DDB_ATTR_DNE = 'DNE'
 DDB_ATTR_FOLLOWBACKS = 'FOLLOWBACKS'
@@ -61,6 +67,9 @@ BRANCH = "main"
 
 MY_DID = 'did:plc:ktkc7jfakxzjpooj52ffc6ra'
 
+PROFILES_PER_LOOKUP = 25 # the most app.bsky.actor.getProfiles takes in one call
+PROFILE_LOOKUP_WORKERS = 4 # how many of those calls can be out at once
+
 def lambda_handler(event, context):
 	# get the day of the week so we know what dynamodb key to pull from and which bucket to aggregate to
 	# doing this first because we do not run this on saturday and can bail out early if we get into this code for some reason
@@ -83,6 +92,7 @@ def lambda_handler(event, context):
 
 	# connect to aws
 	try:
+		import boto3
 		aws_session = boto3.session.Session()
 	except Exception as e:
 		err = f'ERROR - failed to begin AWS session: {e}'
@@ -178,12 +188,13 @@ def lambda_handler(event, context):
 
 	# pull the object from s3 - if there is nothing in there we can return early
 	try:
-		s3.head_object(Bucket=S3_BUCKET, Key=s3_key)
+		head = s3.head_object(Bucket=S3_BUCKET, Key=s3_key)
 		logger.info("Object existed in s3 bucket.")
-		response = s3.get_object(Bucket=S3_BUCKET, Key=s3_key)
-		# creates a list from the json info in the s3 bucket
-		old_follows = json.loads(response["Body"].read())
-		logger.info(len(old_follows), type(old_follows), old_follows)
+		# the etag changes whenever the object is written, so a checkpoint from some other week's list is never picked back up
+		cohort_id = f'{s3_key} {head.get("ETag", "")}'
+		# just the header and block index for now, the blocks of dids are downloaded as we get to them
+		old_follows = CohortObject(s3, S3_BUCKET, s3_key)
+		logger.info(f'{len(old_follows)} follows in the list')
 	except s3.exceptions.ClientError as e:
 		if e.response["Error"]["Code"] == "404": # object was not found at the key
 			# this isn't necessarily an ERROR because we're going to do more deletion runs than we need, but logging as an error to make sure it shows up
@@ -199,10 +210,52 @@ def lambda_handler(event, context):
 		logger.error(err)
 		logging_deletions(err)
 
+	# pull up the checkpoint from dynamodb to see where the last call got to. it's not a problem if there's nothing there, it just means this is the first deletion run for the list
+	offset = 0
+	retry_follows = []
+	prev_processed = 0
+	prev_dne = 0
+	prev_followbacks = 0
+	prev_no_followback = 0
+	try:
+		ddb_response = table.get_item(
+				Key={'DOW': DDB_DELSTATS_KEY},
+		)
+	except Exception as e:
+		# without the checkpoint we'd start the list over and count everyone twice, so wait for the next call
+		err = f"ERROR - failed to check ddb key's existence: {e}"
+		logger.error(err)
+		logging_deletions(err)
+		return {
+			'statusCode': 500,
+			'body': json.dumps(err)
+		}
+	if 'Item' in ddb_response:
+		checkpoint = ddb_response['Item']
+		if checkpoint.get(DDB_ATTR_COHORT, cohort_id) != cohort_id:
+			warning = f'WARNING - found a checkpoint for {checkpoint[DDB_ATTR_COHORT]} instead of {cohort_id}, its stats were never logged. starting this list from the beginning.'
+			logger.warning(warning)
+			logging_deletions(warning)
+		else:
+			# checkpoints from before the offset was kept only have the stats, and the object was already cut down to what was left, so those start at 0
+			offset = int(checkpoint.get(DDB_ATTR_OFFSET, 0))
+			retry_follows = list(checkpoint.get(DDB_ATTR_RETRY, []))
+			prev_processed = int(checkpoint[DDB_ATTR_PROCESSED])
+			prev_dne = int(checkpoint[DDB_ATTR_DNE])
+			prev_followbacks = int(checkpoint[DDB_ATTR_FOLLOWBACKS])
+			prev_no_followback = int(checkpoint[DDB_ATTR_NOFOLLOWBACK])
+
 	# and now we can log into the bluesky client
 	try:
-		client = Client()
-		client.login(BSKY_USERNAME, BSKY_PASSWORD)
+		# import bluesky api
+		from atproto import Client
+		# every call the client makes is paced against the rate limits, waiting for the budget instead of failing
+		from rickybot_ratelimit import RateLimiter, is_rate_limit_error, MAX_WAIT
+		rate_limiter = RateLimiter(max_wait=int(secret_map.get('ratelimit_max_wait', MAX_WAIT)))
+		client = rate_limiter.attach(Client())
+		# picks the saved session back up instead of logging in with the password every run
+		from rickybot_session import log_in
+		log_in(client, BSKY_USERNAME, BSKY_PASSWORD, table, PRIMARY_KEY)
 	except Exception as e:
 		err = f'ERROR - failed to log in to the bluesky client: {e}'
 		logger.error(err)
@@ -225,7 +278,7 @@ def lambda_handler(event, context):
 
 	# initialize our deletion stats for our logging and dynamodb record
 	processed_count = 0
-	failed_to_delete = [] # if any fail we can add them back in and retry later
+	failed_to_delete = [] # if any fail they go in the checkpoint's retries for later
 	count_users_dne = 0 # if we fail to find on lookup the account does not exist anymore
 	followed_back = 0
 	no_followback = 0
@@ -234,27 +287,60 @@ def lambda_handler(event, context):
 	muted_user_count = 0
 	muted_fails = 0
 
-	# now go through the followers, check if they still exist, see if they followed back, delete if necessary
-	for user_did in old_follows:
+	# looks up the profiles a chunk at a time, keeping a few chunks ahead of where we're at, and hands back (did, profile or None, error) in list order.
+	# getProfiles just leaves out accounts that were banned or deleted, the same ones getProfile gave a bad request error for, so those come back as None
+	# dids is read as it goes, so only the part of the list we get through (plus the chunks ahead) is ever downloaded
+	def lookup_profiles(dids):
+		def lookup_chunk(chunk):
+			response = client.get_profiles(actors=chunk)
+			return {profile.did: profile for profile in response.profiles}
+		dids = iter(dids)
+		def next_chunk():
+			chunk = list(islice(dids, PROFILES_PER_LOOKUP))
+			return chunk, executor.submit(lookup_chunk, chunk) if len(chunk) > 0 else None
+		executor = ThreadPoolExecutor(max_workers=PROFILE_LOOKUP_WORKERS)
+		try:
+			ahead = [next_chunk() for _ in range(PROFILE_LOOKUP_WORKERS)]
+			while len(ahead[0][0]) > 0:
+				chunk, future = ahead.pop(0)
+				# keep the pool busy with the next chunk as soon as this one is taken
+				ahead.append(next_chunk())
+				try:
+					profiles = future.result()
+				except Exception as e:
+					for user_did in chunk:
+						yield user_did, None, e
+					continue
+				for user_did in chunk:
+					yield user_did, profiles.get(user_did), None
+		finally:
+			# once we stop (deletion cap, too many errors) nothing else gets looked up
+			executor.shutdown(wait=False, cancel_futures=True)
+
+	# now go through the followers from where the checkpoint left off, check if they still exist, see if they followed back, delete if necessary. then the retries
+	list_length = len(old_follows) - offset + len(retry_follows)
+	profile_lookups = lookup_profiles(chain(old_follows.dids(offset), retry_follows))
+	last_lookup_error = None
+	# first we have to get the profile of the user, which was looked up along with the rest of its chunk
+	for user_did, user_profile, lookup_error in profile_lookups:
 		processed_count += 1
 		if user_did == MY_DID:
 			# this shouldn't happen but we'll cover it anyway
 			continue
-		# first we have to try to get the profile of the user
-		try:
-			user_profile = client.get_profile(actor=user_did)
-		except BadRequestError as e:
-			# if we get a bad request error it means that the profile was either banned or deleted. Nothing else to do with them, but I want to keep track of these.
-			# we could really validate this by using the next line of code, but it's overkill - I don't want to get hyperspecific
-			# if e.response.content.message == 'Profile not found':
-			count_users_dne += 1
-		except Exception as e:
-			# if we had a general exception then we should retry this user later, probably just timed out or something.
+		if lookup_error is not None:
+			# if we had a general exception then we should retry this user later, probably just timed out or something. a failed chunk only counts as one error
 			failed_to_delete.append(user_did)
-			logger.warning(f'general exception getting profile of user {user_did}. {repr(e)}: {e}')
-			error_count += 1
-			if error_count > 3: # something's going wrong with this run, either rate limiting or timing out for some reason
+			if lookup_error is not last_lookup_error:
+				last_lookup_error = lookup_error
+				logger.warning(f'general exception getting profiles starting at user {user_did}. {repr(lookup_error)}: {lookup_error}')
+				error_count += 1
+			if error_count > 3 or is_rate_limit_error(lookup_error): # something's going wrong with this run, either out of rate limit budget or timing out for some reason
 				break
+			continue
+		if user_profile is None:
+			# if the profile wasn't found it means that the profile was either banned or deleted. Nothing else to do with them, but I want to keep track of these.
+			count_users_dne += 1
+			continue
 
 		user_didnt_followback = True if user_profile.viewer.followed_by == None else False
 		if user_didnt_followback:
@@ -274,9 +360,11 @@ def lambda_handler(event, context):
 			except Exception as e:
 				# something went wrong and we failed to delete this user, it's extremely rare for this to happen unless you're just rate limited, so save this for later
 				failed_to_delete.append(user_did)
+				no_followback -= 1 # they get counted when the retry goes through
 				logger.warning(f'exception encountered deleting user {user_profile.handle}. {repr(e)}: {e}')
 				error_count += 1
-				if error_count > 7: # we're probably getting rate limited, so stop processing users
+				# the rate limiter already waited as long as it could, so a rate limit error here means the budget is gone. stop processing users
+				if error_count > 7 or is_rate_limit_error(e):
 					break
 			finally:
 				if no_followback >= DELETION_MAX: # check to see if we reached the hard cap on deletions so you don't get rate limited.
@@ -284,6 +372,8 @@ def lambda_handler(event, context):
 		else:
 			followed_back += 1
 
+	profile_lookups.close()
+
 	# get a new follow count to show the change
 	following_after = 0
 	try:
@@ -295,20 +385,25 @@ def lambda_handler(event, context):
 		logging_deletions(warning)
 	# get a new mutes count to show change
 	mutes_after = 0
+	more_mutes = False
 	try:
-		mutes_after = len(client.app.bsky.graph.get_mutes().mutes)
+		# just the first page. every unfollowed user gets muted, so paging through them all would eat more of the read budget every day for a log line
+		mutes_response = client.app.bsky.graph.get_mutes({'limit': PAGE_LIMIT})
+		mutes_after = len(mutes_response.mutes)
+		more_mutes = mutes_response.cursor is not None
 	except:
 		warning = 'WARNING - failed to get updated follow count'
 		print(warning)
 		logging_deletions(warning)
 
-	# add any users that we failed to delete back to the end of the list. hopefully this should usually be 0
-	old_follows.extend(failed_to_delete)
+	# where we got to: the list first, then the retries. any users that we failed to delete go on the end of the retries. hopefully this should usually be 0
+	new_offset = min(len(old_follows), offset + processed_count)
+	retries_done = processed_count - (new_offset - offset)
+	retry_follows = retry_follows[retries_done : ] + failed_to_delete
 	# logging flags
-	s3_reupload = -1
 	s3_deletion_success = False
 	# now we check to see if we made it to the end of the list.
-	if processed_count >= len(old_follows):
+	if new_offset >= len(old_follows) and len(retry_follows) == 0:
 		finished_deleting = True
 		# now delete the s3 object
 		try:
@@ -319,83 +414,46 @@ def lambda_handler(event, context):
 			err = f'ERROR - failed to delete the list of follows from the s3 bucket: {e}'
 			logger.error(err)
 			logging_deletions(err)
-	else:
-		# take a slice from wherever we got to until the end of the list, and then we'll stick that back into s3
-		leftover_follows = old_follows[processed_count : ]
+
+	# log our progress through the list of deletions
+	logging_deletions(f'Processed {processed_count} users from the list of {list_length}.{"" if len(failed_to_delete) == 0 else f" {len(failed_to_delete)} failures were encountered and need to be retried."} From this batch of deletions {followed_back} users followed back, {no_followback} did not follow back and were deleted, and {count_users_dne} accounts no longer exist. {muted_user_count} of the unfollowed users were successfully muted, with {muted_fails} errors.\n  Follows count - now: {following_after} | prev: {following_before}{"" if mutes_after == 0 else f"| mutes: "+("≥ " if more_mutes else "")+str(mutes_after)}{"" if finished_deleting else f". {len(old_follows) - new_offset + len(retry_follows)} users left, picking up at {new_offset} of {len(old_follows)} next run."}\n  {rate_limiter.report().strip()} | s3 read: {old_follows.report()}')
+
+	# add this run's stats to the ones from the checkpoint. the users going back for a retry get counted when they're done
+	processed_count += prev_processed - len(failed_to_delete)
+	count_users_dne += prev_dne
+	followed_back += prev_followbacks
+	no_followback += prev_no_followback
+
+	# now log the statistics
+	if finished_deleting:
+		# the day is done, so the checkpoint can go
 		try:
-			s3.put_object(
-				Bucket=S3_BUCKET,
-				Key=s3_key,
-				Body=json.dumps(leftover_follows),
-				ContentType="application/json"
+			table.delete_item(
+				Key={'DOW': DDB_DELSTATS_KEY}
 			)
-			s3_reupload = len(leftover_follows)
-			logger.info(f'successfully uploaded the list of remaining follows to check to s3.')
 		except Exception as e:
-			err = f"ERROR - failed to upload list of leftover follows to s3: {e}"
+			err = f"ERROR - failed to delete item {DDB_DELSTATS_KEY} from dynamodb: {e}"
 			logger.error(err)
 			logging_deletions(err)
-			# don't terminate early here, we want the stats still
-
-	# log our progress through the list of deletions, noting the status of the s3 reupload if it occurred
-	logging_deletions(f'Processed {processed_count} users from the list of {len(old_follows)}.{"" if len(failed_to_delete) == 0 else f" {len(failed_to_delete)} failures were encountered and need to be retried."} From this batch of deletions {followed_back} users followed back, {no_followback} did not follow back and were deleted, and {count_users_dne} accounts no longer exist. {muted_user_count} of the unfollowed users were successfully muted, with {muted_fails} errors.\n  Follows count - now: {following_after} | prev: {following_before}{"" if mutes_after == 0 else f"| mutes: "+str(mutes_after)}{f". Successfully reuploaded remaining {s3_reupload} users to s3." if s3_reupload > 0 else ""}')
-	
-
-	# pull up dynamodb, see if there were old stats, and add them to our current stats
-	try:
-		ddb_response = table.get_item(
-				Key={'DOW': DDB_DELSTATS_KEY},
-		)
-	except Exception as e:
-		err = f"ERROR - failed to check ddb key's existence: {e}"
-		logger.error(err)
-		logging_deletions(err)
-		# don't want to return here in case this was our final run and we can still print stats
-
-	logger.info('ddb response:', ddb_response)
-	# it's not a problem if there was nothing in the response, it just means this was the first deletion of the day
-	if 'Item' in ddb_response:
-		processed_count += ddb_response['Item'][DDB_ATTR_PROCESSED]
-		count_users_dne += ddb_response['Item'][DDB_ATTR_DNE]
-		followed_back += ddb_response['Item'][DDB_ATTR_FOLLOWBACKS]
-		no_followback += ddb_response['Item'][DDB_ATTR_NOFOLLOWBACK]
-
-		# after finishing iterating through all of the attributes we can delete this key from the dynamodb to clear out all the previous runs
-		if finished_deleting:
-			try:
-				table.delete_item(
-					Key={'DOW': DDB_DELSTATS_KEY}
-				)
-			except Exception as e:
-				err = f"ERROR - failed to delete item {DDB_DELSTATS_KEY} from dynamodb: {e}"
-				logger.error(err)
-				logging_deletions(err)
-
-	# now log the statistics regardless of if there was anything in ddb (there will not be if there was only one deletion run for the day)
-	if finished_deleting:
-			conversion_rate = round(followed_back / (followed_back + no_followback) * 100, 2)
-			logging_deletions(f"Finished {s3_key}. Last week's follows have been pruned. {'Object was successfully deleted from s3 bucket. ' if s3_deletion_success else ''}TODAY'S STATS: \n  {processed_count} total follows processed. \n  {followed_back} users followed back. \n  {no_followback} did not follow back and were deleted. \n  {count_users_dne} accounts no longer exist. \n  {conversion_rate}% Conversion Rate.")
+		conversion_rate = round(followed_back / (followed_back + no_followback) * 100, 2) if followed_back + no_followback > 0 else 0.0
+		logging_deletions(f"Finished {s3_key}. Last week's follows have been pruned. {'Object was successfully deleted from s3 bucket. ' if s3_deletion_success else ''}TODAY'S STATS: \n  {processed_count} total follows processed. \n  {followed_back} users followed back. \n  {no_followback} did not follow back and were deleted. \n  {count_users_dne} accounts no longer exist. \n  {conversion_rate}% Conversion Rate.")
 	else:
-		# if we're not finished deleting then we update the ddb delstats for next run
+		# if we're not finished deleting then we save the checkpoint for next run. it's one put, so the offset, retries and stats always go together
 		try:
-			table.update_item(
-				Key={'DOW': DDB_DELSTATS_KEY},
-				UpdateExpression='SET #attr1 = :val1, #attr2 = :val2, #attr3 = :val3, #attr4 = :val4',
-				ExpressionAttributeNames={
-					'#attr1': DDB_ATTR_PROCESSED,
-					'#attr2': DDB_ATTR_DNE,
-					'#attr3': DDB_ATTR_FOLLOWBACKS,
-					'#attr4': DDB_ATTR_NOFOLLOWBACK
-				},
-				ExpressionAttributeValues={
-					':val1': processed_count,
-					':val2': count_users_dne,
-					':val3': followed_back,
-					':val4': no_followback
+			table.put_item(
+				Item={
+					'DOW': DDB_DELSTATS_KEY,
+					DDB_ATTR_COHORT: cohort_id,
+					DDB_ATTR_OFFSET: new_offset,
+					DDB_ATTR_RETRY: retry_follows,
+					DDB_ATTR_PROCESSED: processed_count,
+					DDB_ATTR_DNE: count_users_dne,
+					DDB_ATTR_FOLLOWBACKS: followed_back,
+					DDB_ATTR_NOFOLLOWBACK: no_followback
 				}
 			)
 		except Exception as e:
-			err = f'ERROR - completed deletions but failed to store running deletion statistics in dynamodb.\n{e}'
+			err = f'ERROR - completed deletions but failed to store the deletion checkpoint in dynamodb.\n{e}'
 			logger.error(err)
 			logging_deletions(err)
 			return {
@@ -1,7 +1,4 @@
-from atproto import Client
-# aws stuff
-import boto3
-from botocore.exceptions import ClientError
+# boto3 (aws) and atproto (bluesky) are heavy, so they're imported inside the handler right where they're first needed. see tools/startup_benchmark.py
 # json necessary to parse secret string, and write/read s3 objects
 import json
 # these imports are to use github apis to do logging, base64 is to parse the json
@@ -10,6 +7,10 @@ import base64
 # datetime for logging
 import datetime
 import zoneinfo
+# cursor paging for the followers and follows lists, the next page is fetched in the background while the current one is processed
+from rickybot_paging import paginate
+# the followers and follows are kept in s3 as a base snapshot plus a delta per run, diffed as sorted did lists
+from rickybot_snapshots import SnapshotStore, diff_sorted, common_sorted
 # replace prints with logging
 import logging
 
@@ -20,13 +21,17 @@ logger.setLevel(logging.WARNING)  # Ensure errors are logged
 REGION = 'us-east-2'
 SECRETS_ID = 'Rickybot-Login-Credentials'
 
-# this file doesn't need ddb access
-# DDB = 'dynamodb'
+# ddb is only used for the saved bluesky session
+DDB = 'dynamodb'
 S3 = 's3'
-# DDB_TABLE = 'rickybot-ddb'
+DDB_TABLE = 'rickybot-ddb'
+PRIMARY_KEY = 'DOW' # the dynamodb table's primary key. there is no sort key
 S3_BUCKET = 'rickybot-s3'
 S3_KEY_FOLLOWING_YOU = 'STATUS-FOLLOWING-YOU' # unlike the others that have a key determined by the day of the week, this will check the same spot every time.
 S3_KEY_WHO_YOU_FOLLOW = 'STATUS-WHO-YOU-FOLLOW'
+# the snapshots live under these prefixes now. the full maps at the keys above are only read the first time, to start the snapshots off
+S3_PREFIX_FOLLOWING_YOU = 'STATUS-SNAPSHOTS/FOLLOWING-YOU'
+S3_PREFIX_WHO_YOU_FOLLOW = 'STATUS-SNAPSHOTS/WHO-YOU-FOLLOW'
 
 
 USER_TIMEZONE = "US/Eastern"
@@ -36,6 +41,7 @@ BRANCH = "main"
 def lambda_handler(event, context):
 	# connect to aws
 	try:
+		import boto3
 		aws_session = boto3.session.Session()
 	except:
 		err = 'ERROR - failed to begin AWS session'
@@ -120,8 +126,14 @@ def lambda_handler(event, context):
 
 	# log in to bluesky
 	try:
-		client = Client()
-		client.login(BSKY_USERNAME, BSKY_PASSWORD)
+		from atproto import Client
+		# every call the client makes is paced against the rate limits, waiting for the budget instead of failing
+		from rickybot_ratelimit import RateLimiter, is_rate_limit_error, MAX_WAIT
+		rate_limiter = RateLimiter(max_wait=int(secret_map.get('ratelimit_max_wait', MAX_WAIT)))
+		client = rate_limiter.attach(Client())
+		# picks the saved session back up instead of logging in with the password every run
+		from rickybot_session import log_in
+		log_in(client, BSKY_USERNAME, BSKY_PASSWORD, aws_session.resource(DDB).Table(DDB_TABLE), PRIMARY_KEY)
 	except:
 		err = 'ERROR - failed to log in to bluesky'
 		logging.error(err)
@@ -131,26 +143,15 @@ def lambda_handler(event, context):
 			'body': json.dumps(err)
 		}
 
-	# get the current list of bluesky followers we'll create a map of follower_id: follow_uri, and follow_uri will identify if we follow them
+	# get the current list of bluesky followers we'll create a map of follower did: follow_uri, and follow_uri will identify if we follow them
 	try:
 		current_followers = {}
 		followers_count = client.get_profile(actor=BSKY_USERNAME).followers_count
-		remaining = followers_count
-		next_page = ''
-		while remaining > 0:
-			logging.info(f'starting the next page of followers. {remaining} followers remaining to check.')
-			cur_limit = min(remaining, 100)
-			remaining -= cur_limit
-			followers = client.get_followers(actor=BSKY_USERNAME, cursor= next_page, limit=cur_limit)
-			next_page = followers.cursor
-			followers = followers.followers
-			for user in followers:
-				did = user.did
-				handle = user.handle
-				follow_uri = user.viewer.following
-				# logging.info(handle, did, follow_uri)
-				# handles can change we only want to deal with the did
-				current_followers[handle] = follow_uri
+		logging.info(f'{followers_count} followers to check.')
+		# goes until the cursor runs out rather than stopping at the profile count, which can lag behind
+		for user in paginate(lambda cursor, limit: client.get_followers(actor=BSKY_USERNAME, cursor= cursor, limit=limit), 'followers'):
+			# handles can change we only want to deal with the did
+			current_followers[user.did] = user.viewer.following
 	except:
 		err = 'ERROR - failed to gather current followers'
 		logging.error(err)
@@ -159,59 +160,59 @@ def lambda_handler(event, context):
 			'statusCode': 500,
 			'body': json.dumps(err)
 		}
+	current_followers_sorted = sorted(current_followers.items())
 
-	# now we get the old list of our followers from s3
-	# then if we find an old list in our bucket we compare it to the new list and unfollow anyone who is not in our new list.
+	# now we get the old snapshot of our followers from s3
+	# then if we find an old snapshot we compare it to the new list and unfollow anyone who is not in our new list.
 	count_removed = 0
 	count_failed_removal = 0
 	success_for_followers = False
+	followers_load_failed = False # the snapshot store writes a fresh base when this happens, but the run should still say so
 	error_count = 0
 	mute_count = 0
+	followers_store = SnapshotStore(s3, S3_BUCKET, S3_PREFIX_FOLLOWING_YOU, legacy_key=S3_KEY_FOLLOWING_YOU)
+	followers_changes = []
 	try:
-		s3.head_object(Bucket=S3_BUCKET, Key=S3_KEY_FOLLOWING_YOU)
-		logging.info("Object existed in s3 bucket.")
-		response = s3.get_object(Bucket=S3_BUCKET, Key=S3_KEY_FOLLOWING_YOU)
-		# creates a list from the json info in the s3 bucket
-		old_followers = json.loads(response["Body"].read())
-		logging.info(old_followers, type(old_followers))
-		for user_did, follow_uri in old_followers.items():
-			if user_did not in current_followers:
+		old_followers = followers_store.load()
+		if old_followers is None:
+			err = "ERROR - there was no previous followers list found in the s3 bucket. Adding the new list of followers."
+			logging.error(err)
+			logging_status(err)
+		else:
+			logging.info(f'{len(old_followers)} followers in the last snapshot')
+			# the two lists are sorted by did, so one pass over both finds everyone who came or went
+			followers_changes = list(diff_sorted(old_followers, current_followers_sorted))
+			stopped_following = [(user_did, follow_uri) for change, user_did, follow_uri, new_uri in followers_changes if change == '-']
+			for user_did, follow_uri in stopped_following:
 				logging.info('not in followers', user_did)
 				try:
-					client.delete_follow(follow_uri)
-					count_removed += 1
-					client.mute(user_did)
-					mute_count += 1
+					if follow_uri is not None: # we might not have been following them either
+						client.delete_follow(follow_uri)
+						count_removed += 1
+						client.mute(user_did)
+						mute_count += 1
 				except Exception as e:
 					# logging.error(f'failed on {i} - uri: {follow_uri} \n {e}')
 					count_failed_removal +=1
 					error_count += 1
-					if error_count > 7: # we're probably getting rate limited, so stop processing users
+					# the rate limiter already waited as long as it could, so a rate limit error here means the budget is gone. stop processing users
+					if error_count > 7 or is_rate_limit_error(e):
 						break
-		follow_diff = len(current_followers) - len(old_followers)
-		logging_status(f'followers status - {"up" if follow_diff >= 0 else "down"} {abs(follow_diff)} followers this week. {count_removed + count_failed_removal} users stopped following. {count_removed} were successfully unfollowed, with {count_failed_removal} failures.')
-	except s3.exceptions.ClientError as e:
-		if e.response["Error"]["Code"] == "404": # object was not found at the key
-			err = "ERROR - there was no previous followers list found in the s3 bucket. Adding the new list of followers."
-			logging.error(err)
-			logging_status(err)
-		else:
-			err = "ERROR - failed to access the s3 bucket to get previous followers."
-			logging.error(err)
-			logging_status(err)
+			follow_diff = len(current_followers) - len(old_followers)
+			logging_status(f'followers status - {"up" if follow_diff >= 0 else "down"} {abs(follow_diff)} followers this week. {len(stopped_following)} users stopped following. {count_removed} were successfully unfollowed, with {count_failed_removal} failures.')
+	except Exception as e:
+		err = f"ERROR - failed to access the s3 bucket to get previous followers: {e}"
+		logging.error(err)
+		logging_status(err)
+		followers_load_failed = True
 	finally:
-		# regardless of if we were able to perform the comparison or not we want to input our new list into storage
+		# regardless of if we were able to perform the comparison or not we want to put our new list into storage, as a delta if we could diff it
 		try:
-			s3.put_object(
-					Bucket=S3_BUCKET,
-					Key=S3_KEY_FOLLOWING_YOU,
-					Body=json.dumps(current_followers),
-					ContentType="application/json"
-			)
+			followers_store.save(current_followers_sorted, followers_changes)
 			success_for_followers = True
 		except Exception as e:
-				logging.error(f"ERROR - failed to upload new followers map to s3: {e}")
-				logging_status(f"ERROR - failed to upload new followers map to s3: {e}")
+				logging.error(f"ERROR - failed to upload new followers snapshot to s3: {e}")
+				logging_status(f"ERROR - failed to upload new followers snapshot to s3: {e}")
 				# we will not return here because we still want to try to upload the follows if possible
 
 	# now we're going to repeat this process with our account follows
@@ -219,91 +220,83 @@ def lambda_handler(event, context):
 	cur_who_you_follow = {}
 	following = client.get_profile(actor=BSKY_USERNAME).follows_count
 	logging.info(f'currently following {following} users')
-	next_page = ''
-	remaining = following
-	while remaining > 0:
-		logging.info (f'starting the next page of follows. {remaining} follows remaining to check.')
-		cur_limit = min(remaining, 100)
-		remaining -= cur_limit
-		follows = client.get_follows(actor=BSKY_USERNAME, cursor= next_page, limit=cur_limit)
-		next_page = follows.cursor
-		follows = follows.follows
-		for follow in follows:
-			did = follow.did
-			# handle = follow.handle
-			# following is whether they are following you, it looks like followed_by is if they are following you back.
-			# follows_you = 'FALSE' if follow.viewer.followed_by == None else 'TRUE' # we actually don't need this value at all, but we need a value in the map so might as well put something hypothetically useful and small in memory
-			follow_uri = follow.viewer.following
-			cur_who_you_follow[did] = follow_uri
+	for follow in paginate(lambda cursor, limit: client.get_follows(actor=BSKY_USERNAME, cursor= cursor, limit=limit), 'follows'):
+		# following is whether they are following you, it looks like followed_by is if they are following you back.
+		cur_who_you_follow[follow.did] = follow.viewer.following
 
 	# with a hashmap of our follows to iterate through we're going to do something very similar to the followers
 	# but this time we're going to see if they're in the previous week's follows, and see if they're in the followers hashmap
 	# and if we were following them last week but they're still not a follower, then we delete them.
-	# now we get the old list of our followers from s3
+	# now we get the old snapshot of who we follow from s3
 	count_removed = 0
 	count_failed_removal = 0
 	success_for_who_we_follow = False
+	follows_load_failed = False
 	users_deleted = []
 	error_count = 0 # refresh error count
+	follows_store = SnapshotStore(s3, S3_BUCKET, S3_PREFIX_WHO_YOU_FOLLOW, legacy_key=S3_KEY_WHO_YOU_FOLLOW)
+	prev_who_we_were_following = None
 	try:
-		s3.head_object(Bucket=S3_BUCKET, Key=S3_KEY_WHO_YOU_FOLLOW)
-		logging.info("Object existed in s3 bucket.")
-		response = s3.get_object(Bucket=S3_BUCKET, Key=S3_KEY_WHO_YOU_FOLLOW)
-		# creates a list from the json info in the s3 bucket
-		prev_who_we_were_following = json.loads(response["Body"].read())
-		logging.info(prev_who_we_were_following, type(prev_who_we_were_following))
-		for user_did, follow_uri in cur_who_you_follow.items():
-			# as we iterate what we want to find are people who Were in the previous list and are Not now in the follows list
-			if user_did in prev_who_we_were_following and user_did not in current_followers:
-				logging.info(f'this user is an old follow but is still not a follower: {user_did}')
-				try:
-					client.delete_follow(follow_uri)
-					count_removed += 1
-					client.mute(user_did)
-					mute_count += 1
-					# if we're successfully able to delete the follow we shouldn't keep it in our list of follows too.
-					users_deleted.append(user_did)
-				except Exception as e:
-					# logging.error(f'failed on {i} - uri: {follow_uri} \n {e}')
-					count_failed_removal +=1
-					error_count += 1
-					if error_count > 7: # we're probably getting rate limited, so stop processing users
-						break
-		# now that we're done iterating through the dict we can safely remove all the users that we deleted and should not be included in it
-		for user in users_deleted:
-			del cur_who_you_follow[user]
-		follow_diff = len(cur_who_you_follow) - len(prev_who_we_were_following)
-		logging_status(f'who you follow status - {"up" if follow_diff >= 0 else "down"} {abs(follow_diff)} follows this week. {count_removed + count_failed_removal} users have aged out and were necessary to prune. {count_removed} were successfully unfollowed, with {count_failed_removal} failures. {mute_count} of those users were muted.')
-	except s3.exceptions.ClientError as e:
-		if e.response["Error"]["Code"] == "404": # object was not found at the key
+		prev_who_we_were_following = follows_store.load()
+		if prev_who_we_were_following is None:
 			err = "ERROR - there was no previous list of who we follow found in the s3 bucket. Adding the new list of follows."
 			logging.error(err)
 			logging_status(err)
 		else:
-			err = "ERROR - failed to access the s3 bucket to get previous list of who we follow."
-			logging.error(err)
-			logging_status(err)
+			logging.info(f'{len(prev_who_we_were_following)} follows in the last snapshot')
+			# as we iterate what we want to find are people who Were in the previous list and are Not now in the followers.
+			# both lists are sorted by did, so one pass over them finds the follows that were already there without building a set of the new ones
+			for user_did, follow_uri in common_sorted(prev_who_we_were_following, sorted(cur_who_you_follow.items())):
+				if user_did not in current_followers:
+					logging.info(f'this user is an old follow but is still not a follower: {user_did}')
+					try:
+						client.delete_follow(follow_uri)
+						count_removed += 1
+						client.mute(user_did)
+						mute_count += 1
+						# if we're successfully able to delete the follow we shouldn't keep it in our list of follows too.
+						users_deleted.append(user_did)
+					except Exception as e:
+						# logging.error(f'failed on {i} - uri: {follow_uri} \n {e}')
+						count_failed_removal +=1
+						error_count += 1
+						# the rate limiter already waited as long as it could, so a rate limit error here means the budget is gone. stop processing users
+						if error_count > 7 or is_rate_limit_error(e):
+							break
+			# now that we're done iterating through the dict we can safely remove all the users that we deleted and should not be included in it
+			for user in users_deleted:
+				del cur_who_you_follow[user]
+			follow_diff = len(cur_who_you_follow) - len(prev_who_we_were_following)
+			logging_status(f'who you follow status - {"up" if follow_diff >= 0 else "down"} {abs(follow_diff)} follows this week. {count_removed + count_failed_removal} users have aged out and were necessary to prune. {count_removed} were successfully unfollowed, with {count_failed_removal} failures. {mute_count} of those users were muted.')
+	except Exception as e:
+		err = f"ERROR - failed to access the s3 bucket to get previous list of who we follow: {e}"
+		logging.error(err)
+		logging_status(err)
+		follows_load_failed = True
 	finally:
-		# regardless of if we were able to perform the comparison or not we want to input our new list into storage
+		# regardless of if we were able to perform the comparison or not we want to put our new list into storage
 		try:
-			s3.put_object(
-				Bucket=S3_BUCKET,
-				Key=S3_KEY_WHO_YOU_FOLLOW,
-				Body=json.dumps(cur_who_you_follow),
-				ContentType="application/json"
-			)
+			cur_who_you_follow_sorted = sorted(cur_who_you_follow.items())
+			follows_changes = list(diff_sorted(prev_who_we_were_following, cur_who_you_follow_sorted)) if prev_who_we_were_following is not None else []
+			follows_store.save(cur_who_you_follow_sorted, follows_changes)
 			success_for_who_we_follow = True
 		except Exception as e:
-			err = f"ERROR - failed to upload new map of who we follow to s3: {e}"
+			err = f"ERROR - failed to upload new snapshot of who we follow to s3: {e}"
 			logging.error(err)
 			logging_status(err)
 
-	logging_status(f"s3 update - uploaded followers: {'SUCCESS' if success_for_followers else 'FAILURE'} | uploaded who we follow: {'SUCCESS' if success_for_who_we_follow else 'FAILURE'} ")
+	logging_status(f"s3 update - uploaded followers: {'SUCCESS' if success_for_followers else 'FAILURE'}{' (fresh base, the previous snapshot failed to load)' if followers_load_failed else ''} | uploaded who we follow: {'SUCCESS' if success_for_who_we_follow else 'FAILURE'}{' (fresh base, the previous snapshot failed to load)' if follows_load_failed else ''} | {followers_store.report()} | {follows_store.report()} | {rate_limiter.report().strip()}")
 	if not success_for_followers and not success_for_who_we_follow:
 		return {
 			'statusCode': 500,
 			'body': json.dumps('ERROR - failed all updates to the s3 with current follows and followers')
 		}
+	if followers_load_failed or follows_load_failed:
+		# the new lists were saved as fresh bases, but nothing was compared against last week's so nobody was pruned
+		return {
+			'statusCode': 207,
+			'body': json.dumps(f'WARNING - failed to read the previous snapshot of {" and ".join(name for name, failed in (("followers", followers_load_failed), ("who we follow", follows_load_failed)) if failed)}, wrote a fresh base from the current list instead')
+		}
 	# successfully completed
 	return {
 		'statusCode': 200,
@@ -0,0 +1,142 @@
+# cursor paging for the atproto list endpoints (feeds, likes, followers, follows, mutes), shared by the lambdas
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+PAGE_LIMIT = 100 # the most any of the list endpoints hand back per call
+
+
+def paginate_pages(fetch_page, items_field, max_items=None, page_limit=PAGE_LIMIT, cursor=None, prefetch=True):
+	"""yields pages from a cursor paged atproto list endpoint, carrying the cursor from each page to the next.
+
+	while the caller works through a page the next one is already being requested on a background thread, and as soon as the caller
+	stops (breaks out, returns, or the generator is closed) nothing else gets requested. at most the one page that was already in flight is thrown away.
+
+	Args:
+		fetch_page: function(cursor, limit) that makes one call and returns the response, e.g. lambda cursor, limit: client.get_likes(uri=uri, cursor=cursor, limit=limit)
+		items_field: name of the list on the response, e.g. 'likes', 'followers', 'feed'
+		max_items: stop once this many items have been handed back, None to keep going until the cursor runs out
+		page_limit: most items to ask for per call
+		cursor: cursor to start from, None for the first page
+		prefetch: set to False to fetch each page only when the caller asks for it
+	Yields:
+		the response for each page. the last one is cut down to max_items if it went over
+	"""
+	executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+	next_future = None
+	fetched = 0
+
+	def request(cursor, fetched):
+		limit = page_limit if max_items is None else min(page_limit, max_items - fetched)
+		return fetch_page(cursor, limit)
+
+	try:
+		page = request(cursor, fetched)
+		while True:
+			items = getattr(page, items_field)
+			if max_items is not None and fetched + len(items) > max_items:
+				items = items[ : max_items - fetched]
+				setattr(page, items_field, items)
+			fetched += len(items)
+			cursor = page.cursor
+			more = bool(cursor) and len(items) > 0 and (max_items is None or fetched < max_items)
+			if more and executor is not None:
+				next_future = executor.submit(request, cursor, fetched)
+			yield page
+			if not more:
+				return
+			page = next_future.result() if next_future is not None else request(cursor, fetched)
+			next_future = None
+	finally:
+		if executor is not None:
+			executor.shutdown(wait=False, cancel_futures=True)
+
+
+def paginate(fetch_page, items_field, max_items=None, page_limit=PAGE_LIMIT, cursor=None, prefetch=True):
+	# same as paginate_pages but hands back the items one at a time. breaking out of the loop stops the paging
+	pages = paginate_pages(fetch_page, items_field, max_items, page_limit, cursor, prefetch)
+	try:
+		for page in pages:
+			yield from getattr(page, items_field)
+	finally:
+		pages.close()
+
+
+async def paginate_pages_async(fetch_page, items_field, max_items=None, page_limit=PAGE_LIMIT, cursor=None):
+	"""the asyncio version of paginate_pages, for the add follows lambda's asyncio engine.
+
+	fetch_page is an async function(cursor, limit), and the next page is requested as a task on the event loop while the caller works
+	through the current one. closing the generator (aclose) cancels that request if it's still in flight.
+	"""
+	next_task = None
+	fetched = 0
+
+	def request(cursor, fetched):
+		limit = page_limit if max_items is None else min(page_limit, max_items - fetched)
+		return fetch_page(cursor, limit)
+
+	try:
+		page = await request(cursor, fetched)
+		while True:
+			items = getattr(page, items_field)
+			if max_items is not None and fetched + len(items) > max_items:
+				items = items[ : max_items - fetched]
+				setattr(page, items_field, items)
+			fetched += len(items)
+			cursor = page.cursor
+			more = bool(cursor) and len(items) > 0 and (max_items is None or fetched < max_items)
+			if more:
+				next_task = asyncio.ensure_future(request(cursor, fetched))
+			yield page
+			if not more:
+				return
+			page = await next_task
+			next_task = None
+	finally:
+		if next_task is not None:
+			next_task.cancel()
+
+
+async def paginate_async(fetch_page, items_field, max_items=None, page_limit=PAGE_LIMIT, cursor=None):
+	# same as paginate_pages_async but hands back the items one at a time
+	pages = paginate_pages_async(fetch_page, items_field, max_items, page_limit, cursor)
+	try:
+		async for page in pages:
+			for item in getattr(page, items_field):
+				yield item
+	finally:
+		await pages.aclose()
+
+
+def interleave_pages(streams, on_error=None):
+	"""takes {key: pages} where pages is a generator from paginate_pages (or the asyncio engine's iterate) and yields (key, page),
+	one page from each in turn until they've all run out. the first page of every stream is requested at the same time.
+
+	Args:
+		streams: dict of key (e.g. the feed uri) -> generator of pages
+		on_error: function(key, exception) called when a stream raises, which drops just that stream. None to let the error through
+	"""
+	streams = dict(streams)
+
+	def next_page(key):
+		try:
+			return next(streams[key], None)
+		except Exception as e:
+			if on_error is None:
+				raise
+			on_error(key, e)
+			return None
+
+	try:
+		with ThreadPoolExecutor(max_workers=max(1, len(streams))) as executor:
+			ready = dict(zip(streams, executor.map(next_page, streams)))
+		active = [key for key in streams if ready[key] is not None]
+		while len(active) > 0:
+			for key in list(active):
+				page = ready.pop(key, None) or next_page(key)
+				if page is None:
+					active.remove(key)
+					continue
+				yield key, page
+	finally:
+		for pages in streams.values():
+			pages.close()
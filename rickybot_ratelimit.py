@@ -0,0 +1,211 @@
+# paces the bluesky calls from the lambdas against the rate limits, so a run slows down and keeps going instead of piling into 429s and giving up
+import asyncio
+import threading
+import time
+# rate limit waits show up as their own stage when a StageTimer is passed in
+from rickybot_timing import span
+import logging
+
+logger = logging.getLogger()
+
+READS = 'reads'
+WRITES = 'writes'
+SESSION = 'session'
+# what bluesky documents for each kind of call: (limit, window in seconds). the ratelimit headers on the responses take over once we've seen some
+DEFAULT_LIMITS = {
+	READS: (3000, 5 * 60), # appview reads
+	WRITES: (5000, 60 * 60), # pds repo write points per hour
+	SESSION: (30, 5 * 60) # createSession
+}
+# repo writes cost points instead of one per call
+WRITE_POINTS = {'create': 3, 'update': 2, 'delete': 1}
+MAX_WAIT = 60 # longest we'll sleep for a single call before giving up on it, so a run doesn't sit out the rest of its lambda timeout
+MAX_RETRIES = 3 # how many times a call that still got a 429 is retried after waiting for the reset
+
+
+class RateLimitWaitError(Exception):
+	# the budget for this kind of call won't be back until after MAX_WAIT, so the call was not made
+	pass
+
+
+class TokenBucket:
+	"""the budget for one kind of call. refills continuously over the window, and follows the ratelimit headers whenever a response has them."""
+	def __init__(self, limit, window):
+		self.limit = limit
+		self.window = window
+		self.tokens = float(limit)
+		self.reset_at = None # when the server said the budget resets, in time.time()
+		self.updated = time.monotonic()
+		self.lock = threading.Lock()
+
+	def refill(self):
+		now = time.monotonic()
+		self.tokens = min(self.limit, self.tokens + (now - self.updated) * self.limit / self.window)
+		self.updated = now
+		if self.reset_at is not None and time.time() >= self.reset_at:
+			self.tokens = float(self.limit)
+			self.reset_at = None
+
+	def reserve(self, cost):
+		# takes cost tokens and returns how long to wait before using them. the tokens can go negative, which is what makes the callers after this one wait longer
+		with self.lock:
+			self.refill()
+			self.tokens -= cost
+			if self.tokens >= 0:
+				return 0.0
+			wait = -self.tokens * self.window / self.limit
+			if self.reset_at is not None:
+				wait = min(wait, max(0.0, self.reset_at - time.time()))
+			return wait
+
+	def update(self, headers):
+		# the server's numbers win over our estimate
+		with self.lock:
+			if 'ratelimit-policy' in headers:
+				policy = dict(part.split('=', 1) for part in headers['ratelimit-policy'].split(';')[1:] if '=' in part)
+				if 'w' in policy:
+					self.window = float(policy['w'])
+			if 'ratelimit-limit' in headers:
+				self.limit = int(headers['ratelimit-limit'])
+			reset_at = float(headers['ratelimit-reset']) if 'ratelimit-reset' in headers else self.reset_at
+			if 'ratelimit-remaining' in headers:
+				self.refill()
+				remaining = float(headers['ratelimit-remaining'])
+				# a new window can give back more than we thought we had, otherwise only ever lower our estimate (responses can arrive out of order)
+				self.tokens = remaining if reset_at != self.reset_at else min(self.tokens, remaining)
+			self.reset_at = reset_at
+
+	def remaining(self):
+		with self.lock:
+			self.refill()
+			return max(0, int(self.tokens))
+
+
+class RateLimiter:
+	"""attach() hooks into an atproto Client (attach_async() into an AsyncClient) so every call it makes (including the ones from client.app.bsky..., login and session refreshes)
+	first takes its cost from the bucket for its kind: reads, writes or session. when a bucket is empty the call waits for it instead of failing,
+	and a call that still gets a 429 waits for the ratelimit-reset the server sent and is retried. it only gives up (RateLimitWaitError, or the
+	server's RateLimitExceededError) when the wait would be longer than max_wait.
+
+	budget() hands back what's left of each kind, and report() is a line for the run logs.
+	"""
+	def __init__(self, limits=None, max_wait=MAX_WAIT, max_retries=MAX_RETRIES, timer=None):
+		self.buckets = {kind: TokenBucket(limit, window) for kind, (limit, window) in dict(DEFAULT_LIMITS, **(limits or {})).items()}
+		self.max_wait = max_wait
+		self.max_retries = max_retries
+		self.timer = timer
+		self.waits = 0
+		self.wait_seconds = 0.0
+		self.retries = 0
+		self.lock = threading.Lock()
+
+	def attach(self, client):
+		invoke = client._invoke
+
+		def paced_invoke(invoke_type, **kwargs):
+			nsid = kwargs['url'].rsplit('/', 1)[-1]
+			kind, cost = call_kind(invoke_type.value, nsid, kwargs.get('data'))
+			return self.call(kind, cost, lambda: invoke(invoke_type, **kwargs))
+
+		client._invoke = paced_invoke
+		return client
+
+	def attach_async(self, client):
+		# same as attach for an atproto AsyncClient. it shares the buckets, so both clients come out of the same budget
+		invoke = client._invoke
+
+		async def paced_invoke(invoke_type, **kwargs):
+			nsid = kwargs['url'].rsplit('/', 1)[-1]
+			kind, cost = call_kind(invoke_type.value, nsid, kwargs.get('data'))
+			return await self.call_async(kind, cost, lambda: invoke(invoke_type, **kwargs))
+
+		client._invoke = paced_invoke
+		return client
+
+	def call(self, kind, cost, make_call):
+		from atproto.exceptions import RateLimitExceededError
+		bucket = self.buckets[kind]
+		self.wait(kind, bucket.reserve(cost))
+		for attempt in range(self.max_retries + 1):
+			try:
+				response = make_call()
+			except RateLimitExceededError as e:
+				self.wait(kind, self.retry_after(kind, bucket, cost, e, attempt))
+				continue
+			bucket.update(response.headers)
+			return response
+
+	async def call_async(self, kind, cost, make_call):
+		# same as call, but the waits don't hold up the event loop
+		from atproto.exceptions import RateLimitExceededError
+		bucket = self.buckets[kind]
+		await self.wait_async(kind, bucket.reserve(cost))
+		for attempt in range(self.max_retries + 1):
+			try:
+				response = await make_call()
+			except RateLimitExceededError as e:
+				await self.wait_async(kind, self.retry_after(kind, bucket, cost, e, attempt))
+				continue
+			bucket.update(response.headers)
+			return response
+
+	def retry_after(self, kind, bucket, cost, error, attempt):
+		# how long to wait before retrying a call that got a 429, re-raising it if that's too long or it's been retried enough
+		headers = error.response.headers if error.response is not None else {}
+		bucket.update(headers)
+		reset = float(headers['ratelimit-reset']) - time.time() if 'ratelimit-reset' in headers else bucket.window / bucket.limit * cost
+		if attempt >= self.max_retries or reset > self.max_wait:
+			raise error
+		with self.lock:
+			self.retries += 1
+		logger.warning(f'rate limited on {kind}, waiting {reset:.1f}s for the reset and retrying')
+		return max(0.0, reset)
+
+	def wait(self, kind, seconds):
+		if self.should_wait(kind, seconds):
+			with span(self.timer, 'rate limit wait'):
+				time.sleep(seconds)
+
+	async def wait_async(self, kind, seconds):
+		if self.should_wait(kind, seconds):
+			with span(self.timer, 'rate limit wait'):
+				await asyncio.sleep(seconds)
+
+	def should_wait(self, kind, seconds):
+		# counts the wait, or raises if it's longer than we're willing to wait
+		if seconds <= 0:
+			return False
+		if seconds > self.max_wait:
+			raise RateLimitWaitError(f'the {kind} rate limit budget is used up for the next {seconds:.0f}s')
+		with self.lock:
+			self.waits += 1
+			self.wait_seconds += seconds
+		return True
+
+	def budget(self):
+		return {kind: bucket.remaining() for kind, bucket in self.buckets.items()}
+
+	def report(self):
+		left = ', '.join(f'{kind} {remaining}' for kind, remaining in self.budget().items())
+		return f'rate limits: waited {self.waits} times for {self.wait_seconds:.1f}s, retried {self.retries} 429s. budget left: {left}\n'
+
+
+def call_kind(invoke_type, nsid, data=None):
+	# which bucket a call comes out of and what it costs. only repo writes count against the pds write points, everything else (mutes too) goes to the appview
+	if nsid in ('com.atproto.server.createSession', 'com.atproto.server.refreshSession'):
+		return SESSION, 1
+	if invoke_type == 'query' or not nsid.startswith('com.atproto.repo.'):
+		return READS, 1
+	if nsid == 'com.atproto.repo.applyWrites' and data is not None:
+		return WRITES, sum(WRITE_POINTS.get(str(getattr(write, 'py_type', '')).rsplit('#', 1)[-1], 1) for write in data.writes)
+	if nsid == 'com.atproto.repo.createRecord':
+		return WRITES, WRITE_POINTS['create']
+	if nsid == 'com.atproto.repo.putRecord':
+		return WRITES, WRITE_POINTS['update']
+	return WRITES, WRITE_POINTS['delete']
+
+
+def is_rate_limit_error(error):
+	# true for a call that ran out of budget, either here (RateLimitWaitError) or on the server (a 429 that retrying didn't get past)
+	from atproto.exceptions import RateLimitExceededError
+	return isinstance(error, (RateLimitWaitError, RateLimitExceededError))
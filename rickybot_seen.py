@@ -0,0 +1,159 @@
+# the add follows lambda's cache of post cids it has already looked at, kept as a few bloom filters (one per time window) in a single dynamodb item.
+# a check costs the same no matter how many posts are in it, the item can't grow past SEEN_GENERATIONS filters, and each run only writes the filter it added to
+import hashlib
+import math
+import time
+import zlib
+import logging
+
+logger = logging.getLogger()
+
+SEEN_KEY = 'SEEN' # the dynamodb item the filters are saved under
+SEEN_WINDOW = 12 * 60 * 60 # seconds of posts each filter holds before a new one is started
+SEEN_GENERATIONS = 4 # filters kept, so a post is remembered for about SEEN_WINDOW * SEEN_GENERATIONS
+SEEN_CAPACITY = 20000 # posts a filter is sized for. a filter that fills up early is retired early, so a busy window costs memory, not accuracy
+SEEN_FALSE_POSITIVES = 0.001 # share of never seen posts a full filter will say it has seen
+SEEN_ITEM_BYTES = 350 * 1024 # most the filters can add up to. they all go in one dynamodb item, which can't be over 400KB, and a full filter barely compresses
+FILTER_PREFIX = 'F' # F<window start> is a filter's bits (zlib compressed), N<window start> is how many posts went into it
+COUNT_PREFIX = 'N'
+BITS_ATTRIBUTE = 'BITS'
+HASHES_ATTRIBUTE = 'HASHES'
+
+
+def filter_bits(capacity, false_positives=SEEN_FALSE_POSITIVES):
+	return math.ceil(-capacity * math.log(false_positives) / math.log(2) ** 2)
+
+
+def capacity_limit(generations, false_positives=SEEN_FALSE_POSITIVES, item_bytes=SEEN_ITEM_BYTES):
+	# the biggest capacity whose generations filters still fit in item_bytes
+	capacity = int(item_bytes * 8 / max(1, generations) * math.log(2) ** 2 / -math.log(false_positives))
+	while capacity > 1 and (filter_bits(capacity, false_positives) + 7) // 8 * max(1, generations) > item_bytes:
+		capacity -= 1
+	return max(1, capacity)
+
+
+class SeenPosts:
+	"""the post cids seen over the last few runs, as rotating bloom filters.
+
+	posts are added to the newest filter, which is retired once its window is up or it's holding capacity posts. only the newest generations
+	filters are kept, each with SEEN_FALSE_POSITIVES chance of a false hit when full, so now and then a post that was never seen gets skipped
+	but a seen post is never missed while its filter is kept. adding a post that's already in an older filter adds it to the newest too, so
+	posts that keep coming around stay remembered.
+
+	it's loaded from the whole dynamodb item, and save() writes just the newest filter and removes the expired ones.
+	"""
+	def __init__(self, item=None, window=SEEN_WINDOW, generations=SEEN_GENERATIONS, capacity=SEEN_CAPACITY, false_positives=SEEN_FALSE_POSITIVES):
+		self.window = window
+		self.generations = max(1, generations)
+		self.capacity = max(1, capacity)
+		limit = capacity_limit(self.generations, false_positives)
+		if self.capacity > limit:
+			# past this the item is too big for dynamodb, every save would fail and the cache would quietly stop working
+			logger.error(f'ERROR - {self.generations} seen post filters of capacity {self.capacity} won\'t fit in one dynamodb item, using capacity {limit}')
+			self.capacity = limit
+		self.bits = filter_bits(self.capacity, false_positives)
+		self.hashes = max(1, round(self.bits / self.capacity * math.log(2)))
+		self.filters = {} # window start epoch seconds -> bytearray
+		self.counts = {}
+		self.expired = set() # window starts to remove from the item on save
+		self.changed = set()
+		item = item or {}
+		sized_alike = int(item.get(BITS_ATTRIBUTE, 0)) == self.bits and int(item.get(HASHES_ATTRIBUTE, 0)) == self.hashes
+		for name, value in item.items():
+			if not name.startswith(FILTER_PREFIX) or not name[len(FILTER_PREFIX) : ].isdigit():
+				continue
+			start = int(name[len(FILTER_PREFIX) : ])
+			if not sized_alike:
+				# the capacity changed, so the old filters' bits don't line up any more
+				self.expired.add(start)
+				continue
+			self.filters[start] = bytearray(zlib.decompress(bytes(getattr(value, 'value', value))))
+			self.counts[start] = int(item.get(COUNT_PREFIX + str(start), 0))
+		if not sized_alike and len(self.expired) > 0:
+			logger.warning(f'WARNING - the seen post filters were sized for a different capacity, starting them over')
+		self.expire()
+
+	def __len__(self):
+		# posts added across the filters. a post that was added again later counts in both
+		return sum(self.counts.values())
+
+	def __contains__(self, cid):
+		if cid is None:
+			return False
+		positions = self.positions(cid)
+		return any(all(bits[position >> 3] & (1 << (position & 7)) for position in positions) for bits in self.filters.values())
+
+	def positions(self, cid):
+		digest = hashlib.blake2b(cid.encode(), digest_size=16).digest()
+		first = int.from_bytes(digest[ : 8], 'little')
+		second = int.from_bytes(digest[8 : ], 'little') | 1
+		return [(first + i * second) % self.bits for i in range(self.hashes)]
+
+	def add(self, cid):
+		if cid is None:
+			return
+		start = self.current()
+		bits = self.filters[start]
+		positions = self.positions(cid)
+		if all(bits[position >> 3] & (1 << (position & 7)) for position in positions):
+			return
+		for position in positions:
+			bits[position >> 3] |= 1 << (position & 7)
+		self.counts[start] += 1
+		self.changed.add(start)
+
+	def add_all(self, cids):
+		for cid in cids:
+			self.add(cid)
+
+	def current(self):
+		# the filter new posts go into, starting a new one once the newest is past its window or full
+		now = int(time.time())
+		if len(self.filters) > 0:
+			start = max(self.filters)
+			if now - start < self.window and self.counts[start] < self.capacity:
+				return start
+			now = max(now, start + 1)
+		self.filters[now] = bytearray((self.bits + 7) // 8)
+		self.counts[now] = 0
+		self.changed.add(now)
+		self.expire()
+		return now
+
+	def expire(self):
+		# drops the filters past the last generations windows, and the oldest ones past the generation count
+		cutoff = time.time() - self.window * self.generations
+		for start in sorted(self.filters):
+			if start < cutoff or len(self.filters) > self.generations:
+				del self.filters[start]
+				del self.counts[start]
+				self.changed.discard(start)
+				self.expired.add(start)
+
+	def save(self, table, key=SEEN_KEY, primary_key='DOW'):
+		# writes the filters that were added to since loading and removes the expired ones, in one update_item
+		names = {'#bits': BITS_ATTRIBUTE, '#hashes': HASHES_ATTRIBUTE}
+		values = {':bits': self.bits, ':hashes': self.hashes}
+		sets = ['#bits = :bits', '#hashes = :hashes']
+		for i, start in enumerate(sorted(self.changed)):
+			names[f'#f{i}'] = FILTER_PREFIX + str(start)
+			names[f'#n{i}'] = COUNT_PREFIX + str(start)
+			values[f':f{i}'] = zlib.compress(bytes(self.filters[start]))
+			values[f':n{i}'] = self.counts[start]
+			sets += [f'#f{i} = :f{i}', f'#n{i} = :n{i}']
+		removes = []
+		for i, start in enumerate(sorted(self.expired)):
+			names[f'#xf{i}'] = FILTER_PREFIX + str(start)
+			names[f'#xn{i}'] = COUNT_PREFIX + str(start)
+			removes += [f'#xf{i}', f'#xn{i}']
+		table.update_item(
+				Key={primary_key: key},
+				UpdateExpression=f'SET {", ".join(sets)}' + (f' REMOVE {", ".join(removes)}' if len(removes) > 0 else ''),
+				ExpressionAttributeNames=names,
+				ExpressionAttributeValues=values
+		)
+		self.changed.clear()
+		self.expired.clear()
+
+	def report(self):
+		return f'{len(self)} posts in {len(self.filters)} filters ({self.bits // 8 // 1024}KB each before compression)'
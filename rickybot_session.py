@@ -0,0 +1,88 @@
+# keeps the bluesky session between runs, so the lambdas pick it back up instead of spending a createSession (30 per 5 min, 300 per day) on every invocation
+from atproto_client.client.session import SessionEvent
+import logging
+
+logger = logging.getLogger()
+
+SESSION_KEY = 'BSKY-SESSION' # the dynamodb item the session is saved under. all of the lambdas share it since they all log in as the same account
+SESSION_ATTRIBUTE = 'session_string'
+USERNAME_ATTRIBUTE = 'username' # so a changed bsky_username in the secrets doesn't pick up the old account's session
+
+LOGIN_WARM = 'warm' # resumed the session this container already had
+LOGIN_SAVED = 'saved' # resumed the session from dynamodb
+LOGIN_PASSWORD = 'password' # full createSession login
+
+# session strings by username. a warm lambda container keeps these between invocations, so it doesn't even need to read dynamodb
+warm_sessions = {}
+
+
+def log_in(client, username, password, table=None, primary_key='DOW'):
+	"""logs the client in, using a full username + password login only when there's no saved session that still works.
+
+	tries the session saved in dynamodb, then the one this container had on its last run, then the password. resuming a session checks it
+	with the profile lookup the client makes anyway, and the client refreshes the access token itself whenever it's within 15 minutes of
+	expiring, so a session is only given up on when the refresh token has expired or been revoked.
+	every new or refreshed session (including refreshes partway through the run) is saved back to the container and dynamodb.
+
+	Args:
+		client: atproto Client, not logged in yet
+		username, password: bsky_username and bsky_password from the secrets
+		table: the rickybot dynamodb table, or None to only keep the session in this container
+		primary_key: the table's primary key name
+	Returns:
+		LOGIN_WARM, LOGIN_SAVED or LOGIN_PASSWORD, how it ended up logging in
+	"""
+	save_sessions(client, username, table, primary_key)
+	base_url = client._base_url # resuming a session points the client at the session's pds, put it back if we fall through to the password
+
+	# dynamodb has the newest session, since another lambda may have refreshed it (which retires the refresh token this container has).
+	# the warm one is still there for when dynamodb can't be reached
+	warm = warm_sessions.get(username)
+	saved = saved_session(table, primary_key, username)
+	candidates = [(LOGIN_WARM, warm)] if saved is None or saved == warm else [(LOGIN_SAVED, saved), (LOGIN_WARM, warm)]
+	for how, session_string in candidates:
+		if session_string is None:
+			continue
+		try:
+			client.login(session_string=session_string)
+			logger.info(f'resumed the {how} bluesky session')
+			return how
+		except Exception as e:
+			logger.warning(f'WARNING - could not resume the {how} bluesky session, {repr(e)}: {e}')
+			client.update_base_url(base_url)
+
+	warm_sessions.pop(username, None)
+	client.login(username, password)
+	return LOGIN_PASSWORD
+
+
+def save_sessions(client, username, table=None, primary_key='DOW'):
+	# keeps every session the client gets (logging in, resuming, refreshing) in this container, and saves new and refreshed ones to dynamodb.
+	# log_in does this for the client it logs in, anything else holding the same session (the asyncio engine's client) should call it too
+	def save(event, session):
+		session_string = session.encode()
+		warm_sessions[username] = session_string
+		if table is None or event == SessionEvent.IMPORT: # dynamodb already has a resumed session
+			return
+		try:
+			table.put_item(Item={primary_key: SESSION_KEY, USERNAME_ATTRIBUTE: username, SESSION_ATTRIBUTE: session_string})
+		except Exception as e:
+			# the next run will just log in with the password
+			logger.warning(f'WARNING - failed to save the bluesky session to dynamodb: {e}')
+
+	client.on_session_change(save)
+
+
+def saved_session(table, primary_key, username):
+	# the session string from dynamodb, or None if there isn't one for this account (or dynamodb can't be reached)
+	if table is None:
+		return None
+	try:
+		response = table.get_item(Key={primary_key: SESSION_KEY})
+	except Exception as e:
+		logger.warning(f'WARNING - failed to read the saved bluesky session from dynamodb: {e}')
+		return None
+	item = response.get('Item')
+	if item is None or item.get(USERNAME_ATTRIBUTE) != username:
+		return None
+	return item.get(SESSION_ATTRIBUTE)
@@ -0,0 +1,187 @@
+# the status update lambda's snapshots of who follows us and who we follow, kept in s3 as a base snapshot plus a small delta per run.
+# each run diffs the new list against the last one as two sorted did streams and only writes what changed, and once the deltas add up to a
+# good share of the base (or there are too many of them) the current list is written as the new base and the deltas are dropped
+import datetime
+import json
+import zlib
+import logging
+
+logger = logging.getLogger()
+
+SNAPSHOT_VERSION = 1
+BASE_HEADER = 'RBSNAP' # first line of a base: RBSNAP <version> <entries>, then a did<TAB>follow uri line per account, sorted by did
+DELTA_HEADER = 'RBDELTA' # first line of a delta: RBDELTA <version> <upserts> <removals>, then +did<TAB>follow uri or -did lines
+MANIFEST = 'MANIFEST' # json with the base's key and the deltas on top of it, in order. it's written last, so a run that fails partway leaves the old one
+MAX_DELTAS = 8 # deltas kept before the next run compacts
+COMPACT_SHARE = 0.25 # compacts once the delta lines add up to this share of the accounts in the snapshot
+CONTENT_TYPE = 'application/octet-stream'
+
+
+def diff_sorted(old, new):
+	"""walks two lists of (did, follow uri) sorted by did side by side.
+
+	Yields:
+		('+', did, None, uri) for dids only in new, ('-', did, uri, None) for dids only in old, and ('~', did, old uri, new uri) when the uri changed
+	"""
+	old = iter(old)
+	new = iter(new)
+	old_entry = next(old, None)
+	new_entry = next(new, None)
+	while old_entry is not None or new_entry is not None:
+		if new_entry is None or (old_entry is not None and old_entry[0] < new_entry[0]):
+			yield '-', old_entry[0], old_entry[1], None
+			old_entry = next(old, None)
+		elif old_entry is None or new_entry[0] < old_entry[0]:
+			yield '+', new_entry[0], None, new_entry[1]
+			new_entry = next(new, None)
+		else:
+			if old_entry[1] != new_entry[1]:
+				yield '~', new_entry[0], old_entry[1], new_entry[1]
+			old_entry = next(old, None)
+			new_entry = next(new, None)
+
+
+def common_sorted(old, new):
+	"""walks two lists of (did, follow uri) sorted by did side by side, like diff_sorted.
+
+	Yields:
+		(did, new uri) for the entries of new whose did is in old too
+	"""
+	old = iter(old)
+	old_entry = next(old, None)
+	for did, uri in new:
+		while old_entry is not None and old_entry[0] < did:
+			old_entry = next(old, None)
+		if old_entry is None:
+			return
+		if old_entry[0] == did:
+			yield did, uri
+
+
+def encode_lines(header, lines):
+	return zlib.compress('\n'.join([header] + lines).encode(), 9)
+
+
+def decode_lines(data, header):
+	lines = zlib.decompress(data).decode().split('\n')
+	fields = lines[0].split(' ')
+	if fields[0] != header:
+		raise ValueError(f'not a {header} object')
+	if int(fields[1]) > SNAPSHOT_VERSION:
+		raise ValueError(f'{header} version {fields[1]}, this only reads up to version {SNAPSHOT_VERSION}')
+	return lines[1 : ]
+
+
+class SnapshotStore:
+	"""a snapshot of did -> follow uri (or None) under name/ in the bucket.
+
+	load() hands back the last saved snapshot as a list sorted by did, and save() writes the changes from diff_sorted as a delta on top of it
+	(or compacts). the full map json objects the lambda used to write under legacy_key are read once, as the starting point, when there's no
+	manifest yet.
+	"""
+	def __init__(self, s3, bucket, name, legacy_key=None, max_deltas=MAX_DELTAS, compact_share=COMPACT_SHARE):
+		self.s3 = s3
+		self.bucket = bucket
+		self.name = name
+		self.legacy_key = legacy_key
+		self.max_deltas = max_deltas
+		self.compact_share = compact_share
+		self.manifest = None
+		self.loaded = False # whether load() got all the way through. if it didn't, save() writes a new base since there's nothing to put a delta on
+		self.bytes_read = 0
+		self.bytes_written = 0
+		self.compacted = False
+
+	def key(self, part):
+		return f'{self.name}/{part}'
+
+	def get(self, key):
+		data = self.s3.get_object(Bucket=self.bucket, Key=key)['Body'].read()
+		self.bytes_read += len(data)
+		return data
+
+	def put(self, key, data, content_type=CONTENT_TYPE):
+		self.s3.put_object(Bucket=self.bucket, Key=key, Body=data, ContentType=content_type)
+		self.bytes_written += len(data)
+
+	def load(self):
+		"""the last saved snapshot.
+
+		Returns:
+			[(did, follow uri or None)] sorted by did, or None when nothing has been saved yet
+		Raises:
+			the s3 client's ClientError if the manifest (or the legacy object) can't be read for some other reason than not being there, or whatever
+			reading the base or a delta raised. save() still works after that, it compacts
+		"""
+		self.loaded = False
+		try:
+			self.manifest = json.loads(self.get(self.key(MANIFEST)))
+		except self.s3.exceptions.ClientError as e:
+			if e.response['Error']['Code'] not in ('404', 'NoSuchKey'):
+				raise
+			return self.load_legacy()
+		snapshot = {}
+		for line in decode_lines(self.get(self.manifest['base']), BASE_HEADER):
+			did, _, uri = line.partition('\t')
+			snapshot[did] = uri or None
+		for delta in self.manifest['deltas']:
+			for line in decode_lines(self.get(delta), DELTA_HEADER):
+				if line[0] == '-':
+					snapshot.pop(line[1 : ], None)
+				else:
+					did, _, uri = line[1 : ].partition('\t')
+					snapshot[did] = uri or None
+		self.loaded = True
+		return sorted(snapshot.items())
+
+	def load_legacy(self):
+		if self.legacy_key is None:
+			return None
+		try:
+			legacy = json.loads(self.get(self.legacy_key))
+		except self.s3.exceptions.ClientError as e:
+			if e.response['Error']['Code'] not in ('404', 'NoSuchKey'):
+				raise
+			return None
+		if not all(key.startswith('did:') for key in legacy):
+			# the old followers map was keyed by handle, which can't be lined up with dids. better to start over than to unfollow everyone
+			logger.warning(f'WARNING - the old {self.legacy_key} map is not keyed by did, starting the snapshot over')
+			return None
+		return sorted(legacy.items())
+
+	def save(self, snapshot, changes):
+		"""writes changes (from diff_sorted against what load() handed back) as a delta, or compacts to a new base of snapshot.
+
+		Args:
+			snapshot: the current [(did, follow uri or None)], sorted by did
+			changes: the diff_sorted changes from the loaded snapshot to this one. ignored when nothing was loaded (or loading failed), that always writes a base
+		"""
+		stamp = datetime.datetime.now(datetime.timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')
+		manifest = self.manifest
+		if manifest is not None and self.loaded:
+			if len(changes) == 0:
+				return
+			delta_lines = manifest['delta_lines'] + len(changes)
+			if len(manifest['deltas']) < self.max_deltas and delta_lines <= self.compact_share * max(1, len(snapshot)):
+				lines = [f'-{did}' if change == '-' else f'+{did}\t{new_uri or ""}' for change, did, old_uri, new_uri in changes]
+				removals = sum(1 for change in changes if change[0] == '-')
+				delta = self.key(f'DELTA-{stamp}')
+				self.put(delta, encode_lines(f'{DELTA_HEADER} {SNAPSHOT_VERSION} {len(changes) - removals} {removals}', lines))
+				self.manifest = dict(manifest, deltas=manifest['deltas'] + [delta], delta_lines=delta_lines)
+				self.put(self.key(MANIFEST), json.dumps(self.manifest), 'application/json')
+				return
+		# compact: the whole snapshot as the new base, then the old base and deltas can go
+		base = self.key(f'BASE-{stamp}')
+		self.put(base, encode_lines(f'{BASE_HEADER} {SNAPSHOT_VERSION} {len(snapshot)}', [f'{did}\t{uri or ""}' for did, uri in snapshot]))
+		self.manifest = {'version': SNAPSHOT_VERSION, 'base': base, 'entries': len(snapshot), 'deltas': [], 'delta_lines': 0}
+		self.put(self.key(MANIFEST), json.dumps(self.manifest), 'application/json')
+		self.compacted = True
+		for old in ([manifest['base']] + manifest['deltas'] if manifest is not None else []):
+			try:
+				self.s3.delete_object(Bucket=self.bucket, Key=old)
+			except Exception as e:
+				logger.warning(f'WARNING - failed to delete old snapshot object {old}: {e}')
+
+	def report(self):
+		deltas = len(self.manifest['deltas']) if self.manifest is not None else 0
+		return f'{self.name}: read {self.bytes_read} bytes, wrote {self.bytes_written} bytes{" (compacted)" if self.compacted else ""}, {deltas} deltas on the base'
@@ -0,0 +1,206 @@
+# reads new posts off a jetstream websocket for the add follows lambda's stream mode. instead of paging back through the same feeds every run, a run
+# picks the post stream up where the last one left off, keeps only the image posts from the authors or with the keywords it's watching for, and hands
+# them on in pages shaped like getFeed's, so they go through the same cat test, follows and budgets as feed posts do
+import json
+import queue
+import re
+import threading
+import time
+from urllib.parse import urlencode
+from atproto import models
+from websockets.sync.client import connect
+from websockets.exceptions import ConnectionClosed, ConnectionClosedOK
+import logging
+
+logger = logging.getLogger()
+
+JETSTREAM_URL = 'wss://jetstream2.us-east.bsky.network/subscribe'
+POST_COLLECTION = 'app.bsky.feed.post'
+EMBED_IMAGES = 'app.bsky.embed.images'
+# words (or hashtags) in a post's text, tags or alt text that make it worth a look. matched as whole words, without the #
+STREAM_KEYWORDS = ('cat', 'cats', 'kitten', 'kittens', 'kitty', 'caturday', 'catsofbluesky', 'tuxedocat')
+
+STREAM_SECONDS = 600 # how long a run reads the stream for, if the budgets don't run out first
+POSTS_PER_PAGE = 25 # getPosts takes up to 25 uris per call
+PAGE_WAIT = 5.0 # longest a matching post waits for the rest of its page before the page goes out anyway
+PAGES_AHEAD = 2 # pages hydrated and waiting while the caller is still working through one
+MAX_REPLAY = 6 * 60 * 60 # seconds. a saved cursor older than this is dropped and the stream starts from now, so a run never spends itself catching up
+RECONNECTS = 5 # dropped connections in a run before giving up on the stream
+WORD = re.compile(r'#?\w+')
+
+
+class PostStream:
+	"""a jetstream subscription to new posts, read on a background thread.
+
+	pages() yields pages of the posts that have images and are either from one of the authors or have one of the keywords. each page is hydrated with
+	hydrate(uris) into the post views (viewer state, like count, image links) getFeed would have handed back, so it can go through crawl_feed
+	like any feed page. posts the appview hasn't indexed yet get one more try on the next page.
+
+	cursor is the jetstream time_us the last page handed out got up to. save it and pass it back in next run to pick up from there, events
+	after it that were read but not handed out yet just get read again. a dropped connection is picked back up from where it was.
+	"""
+	def __init__(self, hydrate, url=JETSTREAM_URL, cursor=None, authors=(), keywords=STREAM_KEYWORDS, page_size=POSTS_PER_PAGE, page_wait=PAGE_WAIT, max_replay=MAX_REPLAY, reconnects=RECONNECTS):
+		self.hydrate = hydrate
+		self.url = url
+		if cursor is not None and time.time() * 1e6 - cursor > max_replay * 1e6:
+			logger.warning(f'WARNING - the saved stream cursor is more than {max_replay}s old, starting the stream from now')
+			cursor = None
+		self.cursor = cursor
+		self.authors = set(authors)
+		self.keywords = {keyword.lstrip('#').lower() for keyword in keywords}
+		self.page_size = min(POSTS_PER_PAGE, max(1, page_size))
+		self.page_wait = page_wait
+		self.reconnects = reconnects
+		self.read_to = cursor # time_us of the last event read, which is where a reconnect picks up from
+		self.sent_to = cursor # time_us the last queued page got up to
+		self.seen = set() # post cids, a reconnect can hand back the last few events again
+		self.ready = queue.Queue(maxsize=PAGES_AHEAD)
+		self.stopped = threading.Event()
+		self.error = None
+		self.events = 0
+		self.posts = 0
+		self.matched = 0
+		self.missing = 0
+		self.dropped = 0 # connections that were lost and picked back up
+
+	def subscribe_url(self):
+		params = [('wantedCollections', POST_COLLECTION)]
+		if len(self.keywords) == 0:
+			# only watching for authors, so jetstream can leave everyone else's posts out
+			params += [('wantedDids', did) for did in sorted(self.authors)]
+		if self.read_to is not None:
+			params.append(('cursor', self.read_to + 1)) # jetstream's cursor is inclusive, and we already have that event
+		return f'{self.url}?{urlencode(params)}'
+
+	def pages(self, deadline, on_page=None):
+		"""yields pages until deadline (a time.monotonic()), or until the stream is closed on us. stopping early (break, close) stops the reading too.
+
+		Args:
+			deadline: when to stop reading, in time.monotonic()
+			on_page: function(page) run on the reading thread as each page is hydrated, e.g. to start its image downloads
+		"""
+		reader = threading.Thread(target=self.read, args=(deadline, on_page), name='rickybot-stream', daemon=True)
+		reader.start()
+		try:
+			while True:
+				page = self.ready.get()
+				if page is None:
+					if self.error is not None:
+						raise self.error
+					return
+				self.cursor = int(page.cursor)
+				yield page
+		finally:
+			self.stopped.set()
+			reader.join()
+
+	def read(self, deadline, on_page):
+		pending = [] # (uri, retried) waiting for the next page
+		first_at = None # when the oldest pending post came in
+		lost = 0
+		try:
+			while not self.stopped.is_set() and time.monotonic() < deadline:
+				try:
+					with connect(self.subscribe_url(), open_timeout=10, close_timeout=2, max_size=2 ** 22) as websocket:
+						while not self.stopped.is_set():
+							now = time.monotonic()
+							if now >= deadline:
+								break
+							if len(pending) > 0 and (len(pending) >= self.page_size or now >= first_at + self.page_wait):
+								pending = self.send_page(pending, on_page)
+								first_at = time.monotonic() if len(pending) > 0 else None
+								continue
+							wait = min(deadline, first_at + self.page_wait if first_at is not None else deadline, now + 1.0) - now
+							try:
+								message = websocket.recv(timeout=max(0.01, wait))
+							except TimeoutError:
+								continue
+							uri = self.take_event(json.loads(message))
+							if uri is not None:
+								pending.append((uri, False))
+								first_at = first_at or time.monotonic()
+				except (ConnectionClosed, OSError) as e:
+					if isinstance(e, ConnectionClosedOK) and e.rcvd is not None and e.rcvd.code == 1000:
+						break # the server is done with us (the local stand-in closes once it's sent everything)
+					lost += 1
+					if lost > self.reconnects:
+						raise
+					logger.warning(f'WARNING - lost the jetstream connection, picking it back up from {self.read_to}: {repr(e)}: {e}')
+					time.sleep(min(2 ** (lost - 1), 10))
+				self.dropped = lost
+			# whatever is left, plus a page (even an empty one) to move the cursor up to everything that was read
+			while not self.stopped.is_set() and (len(pending) > 0 or self.read_to != self.sent_to):
+				pending = self.send_page([(uri, True) for uri, retried in pending], on_page)
+		except Exception as e:
+			self.error = e
+		finally:
+			self.put(None)
+
+	def take_event(self, event):
+		# keeps the time_us of every event, and hands back the post uri for the ones worth hydrating
+		self.events += 1
+		if 'time_us' in event:
+			self.read_to = event['time_us']
+		commit = event.get('commit') or {}
+		if event.get('kind') != 'commit' or commit.get('operation') != 'create' or commit.get('collection') != POST_COLLECTION:
+			return None
+		self.posts += 1
+		did = event.get('did')
+		record = commit.get('record') or {}
+		if commit.get('cid') in self.seen or len(record_images(record)) == 0:
+			return None
+		if did not in self.authors and len(self.keywords & record_words(record)) == 0:
+			return None
+		self.seen.add(commit.get('cid'))
+		self.matched += 1
+		return f'at://{did}/{POST_COLLECTION}/{commit.get("rkey")}'
+
+	def send_page(self, pending, on_page):
+		# hydrates up to a page of the pending posts and queues it. hands back what's still pending, including posts that weren't indexed yet (once)
+		batch, rest = pending[ : self.page_size], pending[self.page_size : ]
+		cursor = self.read_to
+		self.sent_to = cursor
+		posts = self.hydrate([uri for uri, retried in batch]) if len(batch) > 0 else []
+		found = {post.uri for post in posts}
+		retry = [(uri, True) for uri, retried in batch if uri not in found and not retried]
+		self.missing += sum(1 for uri, retried in batch if uri not in found and retried)
+		page = models.AppBskyFeedGetFeed.Response(feed=[models.AppBskyFeedDefs.FeedViewPost(post=post) for post in posts], cursor=str(cursor) if cursor is not None else None)
+		if page.cursor is None:
+			page.cursor = str(int(time.time() * 1e6))
+		if on_page is not None:
+			on_page(page)
+		self.put(page)
+		return retry + rest
+
+	def put(self, page):
+		# waits for room in the queue, unless the caller has stopped taking pages
+		while True:
+			try:
+				self.ready.put(page, timeout=0.5)
+				return
+			except queue.Full:
+				if self.stopped.is_set():
+					return
+
+	def report(self):
+		return f'{self.events} events, {self.posts} new posts, {self.matched} image posts matched the authors or keywords ({self.missing} were never indexed). {self.dropped} dropped connections.'
+
+
+def record_images(record):
+	# the images on a post record. quote posts with pics (recordWithMedia) are left out, crawl_feed only cat tests plain image embeds
+	embed = record.get('embed') or {}
+	if embed.get('$type') != EMBED_IMAGES:
+		return []
+	return embed.get('images') or []
+
+
+def record_words(record):
+	# lowercase words and hashtags (without the #) from the text, the tags and the alt text
+	text = ' '.join([record.get('text') or ''] + [image.get('alt') or '' for image in record_images(record)])
+	words = {word.lstrip('#').lower() for word in WORD.findall(text)}
+	words.update(tag.lower() for tag in record.get('tags') or [])
+	for facet in record.get('facets') or []:
+		for feature in facet.get('features') or []:
+			if 'tag' in feature:
+				words.add(feature['tag'].lower())
+	return words
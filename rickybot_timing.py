@@ -0,0 +1,64 @@
+# per stage timing for the lambdas, so a slow run can be pinned on the cdn, the model or bluesky instead of just showing up in the time diff
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+
+class StageTimer:
+	"""collects how long each stage of a run takes, every time it runs.
+
+	wrap a stage with `with timer.span('stage name'):` (safe to use from the download threads too), then summary() gives the
+	count, p50, p95 and total seconds for each stage and report() turns that into lines for the run log plus a json block.
+	totals add up every span, so stages that run on several threads at once (the image downloads) can total more than the run took.
+	"""
+	def __init__(self):
+		self.samples = {} # stage name -> list of seconds, in the order the stages were first seen
+		self.lock = threading.Lock()
+
+	@contextmanager
+	def span(self, stage):
+		start = time.perf_counter()
+		try:
+			yield
+		finally:
+			self.record(stage, time.perf_counter() - start)
+
+	def record(self, stage, seconds):
+		with self.lock:
+			self.samples.setdefault(stage, []).append(seconds)
+
+	def summary(self):
+		with self.lock:
+			samples = {stage: sorted(seconds) for stage, seconds in self.samples.items()}
+		return {stage: {
+			'count': len(seconds),
+			'p50': percentile(seconds, 50),
+			'p95': percentile(seconds, 95),
+			'total': sum(seconds)
+		} for stage, seconds in samples.items()}
+
+	def report(self, title='stage timings'):
+		summary = self.summary()
+		if len(summary) == 0:
+			return f'{title}: nothing was timed\n'
+		lines = [f'{title} (count | p50 | p95 | total):']
+		for stage, stats in summary.items():
+			lines.append(f'  {stage}: {stats["count"]} | {stats["p50"]:.3f}s | {stats["p95"]:.3f}s | {stats["total"]:.2f}s')
+		rounded = {stage: {key: round(value, 4) for key, value in stats.items()} for stage, stats in summary.items()}
+		lines.append(f'{title} json: {json.dumps(rounded)}')
+		return '\n'.join(lines) + '\n'
+
+
+def percentile(sorted_seconds, percent):
+	# nearest rank percentile on an already sorted list
+	if len(sorted_seconds) == 0:
+		return 0.0
+	rank = max(1, math.ceil(percent / 100 * len(sorted_seconds)))
+	return sorted_seconds[rank - 1]
+
+
+def span(timer, stage):
+	# lets code that takes an optional timer time a stage without checking for None every time
+	return timer.span(stage) if timer is not None else nullcontext()
@@ -0,0 +1,513 @@
+# image classification for the add follows lambda. this is the ViT cat test pulled out of the handler so it can score a whole page of posts at once
+# PIL is used to open the images, BytesIO is to translate the downloaded bytes
+from PIL import Image
+from io import BytesIO
+# import torch
+import torch
+# the stock hugging face model, the exported backends are plain torchscript files next to it
+from transformers import ViTImageProcessor, ViTForImageClassification, ViTConfig
+# the fast weights file is memory mapped straight into the model
+from safetensors.torch import load_file, save_file
+import os
+# requests is used for the images too, a session keeps the connections to the cdn alive between downloads
+import requests
+from requests.adapters import HTTPAdapter
+# downloads happen on a small thread pool so the model isn't waiting on the network
+from concurrent.futures import ThreadPoolExecutor, as_completed
+# or on the asyncio engine's event loop, see AsyncImageFetcher
+import asyncio
+# the scores for a batch come back as a small named tuple per image
+from collections import namedtuple, OrderedDict
+from functools import lru_cache
+# the verdict cache is stored in dynamodb, which wants Decimals instead of floats, and needs timestamps for expiring entries
+from decimal import Decimal
+import time
+# optional per stage timing, the handler passes its StageTimer in
+from rickybot_timing import span
+# replace prints with logging
+import logging
+
+logger = logging.getLogger()
+
+# 281: 'tabby, tabby cat'
+# 282: 'tiger cat', 283: 'Persian cat', 284: 'Siamese cat, Siamese', 285: 'Egyptian cat', 286: 'cougar, puma, catamount, mountain lion, painter, panther, Felis concolor', 287: 'lynx, catamount', 288: 'leopard, Panthera pardus', 289: 'snow leopard, ounce, Panthera uncia', 290: 'jaguar, panther, Panthera onca, Felis onca', 291: 'lion, king of beasts, Panthera leo', 292: 'tiger, Panthera tigris', 293: 'cheetah, chetah, Acinonyx jubatus',
+# 281 to 293
+CAT_LABELS = set(range(281, 294))
+
+# these labels are to remove drawings, memes/reposts, and images with a lot of text respectively
+BAD_LABELS = {
+917 : 'comic book', 916 : 'web site, website, internet site, site', 921 : 'book jacket, dust cover, dust jacket, dust wrapper'}
+
+TOP_PREDICTIONS = 50 # 50 is semi-arbitrary based on our findings from testing pics # could see tuning this down to 40 but can't tell if it would pick up more or less cats
+CLASSIFY_BATCH_SIZE = 16 # how many images go through the model in one forward pass. 1 is the same as the old one-image-at-a-time path
+DOWNLOAD_WORKERS = 8 # how many images can be downloading at the same time
+DOWNLOAD_TIMEOUT = (5, 20) # (connect, read) seconds. urlopen had no timeout so one stuck image could hang the whole run
+MAX_IMAGE_BYTES = 4 * 1024 * 1024 # anything bigger than this gets dropped partway through the download instead of being pulled down and decoded
+DOWNLOAD_CHUNK = 64 * 1024
+
+# which version of the image gets classified. the preprocessor shrinks everything down to 224x224 anyway, so the thumbnail is usually plenty
+FETCH_FULLSIZE = 'fullsize' # the original path, full image fully decoded
+FETCH_THUMB = 'thumb' # the thumb version of the image, decoded at reduced resolution when it's a jpeg
+FETCH_MODES = (FETCH_FULLSIZE, FETCH_THUMB)
+MODEL_INPUT_SIZE = (224, 224)
+
+
+# which version of the model does the forward pass. the exported ones are built once by tools/export_vit.py when the docker image is built
+BACKEND_HF = 'hf' # the stock fp32 ViTForImageClassification
+BACKEND_TORCHSCRIPT = 'torchscript' # the same fp32 weights traced to torchscript, no hugging face config resolution at load time
+BACKEND_INT8 = 'int8' # linear layers dynamically quantized to int8 and traced to torchscript
+BACKENDS = (BACKEND_HF, BACKEND_TORCHSCRIPT, BACKEND_INT8)
+BACKEND_FILES = {
+	BACKEND_TORCHSCRIPT: 'vit_torchscript.pt',
+	BACKEND_INT8: 'vit_int8.pt'
+}
+# the hf model's own state dict saved by tools/export_vit.py, so it can be loaded without from_pretrained resolving and converting the checkpoint
+FAST_WEIGHTS_FILE = 'vit_fast.safetensors'
+
+# models and preprocessors that have already been loaded in this container, keyed by (model dir, backend).
+# they live at module scope so warm lambda invocations reuse them instead of loading everything again
+loaded_models = {}
+loaded_feature_extractors = {}
+
+
+VERDICT_CACHE_TTL = 14 * 24 * 60 * 60 # seconds a cached verdict is kept after it was last used
+VERDICT_CACHE_MAX = 1500 # most verdicts to keep, the least recently used go first. ~110 bytes each with the fetch mode in the key, so the item stays under ~170KB even with bad labels on all of them. it gets rewritten every run
+
+
+class ImageTooLargeError(Exception):
+	pass
+
+
+# the result of the cat test for one image. ranks are positions in the top predictions (-1 if none were found),
+# cat_score is the sum of the cat label logits minus the bad label logits in the top predictions, and bad_labels are the bad label ids that showed up
+CatScore = namedtuple('CatScore', ['passed', 'cat_rank', 'bad_rank', 'cat_score', 'bad_labels'])
+
+
+def image_url(image_view, fetch_mode=FETCH_FULLSIZE):
+	# picks the link to download from an app.bsky.embed.images#viewImage, falling back to fullsize if a post somehow has no thumb
+	if fetch_mode == FETCH_THUMB and getattr(image_view, 'thumb', None):
+		return image_view.thumb
+	return image_view.fullsize
+
+
+def blob_cid(url):
+	# cdn links look like https://cdn.bsky.app/img/feed_fullsize/plain/<did>/<blob cid>@jpeg, and the thumb link has the same blob cid.
+	# returns None for anything that doesn't look like a blob cid so it just doesn't get cached
+	last_segment = url.rstrip('/').rsplit('/', 1)[-1]
+	cid = last_segment.split('@', 1)[0]
+	return cid if cid.startswith('baf') else None
+
+
+class VerdictCache:
+	"""cat test results keyed by the fetch mode and the image's blob cid, so a pic that gets reposted or quote posted across feeds is only downloaded
+	and classified once. the thumb and the fullsize version of a pic can score differently, so a verdict is only reused for the mode it was made with.
+
+	entries expire ttl seconds after they were last used, and only the max_entries most recently used are kept when it's saved.
+	it's loaded from and saved to a single dynamodb map attribute:
+	{<fetch mode>:<blob cid>: {'P': passed, 'S': cat score, 'C': cat rank, 'B': bad rank, 'L': bad label ids (left out when there are none), 'T': last used epoch seconds}}
+	"""
+	def __init__(self, item=None, fetch_mode=FETCH_FULLSIZE, ttl=VERDICT_CACHE_TTL, max_entries=VERDICT_CACHE_MAX):
+		self.fetch_mode = fetch_mode
+		self.ttl = ttl
+		self.max_entries = max_entries
+		self.entries = OrderedDict()
+		cutoff = time.time() - ttl
+		# oldest first, so the end of the dict is always the most recently used
+		for key, entry in sorted((item or {}).items(), key=lambda kv: kv[1]['T']):
+			# entries from before the key had the fetch mode in it don't say which version of the pic they scored, so they're dropped
+			if key.partition(':')[0] in FETCH_MODES and int(entry['T']) >= cutoff:
+				self.entries[key] = entry
+
+	def __len__(self):
+		return len(self.entries)
+
+	def key(self, cid):
+		return f'{self.fetch_mode}:{cid}' if cid is not None else None
+
+	def __contains__(self, cid):
+		return cid is not None and self.key(cid) in self.entries
+
+	def get(self, cid):
+		# returns the cached CatScore and marks it as used, or None
+		if cid not in self:
+			return None
+		key = self.key(cid)
+		entry = self.entries[key]
+		entry['T'] = int(time.time())
+		self.entries.move_to_end(key)
+		return CatScore(bool(entry['P']), int(entry['C']), int(entry['B']), float(entry['S']), tuple(int(label) for label in entry.get('L', ())))
+
+	def put(self, cid, score):
+		if cid is None:
+			return
+		key = self.key(cid)
+		self.entries[key] = {'P': bool(score.passed), 'S': Decimal(str(round(score.cat_score, 3))), 'C': score.cat_rank, 'B': score.bad_rank, 'T': int(time.time())}
+		if len(score.bad_labels) > 0:
+			self.entries[key]['L'] = [int(label) for label in score.bad_labels]
+		self.entries.move_to_end(key)
+
+	def to_item(self):
+		# the map to save back to dynamodb, dropping the least recently used entries past the max
+		while len(self.entries) > self.max_entries:
+			self.entries.popitem(last=False)
+		return dict(self.entries)
+
+
+def fetch_image_bytes(url, session=None, max_bytes=MAX_IMAGE_BYTES):
+	# streams the image down and gives up as soon as it's clear it's over max_bytes
+	getter = session if session is not None else requests
+	response = getter.get(url, timeout=DOWNLOAD_TIMEOUT, stream=True)
+	try:
+		response.raise_for_status()
+		content_length = response.headers.get('Content-Length')
+		if content_length is not None and content_length.isdigit() and int(content_length) > max_bytes:
+			raise ImageTooLargeError(f'image is {content_length} bytes, over the {max_bytes} byte limit: {url}')
+		chunks = []
+		size = 0
+		for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK):
+			size += len(chunk)
+			if size > max_bytes:
+				raise ImageTooLargeError(f'image went over the {max_bytes} byte limit while downloading: {url}')
+			chunks.append(chunk)
+		return b''.join(chunks)
+	finally:
+		response.close()
+
+
+def decode_image(image_data, reduced=False):
+	image = Image.open(BytesIO(image_data))
+	if reduced and image.format == 'JPEG':
+		# draft mode lets the jpeg decoder skip straight to a 1/2, 1/4 or 1/8 scale that's still at least the model's input size
+		image.draft('RGB', MODEL_INPUT_SIZE)
+	# pngs with transparency and greyscale pics have to be converted or they can't be stacked into a batch with the rgb ones
+	if image.mode != 'RGB':
+		image = image.convert('RGB')
+	return image
+
+
+def download_image(url, session=None, reduced=False, max_bytes=MAX_IMAGE_BYTES):
+	return decode_image(fetch_image_bytes(url, session, max_bytes), reduced)
+
+
+class ImageFetcher:
+	"""downloads and preprocesses images in the background on a bounded thread pool.
+
+	prefetch() queues urls as soon as we know we'll want them (the current feed page and the next one), and test_bsky_images() picks up
+	the results in whatever order they finish, so the model is classifying the images that already arrived while the rest are still downloading.
+	Each url is only fetched once, and results are dropped as soon as they are picked up so we only hold onto the pixel values for about a page.
+	"""
+	def __init__(self, feature_extractor, workers=DOWNLOAD_WORKERS, fetch_mode=FETCH_FULLSIZE, max_bytes=MAX_IMAGE_BYTES, timer=None):
+		self.feature_extractor = feature_extractor
+		self.timer = timer
+		self.reduced = fetch_mode == FETCH_THUMB
+		self.max_bytes = max_bytes
+		self.session = requests.Session()
+		adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+		self.session.mount('https://', adapter)
+		self.session.mount('http://', adapter)
+		self.executor = ThreadPoolExecutor(max_workers=workers)
+		self.pending = {} # url -> future of the preprocessed pixel values
+		self.closed = False
+
+	def _load(self, url):
+		with span(self.timer, 'image download'):
+			image = download_image(url, self.session, self.reduced, self.max_bytes)
+		with span(self.timer, 'preprocess'):
+			return preprocess_image(image, self.feature_extractor)
+
+	def prefetch(self, urls):
+		# this can get called from the thread that prefetches the next feed page, so don't submit anything once we've shut down
+		for url in urls:
+			if not self.closed and url not in self.pending:
+				self.pending[url] = self.executor.submit(self._load, url)
+
+	def take(self, url):
+		# hands back the future for this url and forgets about it, starting the download now if it was never prefetched
+		self.prefetch([url])
+		return self.pending.pop(url)
+
+	def close(self):
+		self.closed = True
+		self.executor.shutdown(wait=False, cancel_futures=True)
+		self.pending.clear()
+		self.session.close()
+
+
+class AsyncImageFetcher:
+	"""the ImageFetcher for the asyncio engine (see rickybot_async). same prefetch/take/close, so test_bsky_images works the same with either.
+
+	the downloads are tasks on the engine's event loop (at most `workers` at once) using an httpx client, and the decode + preprocess happen
+	on a thread pool of the same size so they don't hold up the loop.
+	"""
+	def __init__(self, engine, feature_extractor, workers=DOWNLOAD_WORKERS, fetch_mode=FETCH_FULLSIZE, max_bytes=MAX_IMAGE_BYTES, timer=None):
+		import httpx
+		self.engine = engine
+		self.feature_extractor = feature_extractor
+		self.timer = timer
+		self.reduced = fetch_mode == FETCH_THUMB
+		self.max_bytes = max_bytes
+		self.http = httpx.AsyncClient(timeout=httpx.Timeout(DOWNLOAD_TIMEOUT[1], connect=DOWNLOAD_TIMEOUT[0]), limits=httpx.Limits(max_connections=workers), follow_redirects=True)
+		self.semaphore = engine.run(self.make_semaphore(workers))
+		self.executor = ThreadPoolExecutor(max_workers=workers)
+		self.pending = {} # url -> future of the preprocessed pixel values
+		self.closed = False
+
+	async def make_semaphore(self, workers):
+		return asyncio.Semaphore(workers)
+
+	async def fetch(self, url):
+		# the async version of fetch_image_bytes, with the same size limit
+		async with self.http.stream('GET', url) as response:
+			response.raise_for_status()
+			content_length = response.headers.get('Content-Length')
+			if content_length is not None and content_length.isdigit() and int(content_length) > self.max_bytes:
+				raise ImageTooLargeError(f'image is {content_length} bytes, over the {self.max_bytes} byte limit: {url}')
+			chunks = []
+			size = 0
+			async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK):
+				size += len(chunk)
+				if size > self.max_bytes:
+					raise ImageTooLargeError(f'image went over the {self.max_bytes} byte limit while downloading: {url}')
+				chunks.append(chunk)
+			return b''.join(chunks)
+
+	def _decode(self, image_data):
+		with span(self.timer, 'preprocess'):
+			return preprocess_image(decode_image(image_data, self.reduced), self.feature_extractor)
+
+	async def _load(self, url):
+		async with self.semaphore:
+			with span(self.timer, 'image download'):
+				image_data = await self.fetch(url)
+		return await asyncio.get_running_loop().run_in_executor(self.executor, self._decode, image_data)
+
+	def prefetch(self, urls):
+		# gets called from the event loop too, when a feed page comes in
+		for url in urls:
+			if not self.closed and url not in self.pending:
+				self.pending[url] = self.engine.submit(self._load(url))
+
+	def take(self, url):
+		self.prefetch([url])
+		return self.pending.pop(url)
+
+	def close(self):
+		self.closed = True
+		for future in self.pending.values():
+			future.cancel()
+		self.pending.clear()
+		self.executor.shutdown(wait=False, cancel_futures=True)
+		self.engine.run(self.http.aclose())
+
+
+def preprocess_image(image, feature_extractor):
+	inputs = feature_extractor(images=image, return_tensors="pt")
+	return inputs["pixel_values"]
+
+
+class LogitsOnly(torch.nn.Module):
+	# wraps the hugging face model so it takes pixel values and returns just the logits tensor, which is what gets traced for the exported backends
+	def __init__(self, model):
+		super().__init__()
+		self.model = model
+
+	def forward(self, pixel_values):
+		return self.model(pixel_values=pixel_values).logits
+
+
+def export_model(model_dir, backend):
+	"""builds one of the exported backends from the hugging face model in model_dir and saves it into the same folder.
+
+	Args:
+		model_dir: folder with config.json and model.safetensors
+		backend: BACKEND_TORCHSCRIPT or BACKEND_INT8
+	Returns:
+		the path the backend was saved to
+	"""
+	module = LogitsOnly(ViTForImageClassification.from_pretrained(model_dir, local_files_only=True)).eval()
+	if backend == BACKEND_INT8:
+		module = torch.ao.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8)
+	elif backend != BACKEND_TORCHSCRIPT:
+		raise ValueError(f'{backend} is not an exportable backend')
+	example = torch.zeros(1, 3, MODEL_INPUT_SIZE[0], MODEL_INPUT_SIZE[1])
+	with torch.inference_mode():
+		traced = torch.jit.trace(module, example, strict=False)
+	path = os.path.join(model_dir, BACKEND_FILES[backend])
+	torch.jit.save(traced, path)
+	return path
+
+
+def export_fast_weights(model_dir):
+	# saves the hf model's state dict as it is after loading, so load_fast_weights can put it straight back without any key conversion
+	model = ViTForImageClassification.from_pretrained(model_dir, local_files_only=True)
+	path = os.path.join(model_dir, FAST_WEIGHTS_FILE)
+	save_file(model.state_dict(), path)
+	return path
+
+
+def load_fast_weights(model_dir):
+	# builds the model on the meta device (no memory allocated, no random init) and then points it at the memory mapped weights
+	config = ViTConfig.from_json_file(os.path.join(model_dir, 'config.json'))
+	with torch.device('meta'):
+		model = ViTForImageClassification(config)
+	model.load_state_dict(load_file(os.path.join(model_dir, FAST_WEIGHTS_FILE)), assign=True, strict=True)
+	model.eval()
+	return model
+
+
+def load_model(model_dir, backend=BACKEND_HF):
+	# loads whichever backend was asked for. the exported ones have to have been built already, this raises if the file isn't there
+	if backend == BACKEND_HF:
+		if os.path.exists(os.path.join(model_dir, FAST_WEIGHTS_FILE)):
+			try:
+				return load_fast_weights(model_dir)
+			except Exception as e:
+				# probably exported with a different transformers version, the slow way still works
+				logger.warning(f'WARNING - failed to load the fast weights, using from_pretrained instead: {repr(e)}: {e}')
+		return ViTForImageClassification.from_pretrained(model_dir, local_files_only=True)
+	if backend not in BACKEND_FILES:
+		raise ValueError(f'unknown inference backend {backend}')
+	model = torch.jit.load(os.path.join(model_dir, BACKEND_FILES[backend]))
+	model.eval()
+	return model
+
+
+def get_model(model_dir, backend=BACKEND_HF):
+	# returns (model, warm). warm is True when the model was already loaded by an earlier invocation in this container
+	key = (model_dir, backend)
+	if key in loaded_models:
+		return loaded_models[key], True
+	model = load_model(model_dir, backend)
+	loaded_models[key] = model
+	return model, False
+
+
+def get_feature_extractor(model_dir):
+	if model_dir not in loaded_feature_extractors:
+		loaded_feature_extractors[model_dir] = ViTImageProcessor.from_pretrained(model_dir, local_files_only=True)
+	return loaded_feature_extractors[model_dir]
+
+
+def predict_logits(model, pixel_values):
+	# hugging face models hand back an output object, the exported backends hand back the logits tensor directly
+	with torch.inference_mode():
+		outputs = model(pixel_values)
+	return outputs.logits if hasattr(outputs, 'logits') else outputs
+
+
+@lru_cache(maxsize=None)
+def label_masks(num_labels):
+	# boolean lookups over every label id, built once, so checking the top predictions against the label sets is a single index into each mask
+	cat_mask = torch.zeros(num_labels, dtype=torch.bool)
+	cat_mask[list(CAT_LABELS)] = True
+	bad_mask = torch.zeros(num_labels, dtype=torch.bool)
+	bad_mask[list(BAD_LABELS)] = True
+	return cat_mask, bad_mask
+
+
+def score_batch(logits):
+	"""runs the cat test on a whole batch of logits at once.
+
+	an image passes if one of the cat labels is in its top predictions and none of the bad labels are.
+	Args:
+		logits: tensor of shape (batch, num_labels) straight from the model
+	Returns:
+		list of CatScore, one per row of logits
+	"""
+	cat_mask, bad_mask = label_masks(logits.shape[-1])
+	top_values, top_indices = torch.topk(logits, k=min(TOP_PREDICTIONS, logits.shape[-1]), dim=-1)
+	is_cat = cat_mask[top_indices]
+	is_bad = bad_mask[top_indices]
+	has_cat = is_cat.any(dim=-1)
+	has_bad = is_bad.any(dim=-1)
+	# argmax gives the first True, which is the best ranked label of that kind since topk comes back sorted
+	no_rank = torch.full_like(has_cat, -1, dtype=torch.long)
+	cat_ranks = torch.where(has_cat, is_cat.long().argmax(dim=-1), no_rank)
+	bad_ranks = torch.where(has_bad, is_bad.long().argmax(dim=-1), no_rank)
+	cat_scores = (top_values * is_cat).sum(dim=-1) - (top_values * is_bad).sum(dim=-1)
+	passed = has_cat & ~has_bad
+
+	bad_rows = has_bad.tolist()
+	scores = []
+	for row, (row_passed, cat_rank, bad_rank, cat_score) in enumerate(zip(passed.tolist(), cat_ranks.tolist(), bad_ranks.tolist(), cat_scores.tolist())):
+		bad_labels = tuple(top_indices[row][is_bad[row]].tolist()) if bad_rows[row] else ()
+		scores.append(CatScore(row_passed, cat_rank, bad_rank, cat_score, bad_labels))
+	return scores
+
+
+def run_batch(batch_pixels, batch_indexes, results, model, timer=None):
+	# the whole batch goes through the model in one pass, and the verdicts are put back at each image's place in results
+	try:
+		pixel_values = torch.cat(batch_pixels)
+		with span(timer, 'model forward'):
+			logits = predict_logits(model, pixel_values)
+		with span(timer, 'scoring'):
+			scores = score_batch(logits)
+	except Exception as e:
+		for i in batch_indexes:
+			results[i] = e
+		return
+	for i, score in zip(batch_indexes, scores):
+		results[i] = score
+
+
+def test_bsky_images(urls, feature_extractor, model, batch_size=CLASSIFY_BATCH_SIZE, fetcher=None, fetch_mode=FETCH_FULLSIZE, timer=None):
+	"""downloads and classifies a list of image urls, running the model on up to batch_size images per forward pass.
+
+	Args:
+		urls: list of image urls, usually the fullsize link of the first image of each post
+		feature_extractor: the ViTImageProcessor
+		model: the ViTForImageClassification model, or one of the exported backends from load_model
+		batch_size: max number of images per forward pass
+		fetcher: optional ImageFetcher. with one, the images are downloaded in the background and batched in the order they arrive. without one they are downloaded one after another
+		fetch_mode: FETCH_FULLSIZE or FETCH_THUMB, only used without a fetcher (the fetcher has its own). thumb mode decodes jpegs at reduced resolution
+		timer: optional StageTimer from rickybot_timing for the model forward and scoring (and the downloads without a fetcher, the fetcher times its own)
+	Returns:
+		list lined up with urls. each entry is the CatScore for that image (check .passed), or the exception that was raised for that image so the caller can count it as an error the same way it did one image at a time.
+	"""
+	results = [None] * len(urls)
+	batch_size = max(1, batch_size)
+	if fetcher is not None:
+		futures = {}
+		for i, url in enumerate(urls):
+			futures[fetcher.take(url)] = i
+		batch_indexes = []
+		batch_pixels = []
+		for future in as_completed(futures):
+			i = futures[future]
+			try:
+				batch_pixels.append(future.result())
+				batch_indexes.append(i)
+			except Exception as e:
+				results[i] = e
+			if len(batch_pixels) >= batch_size:
+				run_batch(batch_pixels, batch_indexes, results, model, timer)
+				batch_indexes = []
+				batch_pixels = []
+		if len(batch_pixels) > 0:
+			run_batch(batch_pixels, batch_indexes, results, model, timer)
+		return results
+	for start in range(0, len(urls), batch_size):
+		# download and preprocess one at a time so a single broken image only fails itself
+		batch_indexes = []
+		batch_pixels = []
+		for i in range(start, min(start + batch_size, len(urls))):
+			try:
+				with span(timer, 'image download'):
+					image = download_image(urls[i], reduced=fetch_mode == FETCH_THUMB)
+				with span(timer, 'preprocess'):
+					batch_pixels.append(preprocess_image(image, feature_extractor))
+				batch_indexes.append(i)
+			except Exception as e:
+				results[i] = e
+		if len(batch_pixels) > 0:
+			run_batch(batch_pixels, batch_indexes, results, model, timer)
+	return results
+
+
+def test_bsky_image(url, feature_extractor, model):
+	# single image version, kept so anything that only has one url doesn't need to deal with the list. returns the CatScore
+	result = test_bsky_images([url], feature_extractor, model, batch_size=1)[0]
+	if isinstance(result, Exception):
+		raise result
+	return result
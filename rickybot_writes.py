@@ -0,0 +1,121 @@
+# batches the follow and like records from the add follows lambda into com.atproto.repo.applyWrites calls, instead of one createRecord round trip each
+from atproto import models
+from atproto.exceptions import BadRequestError
+# the batches are timed as one stage, see rickybot_timing
+from rickybot_timing import span
+import logging
+
+logger = logging.getLogger()
+
+APPLY_WRITES_BATCH = 50 # records per applyWrites call. the pds takes up to 200, but a smaller batch gets the follows out sooner if the run dies partway through
+FOLLOW_COLLECTION = 'app.bsky.graph.follow'
+LIKE_COLLECTION = 'app.bsky.feed.like'
+
+
+class RecordWriter:
+	"""buffers follow and like records and writes them in applyWrites batches.
+
+	follow() and like() just queue the record (writing the batch once it's full), so the caller doesn't know yet whether it worked.
+	each record can be given an on_result(uri, error) callback that gets called once its batch is written: uri is the new record's uri
+	(None if the pds didn't say) and error is None, or the exception if that record failed. call flush() before reading any counts
+	that the callbacks keep, and before the run ends.
+
+	a batch is all or nothing on the pds, so if a batch is rejected as a bad request the records are retried one at a time and only the bad one fails.
+	any other error (rate limits, timeouts) fails the whole batch.
+
+	with an engine (rickybot_async.AsyncBluesky) full batches are written in the background on its event loop instead of holding up the caller.
+	their callbacks still only run on the caller's thread: poll() runs them for the batches that are done, and flush() waits for the rest.
+	"""
+	def __init__(self, client, batch_size=APPLY_WRITES_BATCH, timer=None, engine=None):
+		self.client = client
+		self.batch_size = max(1, batch_size)
+		self.timer = timer
+		self.engine = engine
+		self.pending = [] # (create op, on_result) waiting for the next batch
+		self.in_flight = [] # futures of the batches the engine is writing, oldest first
+		self.written = 0
+		self.failed = 0
+		self.batches = 0
+
+	def follow(self, did, on_result=None):
+		record = models.AppBskyGraphFollow.Record(created_at=self.client.get_current_time_iso(), subject=did)
+		self.queue(FOLLOW_COLLECTION, record, on_result)
+
+	def like(self, uri, cid, on_result=None):
+		subject = models.ComAtprotoRepoStrongRef.Main(uri=uri, cid=cid)
+		record = models.AppBskyFeedLike.Record(created_at=self.client.get_current_time_iso(), subject=subject)
+		self.queue(LIKE_COLLECTION, record, on_result)
+
+	def queue(self, collection, record, on_result=None):
+		self.pending.append((models.ComAtprotoRepoApplyWrites.Create(collection=collection, value=record), on_result))
+		if len(self.pending) >= self.batch_size:
+			self.send()
+
+	def send(self):
+		# writes everything that's queued, or hands it to the engine to write in the background
+		batch = self.pending
+		self.pending = []
+		if len(batch) == 0:
+			return
+		if self.engine is None:
+			self.report_all(self.write_batch(batch))
+		else:
+			self.in_flight.append(self.engine.submit(self.write_batch_async(batch)))
+
+	def poll(self, wait=False):
+		# calls the callbacks for the background batches that are done (all of them with wait), in the order they were sent
+		while len(self.in_flight) > 0 and (wait or self.in_flight[0].done()):
+			self.report_all(self.in_flight.pop(0).result())
+
+	def flush(self):
+		# writes everything that's queued. callbacks are all called before this returns
+		self.send()
+		self.poll(wait=True)
+
+	def batch_data(self, batch):
+		return models.ComAtprotoRepoApplyWrites.Data(repo=self.client.me.did, writes=[op for op, _ in batch])
+
+	def write_batch(self, batch):
+		# returns a list of (records, results, error) to report, more than one if the batch had to be split up
+		try:
+			with span(self.timer, 'apply writes'):
+				response = self.client.com.atproto.repo.apply_writes(self.batch_data(batch))
+		except BadRequestError as e:
+			if len(batch) > 1:
+				logger.warning(f'applyWrites batch of {len(batch)} was rejected, writing the records one at a time. {repr(e)}: {e}')
+				return [report for write in batch for report in self.write_batch([write])]
+			return [(batch, None, e)]
+		except Exception as e:
+			logger.error(f'applyWrites batch of {len(batch)} records failed. {repr(e)}: {e}')
+			return [(batch, None, e)]
+		return [(batch, response.results, None)]
+
+	async def write_batch_async(self, batch):
+		# write_batch on the engine's event loop
+		try:
+			with span(self.timer, 'apply writes'):
+				response = await self.engine.apply_writes(self.batch_data(batch))
+		except BadRequestError as e:
+			if len(batch) > 1:
+				logger.warning(f'applyWrites batch of {len(batch)} was rejected, writing the records one at a time. {repr(e)}: {e}')
+				return [report for write in batch for report in await self.write_batch_async([write])]
+			return [(batch, None, e)]
+		except Exception as e:
+			logger.error(f'applyWrites batch of {len(batch)} records failed. {repr(e)}: {e}')
+			return [(batch, None, e)]
+		return [(batch, response.results, None)]
+
+	def report_all(self, reports):
+		for batch, results, error in reports:
+			self.report(batch, results, error)
+
+	def report(self, batch, results, error):
+		if error is None:
+			self.written += len(batch)
+			self.batches += 1
+		else:
+			self.failed += len(batch)
+		for i, (op, on_result) in enumerate(batch):
+			if on_result is not None:
+				uri = results[i].uri if results is not None and i < len(results) and hasattr(results[i], 'uri') else None
+				on_result(uri, error)
@@ -0,0 +1,90 @@
+"""backend_parity.py
+compares the cat/not-cat verdicts of an exported inference backend (see export_vit.py) against the stock hugging face model on a labeled set of images,
+so we can check that switching the add follows lambda's inference_backend secret doesn't change who gets followed.
+	also reports the forward pass time per image for each backend.
+
+	the labeled set is the same json lines file vision_parity.py uses, one image per line:
+		{"fullsize": "https://cdn.bsky.app/img/feed_fullsize/...", "thumb": "https://cdn.bsky.app/img/feed_thumbnail/...", "cat": true}
+
+	usage:
+		python tools/backend_parity.py labeled_images.jsonl --model ./vit --backend int8
+"""
+import argparse
+import os
+import sys
+import time
+
+# run from the repo root or from tools/, either way rickybot_vision needs to be importable
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import requests
+from transformers import ViTImageProcessor
+
+from rickybot_vision import download_image, preprocess_image, predict_logits, score_batch, load_model, BACKEND_HF, BACKEND_FILES
+from vision_parity import load_labeled_set
+
+
+def run_backend(name, model, entries, pixels):
+	# classifies every preprocessed image with one backend. returns a list of verdicts (None where the image failed to download) and the average forward time
+	verdicts = []
+	total_s = 0.0
+	count = 0
+	for pixel_values in pixels:
+		if pixel_values is None:
+			verdicts.append(None)
+			continue
+		start = time.perf_counter()
+		logits = predict_logits(model, pixel_values)
+		total_s += time.perf_counter() - start
+		count += 1
+		verdicts.append(score_batch(logits)[0].passed)
+	line = f'{name}: {count} classified | avg forward {total_s / max(count, 1) * 1000:.1f} ms'
+	labeled = [(e['cat'], v) for e, v in zip(entries, verdicts) if 'cat' in e and v is not None]
+	accuracy = None
+	if labeled:
+		accuracy = sum(1 for label, verdict in labeled if label == verdict) / len(labeled)
+		line += f' | accuracy {accuracy * 100:.2f}% on {len(labeled)} labeled'
+	print(line)
+	return verdicts, accuracy
+
+
+def main():
+	parser = argparse.ArgumentParser(description='compare an exported backend against the stock model on a labeled image set')
+	parser.add_argument('labeled_set', help='json lines file of {"fullsize", "thumb", "cat"} entries')
+	parser.add_argument('--model', default='./vit', help='folder with the ViT files and the exported backends')
+	parser.add_argument('--backend', required=True, choices=sorted(BACKEND_FILES), help='exported backend to check')
+	parser.add_argument('--min-agreement', type=float, default=0.98, help='fail if fewer than this fraction of verdicts match')
+	parser.add_argument('--max-accuracy-drop', type=float, default=0.01, help='fail if the backend accuracy is this much below the stock model')
+	args = parser.parse_args()
+
+	entries = load_labeled_set(args.labeled_set)
+	feature_extractor = ViTImageProcessor.from_pretrained(args.model, local_files_only=True)
+	# download and preprocess each image once so both backends see exactly the same input
+	session = requests.Session()
+	pixels = []
+	for entry in entries:
+		try:
+			pixels.append(preprocess_image(download_image(entry['fullsize'], session), feature_extractor))
+		except Exception as e:
+			print(f'  failed to load {entry["fullsize"]}: {repr(e)}: {e}')
+			pixels.append(None)
+
+	reference, reference_accuracy = run_backend(BACKEND_HF, load_model(args.model, BACKEND_HF), entries, pixels)
+	candidate, candidate_accuracy = run_backend(args.backend, load_model(args.model, args.backend), entries, pixels)
+
+	compared = [(entry, r, c) for entry, r, c in zip(entries, reference, candidate) if r is not None and c is not None]
+	mismatches = [(entry, r, c) for entry, r, c in compared if r != c]
+	agreement = (len(compared) - len(mismatches)) / max(len(compared), 1)
+	print(f'agreement: {agreement * 100:.2f}% of {len(compared)} images')
+	for entry, r, c in mismatches:
+		print(f'  MISMATCH {BACKEND_HF}={r} {args.backend}={c} {entry["fullsize"]}')
+
+	passed = agreement >= args.min_agreement
+	if reference_accuracy is not None and candidate_accuracy is not None and reference_accuracy - candidate_accuracy > args.max_accuracy_drop:
+		passed = False
+	print('PARITY OK' if passed else 'PARITY FAILED')
+	return 0 if passed else 1
+
+
+if __name__ == '__main__':
+	sys.exit(main())
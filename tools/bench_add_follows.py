@@ -0,0 +1,165 @@
+"""bench_add_follows.py
+runs rickybot_lambda_add_follows.lambda_handler end to end against the local fakes in tools/fake_services.py, so the whole pipeline
+(feed paging, image downloads, the cat test, likes/follows, dynamodb) can be timed without touching bluesky or aws.
+	every run gets a fresh fake dynamodb, so the post cache and verdict cache start empty unless --keep-cache is given.
+	the model stays loaded between runs like on a warm lambda container, so the first run of a size includes the cold model init.
+	for each feed size it reports the medians of:
+		posts/sec: feed posts handed out by the fake server per second of handler time
+		images/sec: images downloaded from the fake cdn per second
+		follows/sec: follow records created per second (these include followed likers)
+
+	usage:
+		python tools/bench_add_follows.py --sizes 50,200,500
+		python tools/bench_add_follows.py --fixtures fixtures/cats --latency 0.05 --runs 3 --json bench.json
+		python tools/bench_add_follows.py --secret classify_batch_size=1 --secret image_fetch_mode=thumb
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from fake_services import FakeBluesky, FakeJetstream, FakeAWS, FakeTable, FakeGithub, generate_fixtures, load_fixtures, MY_HANDLE, DEFAULT_FEED
+
+FOLLOW_COLLECTION = 'app.bsky.graph.follow'
+LIKE_COLLECTION = 'app.bsky.feed.like'
+
+
+def bench_secrets(post_count, follow_count, overrides):
+	secrets = {
+		'bsky_username': MY_HANDLE,
+		'bsky_password': 'fake',
+		'github_token': 'fake',
+		'github_user/repo': 'fake/fake',
+		'feed_caturday': 'default',
+		'feed_regday': 'default',
+		'feed_name_regday': 'default',
+		'posts_caturday': str(post_count),
+		'follows_caturday': str(follow_count),
+		'posts_regday': str(post_count),
+		'follows_regday': str(follow_count)
+	}
+	secrets.update(overrides)
+	return secrets
+
+
+def run_once(lambda_module, fake, secrets, table):
+	fake.reset_counts()
+	FakeAWS(secrets, table).install()
+	lambda_module.requests = FakeGithub()
+	start = time.perf_counter()
+	result = lambda_module.lambda_handler({}, None)
+	seconds = time.perf_counter() - start
+	if result['statusCode'] != 200:
+		raise RuntimeError(f'lambda_handler failed: {result["body"]}')
+	return {
+		'seconds': seconds,
+		'posts': fake.counts.get('feed posts', 0),
+		'images': fake.counts.get('cdn', 0),
+		'image_bytes': fake.image_bytes_served,
+		'follows': fake.created(FOLLOW_COLLECTION),
+		'likes': fake.created(LIKE_COLLECTION),
+		'likes_pages': fake.counts.get('app.bsky.feed.getLikes', 0),
+		'log': lambda_module.requests.logs[-1] if lambda_module.requests.logs else ''
+	}
+
+
+def summarize(size, runs):
+	def median(key):
+		return statistics.median(run[key] for run in runs)
+	seconds = median('seconds')
+	return {
+		'feed_size': size,
+		'runs': len(runs),
+		'first_run_s': runs[0]['seconds'],
+		'median_s': seconds,
+		'posts': median('posts'),
+		'images': median('images'),
+		'follows': median('follows'),
+		'likes': median('likes'),
+		'likes_pages': median('likes_pages'),
+		'image_mb': median('image_bytes') / 1e6,
+		'posts_per_s': statistics.median(run['posts'] / run['seconds'] for run in runs),
+		'images_per_s': statistics.median(run['images'] / run['seconds'] for run in runs),
+		'follows_per_s': statistics.median(run['follows'] / run['seconds'] for run in runs)
+	}
+
+
+def main():
+	parser = argparse.ArgumentParser(description='benchmark the add follows lambda offline against recorded or generated feeds')
+	parser.add_argument('--fixtures', help='fixture folder from tools/record_feed.py. without it a feed of random noise pics is generated for each size')
+	parser.add_argument('--sizes', default='50,200', help='comma separated posts_regday values to run with')
+	parser.add_argument('--follows', type=int, default=10000, help='follows_regday for every run. the default is high enough that the whole feed gets checked')
+	parser.add_argument('--runs', type=int, default=3, help='runs per size, the median is reported')
+	parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every xrpc request by the fake server')
+	parser.add_argument('--image-latency', type=float, help='seconds added to every image request, defaults to --latency')
+	parser.add_argument('--vit-dir', default=os.path.join(REPO_ROOT, 'vit'), help='folder with the ViT files')
+	parser.add_argument('--secret', action='append', default=[], help='key=value to add to or override in the fake secrets, e.g. classify_batch_size=1')
+	parser.add_argument('--keep-cache', action='store_true', help='keep the fake dynamodb between runs of a size, so later runs start with the post and verdict caches')
+	parser.add_argument('--write-limit', type=int, default=1000000, help='write points per hour the fake pds advertises in its ratelimit headers. the real 5000 would cap the big sizes at ~1600 follows')
+	parser.add_argument('--extra-feeds', type=int, default=0, help='how many more generated feeds to crawl alongside the default one, each sharing some posts and authors with it')
+	parser.add_argument('--liker-overlap', type=float, default=0.0, help='share of likers that come from a pool of regulars (some already followed), so the liker dives have overlap to work around')
+	parser.add_argument('--stream', action='store_true', help='run in stream mode against a local jetstream stand-in that sends the default feed as new posts, with noise mixed in')
+	parser.add_argument('--stream-drop', type=int, help='drop the first stream connection after this many events')
+	parser.add_argument('--seed', type=int, default=0, help='seed for the generated feeds')
+	parser.add_argument('--json', help='also write the results to this file')
+	parser.add_argument('--verbose', action='store_true', help='show the lambda warnings and print the run log of the last run')
+	args = parser.parse_args()
+
+	overrides = dict(secret.split('=', 1) for secret in args.secret)
+	sizes = [int(size) for size in args.sizes.split(',')]
+	# the generated extra feeds get crawled through the extra_feeds secret, alongside the default one
+	extra_feeds = [f'extra{i}' for i in range(1, args.extra_feeds + 1)]
+	if len(extra_feeds) > 0 and not args.fixtures:
+		overrides.setdefault('extra_feeds', ','.join(extra_feeds))
+	recorded = load_fixtures(args.fixtures) if args.fixtures else None
+
+	import atproto
+	import rickybot_lambda_add_follows as lambda_module
+	import rickybot_session
+	lambda_module.VIT_DIR = args.vit_dir
+	if not args.verbose:
+		logging.getLogger().setLevel(logging.ERROR)
+
+	results = []
+	for size in sizes:
+		feeds, likes, images, thumbs = recorded or generate_fixtures(size, seed=args.seed, extra_feeds=extra_feeds, liker_overlap=args.liker_overlap)
+		with FakeBluesky(feeds, likes, images, thumbs, latency=args.latency, image_latency=args.image_latency, limits={'writes': (args.write_limit, 60 * 60)}) as fake:
+			atproto.Client = fake.client_class()
+			atproto.AsyncClient = fake.client_class(async_client=True)
+			# each size gets a new fake server, so a session saved by the last size's runs would point at a dead port
+			rickybot_session.warm_sessions.clear()
+			secrets = bench_secrets(size, args.follows, overrides)
+			table = FakeTable()
+			runs = []
+			jetstream = None
+			if args.stream:
+				# with --keep-cache the later runs pick the stream up from the saved cursor, which is past everything the stand-in has
+				jetstream = FakeJetstream(feeds[DEFAULT_FEED], seed=args.seed, drop_after=args.stream_drop).__enter__()
+				secrets.update({'ingest_mode': 'stream', 'stream_url': jetstream.url})
+			try:
+				for _ in range(args.runs):
+					runs.append(run_once(lambda_module, fake, secrets, table if args.keep_cache else FakeTable()))
+			finally:
+				if jetstream is not None:
+					jetstream.__exit__()
+			if args.verbose:
+				print(runs[-1]['log'])
+			summary = summarize(size, runs)
+			results.append(summary)
+			print(f'feed size {size}: {summary["median_s"]:.2f}s (first run {summary["first_run_s"]:.2f}s) | {summary["posts"]:.0f} posts, {summary["images"]:.0f} images ({summary["image_mb"]:.1f}MB), {summary["follows"]:.0f} follows, {summary["likes"]:.0f} likes')
+			print(f'    {summary["likes_pages"]:.0f} pages of likes read, {summary["follows"] / max(1, summary["likes_pages"]):.1f} follows per page')
+			print(f'    {summary["posts_per_s"]:.1f} posts/s | {summary["images_per_s"]:.1f} images/s | {summary["follows_per_s"]:.1f} follows/s')
+
+	if args.json:
+		with open(args.json, 'w') as f:
+			json.dump({'latency': args.latency, 'secrets': overrides, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+	main()
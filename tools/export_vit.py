@@ -0,0 +1,38 @@
+"""export_vit.py
+builds the exported inference backends for the add follows lambda from the hugging face ViT files, so the lambda can load a
+torchscript file instead of resolving the config and weights with transformers on every cold start. this is run once when the docker image is built.
+	it also always writes the stock model's state dict as vit_fast.safetensors, which the default hf backend memory maps instead of calling from_pretrained.
+
+	usage:
+		python tools/export_vit.py --model ./vit --backend int8 --backend torchscript
+"""
+import argparse
+import os
+import sys
+import time
+
+# run from the repo root or from tools/, either way rickybot_vision needs to be importable
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from rickybot_vision import export_model, export_fast_weights, BACKEND_FILES
+
+
+def main():
+	parser = argparse.ArgumentParser(description='export the ViT model to the lambda inference backends')
+	parser.add_argument('--model', default='./vit', help='folder with the ViT config and weights, the exports are saved next to them')
+	parser.add_argument('--backend', action='append', choices=sorted(BACKEND_FILES), help='backend to build, can be given more than once. defaults to all of them')
+	args = parser.parse_args()
+
+	# the stock model's fast weights are always built, the hf backend uses them to skip from_pretrained
+	start = time.perf_counter()
+	path = export_fast_weights(args.model)
+	print(f'exported fast weights to {path} ({os.path.getsize(path) / 1024 / 1024:.1f} MB) in {time.perf_counter() - start:.1f}s')
+	for backend in args.backend or sorted(BACKEND_FILES):
+		start = time.perf_counter()
+		path = export_model(args.model, backend)
+		print(f'exported {backend} to {path} ({os.path.getsize(path) / 1024 / 1024:.1f} MB) in {time.perf_counter() - start:.1f}s')
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,717 @@
+"""fake_services.py
+local stand-ins for everything the lambdas talk to, so they can be run end to end and benchmarked without touching bluesky or aws.
+	FakeBluesky: a local http server that answers the xrpc calls the lambdas make from recorded (or generated) feed pages, and serves the image bytes as the cdn
+	FakeJetstream: a local websocket server that replays the same posts as jetstream commit events, for the add follows lambda's stream mode
+	FakeAWS: a boto3 stand-in with secrets manager, dynamodb and s3 kept in memory
+	FakeGithub: a requests stand-in for the github logging, so the run logs are kept instead of committed
+
+	fixtures are a folder written by record_feed.py (or generate_fixtures below):
+		feeds.json   {feed uri: [feedViewPost json, ...]} exactly as app.bsky.feed.getFeed returned them
+		likes.json   {post uri: [like json, ...]} from app.bsky.feed.getLikes, optional
+		images/      the fullsize image bytes, one file per blob cid
+		thumbs/      the thumbnail bytes, optional. without them thumbnail urls are answered with the fullsize bytes
+"""
+import base64
+import hashlib
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from types import SimpleNamespace
+from urllib.parse import urlparse, parse_qs
+
+MY_DID = 'did:plc:ktkc7jfakxzjpooj52ffc6ra'
+MY_HANDLE = 'rickybot.bsky.social'
+EMBEDDED_PIC = 'app.bsky.embed.images#view'
+EMBEDDED_VID = 'app.bsky.embed.video#view'
+DEFAULT_FEED = 'default'
+TIMESTAMP = '2025-01-01T00:00:00.000Z'
+LIST_PARAMS = {'actors', 'others', 'uris'} # query params that xrpc sends as repeated keys
+
+
+def make_jwt(did, lifetime=24 * 60 * 60):
+	# the atproto client only decodes the payload to see when it expires, it never checks the signature
+	def encode(obj):
+		return base64.urlsafe_b64encode(json.dumps(obj).encode()).decode().rstrip('=')
+	return f'{encode({"alg": "none", "typ": "JWT"})}.{encode({"sub": did, "exp": int(time.time()) + lifetime, "scope": "com.atproto.access", "jti": os.urandom(8).hex()})}.sig'
+
+
+def load_fixtures(fixture_dir):
+	with open(os.path.join(fixture_dir, 'feeds.json')) as f:
+		feeds = json.load(f)
+	likes = {}
+	if os.path.exists(os.path.join(fixture_dir, 'likes.json')):
+		with open(os.path.join(fixture_dir, 'likes.json')) as f:
+			likes = json.load(f)
+	return feeds, likes, read_images(os.path.join(fixture_dir, 'images')), read_images(os.path.join(fixture_dir, 'thumbs'))
+
+
+def read_images(image_dir):
+	images = {}
+	if os.path.isdir(image_dir):
+		for name in os.listdir(image_dir):
+			with open(os.path.join(image_dir, name), 'rb') as f:
+				images[name] = f.read()
+	return images
+
+
+def generate_fixtures(post_count, seed=0, image_count=40, pic_share=0.67, video_share=0.08, followed_share=0.1, repost_share=0.05, extra_feeds=(), crosspost_share=0.15, liker_overlap=0.0):
+	"""makes up a feed that looks roughly like a real cat feed run: about two thirds of posts with pics, some videos, some already followed users,
+	and a few reposted pics. the images are random noise jpegs, so this is for timing the pipeline, not for checking verdicts.
+	each name in extra_feeds gets its own feed of post_count posts as well, with about crosspost_share of them being posts from the default feed
+	(and plenty of the same authors, since they're all drawn from the same pool). the default feed is the same with or without them.
+	with liker_overlap, the likes are made up here too: each post gets around that share of its likers (more on some posts, less on others)
+	from a pool of regulars, a third of whom we already follow or who follow us. without it every liker is someone new, made up by FakeBluesky.
+
+	Returns:
+		(feeds, likes, images, thumbs) in the same shape as load_fixtures
+	"""
+	from PIL import Image
+	rng = random.Random(seed)
+	images = {}
+	for i in range(image_count):
+		width, height = rng.choice([(2000, 1500), (1200, 1600), (1000, 1000), (800, 600)])
+		buffer = BytesIO()
+		Image.effect_noise((width, height), rng.randint(20, 90)).convert('RGB').save(buffer, 'JPEG', quality=85)
+		images[f'bafkreifake{i:06d}'] = buffer.getvalue()
+	blob_cids = sorted(images)
+
+	def make_post(i, feed_number):
+		did = f'did:plc:fakeauthor{rng.randint(0, post_count):06d}'
+		roll = rng.random()
+		post = {
+			'uri': f'at://{did}/app.bsky.feed.post/{feed_number:02d}{i:08d}' if feed_number > 0 else f'at://{did}/app.bsky.feed.post/{i:08d}',
+			'cid': f'bafyreifakepost{seed:04d}{feed_number:02d}{i:08d}' if feed_number > 0 else f'bafyreifakepost{seed:04d}{i:08d}',
+			'author': {'did': did, 'handle': f'fake{i}.bsky.social', 'viewer': {'muted': False}},
+			'record': {'$type': 'app.bsky.feed.post', 'text': 'cat', 'createdAt': TIMESTAMP},
+			'indexedAt': TIMESTAMP,
+			'likeCount': rng.choice([0, 0, 1, 2, 3, 5, 8, 20, 60, 150])
+		}
+		if rng.random() < followed_share:
+			post['author']['viewer']['following'] = f'at://{MY_DID}/app.bsky.graph.follow/fake{i}'
+		if roll < pic_share:
+			# a few pics get reposted, which reuses a blob cid that's already been seen
+			blob = blob_cids[i % len(blob_cids)] if rng.random() >= repost_share else rng.choice(blob_cids)
+			post['embed'] = {'$type': EMBEDDED_PIC, 'images': [{
+				'thumb': f'https://cdn.bsky.app/img/feed_thumbnail/plain/{did}/{blob}@jpeg',
+				'fullsize': f'https://cdn.bsky.app/img/feed_fullsize/plain/{did}/{blob}@jpeg',
+				'alt': ''
+			}]}
+		elif roll < pic_share + video_share:
+			post['embed'] = {'$type': EMBEDDED_VID, 'cid': f'bafkreifakevideo{i}', 'playlist': 'https://video.bsky.app/fake.m3u8'}
+		return {'post': post}
+
+	feeds = {DEFAULT_FEED: [make_post(i, 0) for i in range(post_count)]}
+	for feed_number, name in enumerate(extra_feeds, start=1):
+		feeds[name] = [rng.choice(feeds[DEFAULT_FEED]) if rng.random() < crosspost_share else make_post(i, feed_number) for i in range(post_count)]
+	likes = {}
+	if liker_overlap > 0:
+		regulars = [make_liker(f'regular{i:05d}', rng.random() < 1 / 3) for i in range(max(50, post_count // 2))]
+		for posts in feeds.values():
+			for item in posts:
+				post = item['post']
+				overlap = min(1.0, rng.uniform(0, 2 * liker_overlap))
+				key = post['uri'].rsplit('/', 1)[-1]
+				likes[post['uri']] = [rng.choice(regulars) if rng.random() < overlap else make_liker(f'{key}x{i:05d}') for i in range(post['likeCount'])]
+	return feeds, likes, images, {}
+
+
+def make_liker(key, known=False):
+	# a getLikes entry. known likers are ones we already follow
+	viewer = {'muted': False}
+	if known:
+		viewer['following'] = f'at://{MY_DID}/app.bsky.graph.follow/{key}'
+	return {
+		'indexedAt': TIMESTAMP,
+		'createdAt': TIMESTAMP,
+		'actor': {'did': f'did:plc:fakeliker{key}', 'handle': f'liker{key}.bsky.social', 'viewer': viewer}
+	}
+
+
+class FakeBluesky:
+	"""local xrpc + cdn server that replays fixtures to a real atproto Client pointed at it with Client(base_url=server.xrpc_url).
+
+	latency is added to every request (in seconds) so concurrency changes show up the way they would against the real network.
+	counts keeps how many times each endpoint was hit (plus how many feed posts were handed out), and records keeps every record the lambdas created.
+	"""
+	def __init__(self, feeds, likes=None, images=None, thumbs=None, latency=0.0, image_latency=None, graph=None, limits=None):
+		self.feeds = feeds
+		# {'followers': [profile json], 'follows': [profile json], 'mutes': [profile json], 'profiles': [profile json], 'missing': [did]} for our account.
+		# getProfile answers with the profile from any of those lists, and with a 'Profile not found' error for the missing dids
+		self.graph = graph or {}
+		self.likes = likes or {}
+		self.images = images or {}
+		self.thumbs = thumbs or {}
+		self.latency = latency
+		self.image_latency = latency if image_latency is None else image_latency
+		self.counts = {}
+		self.records = []
+		self.image_bytes_served = 0
+		self.fail_writes = 0 # the next this many applyWrites calls are answered with a rate limit error
+		# {'reads'|'writes'|'session': (limit, window seconds)} to enforce like bluesky does, with the ratelimit headers on every response and a 429 once a window is used up
+		self.limits = limits or {}
+		self.windows = {} # kind -> [window start, points used]
+		self.access_lifetime = 24 * 60 * 60 # seconds the access tokens are good for. set it under 15 minutes to make the client refresh on its first call
+		self.refresh_tokens = set() # refresh tokens that refreshSession still takes. each one can only be used once, like on bluesky
+		self.lock = threading.Lock()
+		self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler_class())
+		self.server.daemon_threads = True
+		self.base_url = f'http://127.0.0.1:{self.server.server_address[1]}'
+		self.xrpc_url = self.base_url + '/xrpc'
+		self.thread = None
+
+	def __enter__(self):
+		self.start()
+		return self
+
+	def __exit__(self, *exc):
+		self.stop()
+
+	def start(self):
+		self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+		self.thread.start()
+
+	def stop(self):
+		self.server.shutdown()
+		self.server.server_close()
+
+	def reset_counts(self):
+		with self.lock:
+			self.counts = {}
+			self.records = []
+			self.image_bytes_served = 0
+
+	def count(self, name, amount=1):
+		with self.lock:
+			self.counts[name] = self.counts.get(name, 0) + amount
+
+	def created(self, collection):
+		return sum(1 for record in self.records if record.get('collection') == collection and not record.get('deleted'))
+
+	def deleted(self, collection):
+		return sum(1 for record in self.records if record.get('collection') == collection and record.get('deleted'))
+
+	def client_class(self, async_client=False):
+		# an atproto Client (or AsyncClient) that always talks to this server. swap it in for atproto.Client / atproto.AsyncClient before the lambda imports it.
+		# subclasses the original from atproto_client, so swapping in a new server's client doesn't stack on the last one
+		from atproto_client import Client, AsyncClient
+		if async_client:
+			Client = AsyncClient
+		xrpc_url = self.xrpc_url
+
+		class LocalClient(Client):
+			def __init__(self, base_url=None, *args, **kwargs):
+				super().__init__(xrpc_url, *args, **kwargs)
+
+			def _update_pds_endpoint(self, pds_endpoint):
+				pass
+		return LocalClient
+
+	# rewrites the cdn links in a post so the images come from this server instead
+	def local_post(self, post):
+		embed = post.get('embed')
+		if embed and embed.get('$type') == EMBEDDED_PIC:
+			post = json.loads(json.dumps(post))
+			for image in post['embed']['images']:
+				for key in ('thumb', 'fullsize'):
+					image[key] = self.base_url + '/img/' + image[key].split('/img/', 1)[-1]
+		return post
+
+	def feed_posts(self, feed):
+		return self.feeds.get(feed) or self.feeds.get(DEFAULT_FEED) or next(iter(self.feeds.values()), [])
+
+	def find_post(self, uri):
+		for posts in self.feeds.values():
+			for item in posts:
+				if item['post']['uri'] == uri:
+					return item['post']
+		return None
+
+	def post_likes(self, uri):
+		# recorded likes if we have them, otherwise make up as many likers as the post's like count
+		if uri in self.likes:
+			return self.likes[uri]
+		post = self.find_post(uri)
+		like_count = post.get('likeCount', 0) if post else 0
+		key = uri.rsplit('/', 1)[-1]
+		return [{
+			'indexedAt': TIMESTAMP,
+			'createdAt': TIMESTAMP,
+			'actor': {'did': f'did:plc:fakeliker{key}x{i:05d}', 'handle': f'liker{i}.bsky.social', 'viewer': {'muted': False}}
+		} for i in range(like_count)]
+
+	def profile(self, actor):
+		for field in ('profiles', 'followers', 'follows', 'mutes'):
+			for profile in self.graph.get(field, []):
+				if profile['did'] == actor:
+					return profile
+		return {
+			'did': MY_DID if actor in (MY_DID, MY_HANDLE) or not actor.startswith('did:') else actor,
+			'handle': MY_HANDLE if actor in (MY_DID, MY_HANDLE) or not actor.startswith('did:') else f'{actor[-8:]}.bsky.social',
+			'followersCount': 45000,
+			'followsCount': 18000,
+			'viewer': {'muted': False}
+		}
+
+	def rate_limit(self, method, body):
+		# returns (allowed, headers) for a call, taking its points from the fixed window for its kind
+		if method in ('com.atproto.server.createSession', 'com.atproto.server.refreshSession'):
+			kind, cost = 'session', 1
+		elif method.startswith('com.atproto.repo.') and body is not None:
+			kind = 'writes'
+			cost = 3 * len(body.get('writes', [])) if method == 'com.atproto.repo.applyWrites' else (3 if method == 'com.atproto.repo.createRecord' else 1)
+		else:
+			kind, cost = 'reads', 1
+		if kind not in self.limits:
+			return True, {}
+		limit, window = self.limits[kind]
+		with self.lock:
+			now = time.time()
+			start, used = self.windows.get(kind, (now, 0))
+			if now >= start + window:
+				start, used = now, 0
+			allowed = used + cost <= limit
+			if allowed:
+				used += cost
+			self.windows[kind] = (start, used)
+		return allowed, {
+			'ratelimit-limit': str(limit),
+			'ratelimit-remaining': str(limit - used),
+			'ratelimit-reset': str(int(start + window) + 1),
+			'ratelimit-policy': f'{limit};w={window}'
+		}
+
+	def page(self, items, params, key):
+		start = int(params.get('cursor') or 0)
+		limit = int(params.get('limit') or 50)
+		end = start + limit
+		response = {key: items[start:end]}
+		if end < len(items):
+			response['cursor'] = str(end)
+		return response
+
+	def revoke_sessions(self):
+		# every session handed out so far stops refreshing, so the next run has to log in with the password
+		with self.lock:
+			self.refresh_tokens.clear()
+
+	def new_session(self):
+		refresh_jwt = make_jwt(MY_DID, 60 * 24 * 60 * 60)
+		with self.lock:
+			self.refresh_tokens.add(refresh_jwt)
+		return {'did': MY_DID, 'handle': MY_HANDLE, 'accessJwt': make_jwt(MY_DID, self.access_lifetime), 'refreshJwt': refresh_jwt}
+
+	def xrpc(self, method, params, body, auth=None):
+		# returns (status, json) for one xrpc call. auth is the Authorization header
+		self.count(method)
+		if method == 'com.atproto.server.createSession':
+			return 200, self.new_session()
+		if method == 'com.atproto.server.refreshSession':
+			token = (auth or '')[len('Bearer '):]
+			with self.lock:
+				valid = token in self.refresh_tokens
+				self.refresh_tokens.discard(token)
+			if not valid:
+				return 400, {'error': 'ExpiredToken', 'message': 'Token has been revoked'}
+			return 200, self.new_session()
+		if method == 'com.atproto.server.getSession':
+			return 200, {'did': MY_DID, 'handle': MY_HANDLE}
+		if method == 'app.bsky.actor.getProfile':
+			if params.get('actor') in self.graph.get('missing', []):
+				return 400, {'error': 'InvalidRequest', 'message': 'Profile not found'}
+			return 200, self.profile(params.get('actor', ''))
+		if method == 'app.bsky.actor.getProfiles':
+			return 200, {'profiles': [self.profile(actor) for actor in params.get('actors', []) if actor not in self.graph.get('missing', [])]}
+		if method == 'app.bsky.feed.getFeed':
+			response = self.page(self.feed_posts(params.get('feed')), params, 'feed')
+			response['feed'] = [{'post': self.local_post(item['post'])} for item in response['feed']]
+			self.count('feed posts', len(response['feed']))
+			return 200, response
+		if method == 'app.bsky.feed.getPosts':
+			posts = [self.find_post(uri) for uri in params.get('uris', [])]
+			self.count('feed posts', sum(1 for post in posts if post is not None))
+			return 200, {'posts': [self.local_post(post) for post in posts if post is not None]}
+		if method == 'app.bsky.feed.getLikes':
+			response = self.page(self.post_likes(params.get('uri')), params, 'likes')
+			response['uri'] = params.get('uri')
+			return 200, response
+		if method == 'com.atproto.repo.createRecord':
+			with self.lock:
+				self.records.append(body)
+				rkey = f'fake{len(self.records):08d}'
+			return 200, {'uri': f'at://{MY_DID}/{body["collection"]}/{rkey}', 'cid': f'bafyreifakerecord{rkey}'}
+		if method == 'com.atproto.repo.applyWrites':
+			if self.fail_writes > 0:
+				with self.lock:
+					self.fail_writes -= 1
+				return 429, {'error': 'RateLimitExceeded', 'message': 'Rate Limit Exceeded'}
+			results = []
+			with self.lock:
+				for write in body['writes']:
+					self.records.append({'collection': write['collection'], 'record': write['value']})
+					rkey = f'fake{len(self.records):08d}'
+					results.append({'$type': 'com.atproto.repo.applyWrites#createResult', 'uri': f'at://{MY_DID}/{write["collection"]}/{rkey}', 'cid': f'bafyreifakerecord{rkey}'})
+			return 200, {'commit': {'cid': 'bafyreifakecommit', 'rev': 'fake'}, 'results': results}
+		if method == 'com.atproto.repo.deleteRecord':
+			with self.lock:
+				self.records.append(dict(body, deleted=True))
+			return 200, {}
+		if method == 'app.bsky.graph.getFollowers':
+			response = self.page(self.graph.get('followers', []), params, 'followers')
+			response['subject'] = self.profile(params.get('actor', ''))
+			return 200, response
+		if method == 'app.bsky.graph.getFollows':
+			response = self.page(self.graph.get('follows', []), params, 'follows')
+			response['subject'] = self.profile(params.get('actor', ''))
+			return 200, response
+		if method == 'app.bsky.graph.getMutes':
+			return 200, self.page(self.graph.get('mutes', []), params, 'mutes')
+		if method == 'app.bsky.graph.muteActor':
+			with self.lock:
+				self.graph.setdefault('mutes', []).append(self.profile(body['actor']))
+			return 200, {}
+		return 501, {'error': 'MethodNotImplemented', 'message': f'{method} is not faked'}
+
+	def _handler_class(self):
+		fake = self
+
+		class Handler(BaseHTTPRequestHandler):
+			protocol_version = 'HTTP/1.1'
+			# headers and body go out in one write, otherwise keep-alive connections stall on delayed acks and the fake looks slower than bluesky
+			wbufsize = 64 * 1024
+			disable_nagle_algorithm = True
+
+			def log_message(self, *args):
+				pass
+
+			def send_json(self, status, payload, headers=None):
+				data = json.dumps(payload).encode()
+				self.send_response(status)
+				for name, value in (headers or {}).items():
+					self.send_header(name, value)
+				self.send_header('Content-Type', 'application/json')
+				self.send_header('Content-Length', str(len(data)))
+				self.end_headers()
+				self.wfile.write(data)
+
+			def handle_request(self, body):
+				url = urlparse(self.path)
+				if url.path.startswith('/img/'):
+					time.sleep(fake.image_latency)
+					fake.count('cdn')
+					blob = url.path.rsplit('/', 1)[-1].split('@', 1)[0]
+					data = fake.thumbs.get(blob) if url.path.startswith('/img/feed_thumbnail/') else None
+					data = data or fake.images.get(blob)
+					if data is None:
+						self.send_json(404, {'error': 'NotFound'})
+						return
+					with fake.lock:
+						fake.image_bytes_served += len(data)
+					self.send_response(200)
+					self.send_header('Content-Type', 'image/jpeg')
+					self.send_header('Content-Length', str(len(data)))
+					self.end_headers()
+					self.wfile.write(data)
+					return
+				if not url.path.startswith('/xrpc/'):
+					self.send_json(404, {'error': 'NotFound'})
+					return
+				time.sleep(fake.latency)
+				params = {key: values if key in LIST_PARAMS else values[0] for key, values in parse_qs(url.query).items()}
+				method = url.path[len('/xrpc/'):]
+				allowed, headers = fake.rate_limit(method, body)
+				if not allowed:
+					fake.count('429')
+					self.send_json(429, {'error': 'RateLimitExceeded', 'message': 'Rate Limit Exceeded'}, headers)
+					return
+				status, payload = fake.xrpc(method, params, body, self.headers.get('Authorization'))
+				self.send_json(status, payload, headers)
+
+			def do_GET(self):
+				self.handle_request(None)
+
+			def do_POST(self):
+				length = int(self.headers.get('Content-Length') or 0)
+				raw = self.rfile.read(length) if length else b''
+				self.handle_request(json.loads(raw) if raw else {})
+
+		return Handler
+
+
+class FakeJetstream:
+	"""local websocket stand-in for jetstream's /subscribe, sending the fixture posts as commit events with the same record they'd have on the pds.
+
+	every post is sent in order with its own time_us, mixed in with about noise events per post of the kinds the lambda has to skip over (text
+	only posts, replies with other words, likes and identity events). the wantedCollections, wantedDids and cursor params work like jetstream's,
+	and once everything after the cursor has been sent the connection is closed normally. drop_after closes the first connection without a close
+	frame after that many events, to check the lambda picks the stream back up.
+	"""
+	def __init__(self, posts, noise=1, seed=0, start_us=None, drop_after=None):
+		from websockets.sync.server import serve
+		rng = random.Random(seed)
+		start_us = start_us if start_us is not None else int(time.time() * 1e6) - 60 * 60 * 1000000
+		self.events = []
+		for item in posts:
+			for _ in range(noise):
+				self.events.append(noise_event(rng))
+			self.events.append(post_event(item['post']))
+		for i, event in enumerate(self.events):
+			event['time_us'] = start_us + i * 1000
+		self.drop_after = drop_after
+		self.connections = 0
+		self.sent = 0
+		self.server = serve(self.handle, '127.0.0.1', 0)
+		self.url = f'ws://127.0.0.1:{self.server.socket.getsockname()[1]}/subscribe'
+		self.thread = None
+
+	def __enter__(self):
+		self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+		self.thread.start()
+		return self
+
+	def __exit__(self, *exc):
+		self.server.shutdown()
+
+	def handle(self, websocket):
+		params = parse_qs(urlparse(websocket.request.path).query)
+		collections = set(params.get('wantedCollections', []))
+		dids = set(params.get('wantedDids', []))
+		cursor = int(params['cursor'][0]) if 'cursor' in params else 0
+		self.connections += 1
+		drop_after = self.drop_after if self.connections == 1 else None
+		for event in self.events:
+			if event['time_us'] < cursor:
+				continue
+			if event['kind'] == 'commit' and len(collections) > 0 and event['commit']['collection'] not in collections:
+				continue
+			if len(dids) > 0 and event['did'] not in dids:
+				continue
+			websocket.send(json.dumps(event))
+			self.sent += 1
+			if drop_after is not None:
+				drop_after -= 1
+				if drop_after <= 0:
+					websocket.socket.shutdown(socket.SHUT_RDWR)
+					return
+		websocket.close(1000)
+
+
+def post_event(post):
+	# the jetstream commit event for a post view, with its record and image blobs the way they'd be on the pds
+	did, _, rkey = post['uri'][len('at://'):].split('/')
+	record = dict(post['record'])
+	embed = post.get('embed') or {}
+	if embed.get('$type') == EMBEDDED_PIC:
+		record['embed'] = {'$type': 'app.bsky.embed.images', 'images': [{
+			'alt': image.get('alt', ''),
+			'image': {'$type': 'blob', 'ref': {'$link': image['fullsize'].rsplit('/', 1)[-1].split('@', 1)[0]}, 'mimeType': 'image/jpeg', 'size': 100000}
+		} for image in embed['images']]}
+	elif embed.get('$type') == EMBEDDED_VID:
+		record['embed'] = {'$type': 'app.bsky.embed.video', 'video': {'$type': 'blob', 'ref': {'$link': embed['cid']}, 'mimeType': 'video/mp4', 'size': 1000000}}
+	return {'did': did, 'kind': 'commit', 'commit': {'rev': 'fake', 'operation': 'create', 'collection': 'app.bsky.feed.post', 'rkey': rkey, 'record': record, 'cid': post['cid']}}
+
+
+def noise_event(rng):
+	did = f'did:plc:fakenoise{rng.randint(0, 99999):05d}'
+	kind = rng.choice(['text', 'dog', 'like', 'identity'])
+	if kind == 'identity':
+		return {'did': did, 'kind': 'identity', 'identity': {'did': did, 'handle': 'noise.bsky.social', 'seq': 1, 'time': TIMESTAMP}}
+	if kind == 'like':
+		return {'did': did, 'kind': 'commit', 'commit': {'rev': 'fake', 'operation': 'create', 'collection': 'app.bsky.feed.like', 'rkey': f'noise{rng.randint(0, 99999)}',
+			'record': {'$type': 'app.bsky.feed.like', 'subject': {'uri': 'at://did:plc:fake/app.bsky.feed.post/fake', 'cid': 'bafyreifake'}, 'createdAt': TIMESTAMP}, 'cid': 'bafyreifakenoise'}}
+	record = {'$type': 'app.bsky.feed.post', 'text': 'good morning everyone' if kind == 'text' else 'look at my dog', 'createdAt': TIMESTAMP}
+	if kind == 'dog':
+		record['embed'] = {'$type': 'app.bsky.embed.images', 'images': [{'alt': 'a dog', 'image': {'$type': 'blob', 'ref': {'$link': 'bafkreifakedog'}, 'mimeType': 'image/jpeg', 'size': 100000}}]}
+	return {'did': did, 'kind': 'commit', 'commit': {'rev': 'fake', 'operation': 'create', 'collection': 'app.bsky.feed.post', 'rkey': f'noise{rng.randint(0, 99999)}', 'record': record, 'cid': f'bafyreifakenoise{rng.randint(0, 99999)}'}}
+
+
+class FakeTable:
+	# just enough of a boto3 dynamodb Table for the lambdas. items are {primary key value: item dict}, or {(partition, sort): item dict} with a sort key
+	def __init__(self, items=None, key_names=('DOW',), page_size=10):
+		self.items = items if items is not None else {}
+		self.key_names = key_names
+		self.page_size = page_size
+		self.counts = {}
+
+	def count(self, name):
+		self.counts[name] = self.counts.get(name, 0) + 1
+
+	def key_of(self, item):
+		if len(self.key_names) == 1:
+			return item[self.key_names[0]]
+		return tuple(item[name] for name in self.key_names)
+
+	def get_item(self, Key, **kwargs):
+		self.count('get_item')
+		response = {'ResponseMetadata': {'HTTPStatusCode': 200}}
+		key = self.key_of(Key)
+		if key in self.items:
+			response['Item'] = self.items[key]
+		return response
+
+	def put_item(self, Item, **kwargs):
+		self.count('put_item')
+		self.items[self.key_of(Item)] = dict(Item)
+		return {'ResponseMetadata': {'HTTPStatusCode': 200}}
+
+	def update_item(self, Key, UpdateExpression, ExpressionAttributeNames=None, ExpressionAttributeValues=None, **kwargs):
+		# only handles the 'SET #a = :a, #b = :b' form the lambdas use, optionally followed by 'REMOVE #c, #d'
+		self.count('update_item')
+		item = self.items.setdefault(self.key_of(Key), dict(Key))
+		names = ExpressionAttributeNames or {}
+		set_part, _, remove_part = UpdateExpression.strip()[len('SET '):].partition(' REMOVE ')
+		for assignment in set_part.split(','):
+			name, value = [part.strip() for part in assignment.split('=')]
+			item[names.get(name, name)] = (ExpressionAttributeValues or {})[value]
+		for name in remove_part.split(','):
+			if name.strip() != '':
+				item.pop(names.get(name.strip(), name.strip()), None)
+		return {'ResponseMetadata': {'HTTPStatusCode': 200}}
+
+	def delete_item(self, Key, **kwargs):
+		self.count('delete_item')
+		self.items.pop(self.key_of(Key), None)
+		return {'ResponseMetadata': {'HTTPStatusCode': 200}}
+
+	def query(self, KeyConditionExpression, ExpressionAttributeNames=None, ExpressionAttributeValues=None, ExclusiveStartKey=None, Limit=None, **kwargs):
+		# only handles '#p = :p' on the partition key. pages are cut at page_size items like dynamodb cuts them at 1MB
+		self.count('query')
+		name, value = [part.strip() for part in KeyConditionExpression.split('=')]
+		partition = (ExpressionAttributeValues or {})[value]
+		keys = sorted(key for key in self.items if key[0] == partition)
+		if ExclusiveStartKey is not None:
+			keys = [key for key in keys if key > self.key_of(ExclusiveStartKey)]
+		page = keys[ : min(Limit or self.page_size, self.page_size)]
+		response = {'Items': [dict(self.items[key]) for key in page], 'ResponseMetadata': {'HTTPStatusCode': 200}}
+		if len(page) < len(keys):
+			response['LastEvaluatedKey'] = dict(zip(self.key_names, page[-1]))
+		return response
+
+	def batch_writer(self, **kwargs):
+		table = self
+
+		class BatchWriter:
+			# counts a batch_write_item per 25 requests, like boto3's
+			def __init__(self):
+				self.pending = 0
+
+			def __enter__(self):
+				return self
+
+			def __exit__(self, *exc):
+				if self.pending > 0:
+					table.count('batch_write_item')
+
+			def request(self):
+				self.pending += 1
+				if self.pending == 25:
+					table.count('batch_write_item')
+					self.pending = 0
+
+			def put_item(self, Item):
+				table.items[table.key_of(Item)] = dict(Item)
+				self.request()
+
+			def delete_item(self, Key):
+				table.items.pop(table.key_of(Key), None)
+				self.request()
+
+		return BatchWriter()
+
+
+class FakeClientError(Exception):
+	def __init__(self, code):
+		super().__init__(code)
+		self.response = {'Error': {'Code': code}}
+
+
+class FakeS3:
+	# in memory s3 client for a single bucket. objects are {key: bytes}
+	exceptions = SimpleNamespace(ClientError=FakeClientError)
+
+	def __init__(self, objects=None):
+		self.objects = objects if objects is not None else {}
+		self.bytes_read = 0
+		self.bytes_written = 0
+
+	def list_buckets(self):
+		return {'Buckets': [{'Name': 'rickybot-s3'}]}
+
+	def list_objects_v2(self, Bucket, **kwargs):
+		return {'Contents': [{'Key': key, 'Size': len(value)} for key, value in self.objects.items()]}
+
+	def head_object(self, Bucket, Key):
+		if Key not in self.objects:
+			raise FakeClientError('404')
+		return {'ContentLength': len(self.objects[Key]), 'ETag': f'"{hashlib.md5(self.objects[Key]).hexdigest()}"'}
+
+	def get_object(self, Bucket, Key, Range=None):
+		if Key not in self.objects:
+			raise FakeClientError('NoSuchKey')
+		data = self.objects[Key]
+		if Range:
+			start, end = Range[len('bytes='):].split('-')
+			data = data[int(start):int(end) + 1 if end else None]
+		self.bytes_read += len(data)
+		return {'Body': BytesIO(data), 'ContentLength': len(data)}
+
+	def put_object(self, Bucket, Key, Body, **kwargs):
+		data = Body.encode() if isinstance(Body, str) else bytes(Body)
+		self.bytes_written += len(data)
+		self.objects[Key] = data
+		return {'ETag': f'"{hashlib.md5(data).hexdigest()}"'}
+
+	def delete_object(self, Bucket, Key):
+		self.objects.pop(Key, None)
+		return {}
+
+
+class FakeAWS:
+	"""boto3 stand-in. install() puts it in sys.modules so the `import boto3` inside the handlers picks it up.
+
+	secrets is the secret map the handlers read from secrets manager, table, follows_table and s3 are the fakes above.
+	"""
+	def __init__(self, secrets, table=None, s3=None, follows_table=None):
+		self.secrets = secrets
+		self.table = table if table is not None else FakeTable()
+		self.follows_table = follows_table if follows_table is not None else FakeTable(key_names=('COHORT', 'RUN'))
+		self.s3 = s3 if s3 is not None else FakeS3()
+		aws = self
+
+		class Session:
+			def client(self, name, **kwargs):
+				if name == 'secretsmanager':
+					return SimpleNamespace(get_secret_value=lambda SecretId: {'SecretString': json.dumps(aws.secrets)})
+				if name == 's3':
+					return aws.s3
+				raise ValueError(f'{name} is not faked')
+
+			def resource(self, name, **kwargs):
+				return SimpleNamespace(Table=lambda table_name: aws.follows_table if table_name == 'rickybot-follows' else aws.table)
+
+		self.module = SimpleNamespace(session=SimpleNamespace(Session=Session))
+
+	def install(self):
+		sys.modules['boto3'] = self.module
+
+
+class FakeGithub:
+	# stands in for the requests module inside a lambda module, only for the github logging calls. the appended log text is kept in logs
+	def __init__(self):
+		self.logs = []
+		self.content = ''
+
+	def get(self, url, headers=None, **kwargs):
+		content = base64.b64encode(self.content.encode()).decode()
+		return SimpleNamespace(status_code=200, json=lambda: {'sha': 'fake', 'content': content})
+
+	def put(self, url, headers=None, json=None, **kwargs):
+		new_content = base64.b64decode(json['content']).decode()
+		self.logs.append(new_content[len(self.content):])
+		self.content = new_content
+		return SimpleNamespace(status_code=200, json=lambda: {})
@@ -0,0 +1,98 @@
+"""record_feed.py
+records real feed pages, likes and image bytes into a fixture folder that tools/fake_services.py can replay, so the lambdas can be benchmarked offline on real data.
+	the pages are saved exactly as the api returned them (camelCase json), the images are saved by blob cid.
+	the password is read from the BSKY_PASSWORD environment variable so it doesn't end up in the shell history.
+
+	usage:
+		BSKY_PASSWORD=... python tools/record_feed.py fixtures/cats --handle rickybot.bsky.social --posts 500
+		BSKY_PASSWORD=... python tools/record_feed.py fixtures/cats --feed at://did:plc:.../app.bsky.feed.generator/cats --likes 200 --thumbs
+"""
+import argparse
+import json
+import os
+import sys
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from fake_services import EMBEDDED_PIC
+
+DEFAULT_FEED = 'at://did:plc:jfhpnnst6flqway4eaeqzj2a/app.bsky.feed.generator/cats'
+
+
+def record_pages(fetch_page, key, limit):
+	# keeps asking for pages until we have limit items or the cursor runs out
+	items = []
+	cursor = None
+	while len(items) < limit:
+		page = fetch_page(min(100, limit - len(items)), cursor)
+		items += page[key]
+		cursor = page.get('cursor')
+		if not cursor or not page[key]:
+			break
+	return items
+
+
+def save_image(url, folder):
+	blob = url.rsplit('/', 1)[-1].split('@', 1)[0]
+	path = os.path.join(folder, blob)
+	if os.path.exists(path):
+		return 0
+	response = requests.get(url, timeout=(5, 20))
+	response.raise_for_status()
+	with open(path, 'wb') as f:
+		f.write(response.content)
+	return len(response.content)
+
+
+def main():
+	parser = argparse.ArgumentParser(description='record feed pages, likes and images for offline benchmarks')
+	parser.add_argument('fixture_dir', help='folder to write feeds.json, likes.json and images/ into')
+	parser.add_argument('--handle', required=True, help='bluesky handle to log in with')
+	parser.add_argument('--feed', action='append', help='feed uri to record, can be given more than once. defaults to the cats feed')
+	parser.add_argument('--posts', type=int, default=300, help='how many posts to record per feed')
+	parser.add_argument('--likes', type=int, default=100, help='how many likes to record for each post that has any, 0 to skip')
+	parser.add_argument('--thumbs', action='store_true', help='also save the thumbnails, for benchmarking the thumb fetch mode')
+	args = parser.parse_args()
+
+	from atproto import Client, models
+
+	client = Client()
+	client.login(args.handle, os.environ['BSKY_PASSWORD'])
+
+	image_dir = os.path.join(args.fixture_dir, 'images')
+	thumb_dir = os.path.join(args.fixture_dir, 'thumbs')
+	os.makedirs(image_dir, exist_ok=True)
+	if args.thumbs:
+		os.makedirs(thumb_dir, exist_ok=True)
+
+	feeds = {}
+	likes = {}
+	image_bytes = 0
+	for feed in args.feed or [DEFAULT_FEED]:
+		def fetch_feed_page(limit, cursor):
+			return models.get_model_as_dict(client.app.bsky.feed.get_feed({'feed': feed, 'limit': limit, 'cursor': cursor}))
+		feeds[feed] = record_pages(fetch_feed_page, 'feed', args.posts)
+		print(f'{feed}: {len(feeds[feed])} posts')
+
+		for item in feeds[feed]:
+			post = item['post']
+			embed = post.get('embed') or {}
+			if embed.get('$type') == EMBEDDED_PIC:
+				image_bytes += save_image(embed['images'][0]['fullsize'], image_dir)
+				if args.thumbs:
+					image_bytes += save_image(embed['images'][0]['thumb'], thumb_dir)
+			if args.likes and post.get('likeCount') and post['uri'] not in likes:
+				def fetch_likes_page(limit, cursor):
+					return models.get_model_as_dict(client.app.bsky.feed.get_likes({'uri': post['uri'], 'limit': limit, 'cursor': cursor}))
+				likes[post['uri']] = record_pages(fetch_likes_page, 'likes', args.likes)
+
+	with open(os.path.join(args.fixture_dir, 'feeds.json'), 'w') as f:
+		json.dump(feeds, f)
+	with open(os.path.join(args.fixture_dir, 'likes.json'), 'w') as f:
+		json.dump(likes, f)
+	print(f'recorded {sum(len(posts) for posts in feeds.values())} posts, likes for {len(likes)} posts and {image_bytes / 1e6:.1f}MB of images into {args.fixture_dir}')
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,119 @@
+"""startup_benchmark.py
+measures the cold start cost of each lambda module, so we can see what the imports are costing us and track it over time.
+	for every module it starts a fresh python process (like a cold lambda container) a few times and reports the medians of:
+		import: time to import the module
+		first handler line: time from process start until the first line of lambda_handler runs (interpreter startup + import + call)
+	it also runs the module once under python -X importtime and lists the slowest of its direct imports.
+	the handler is stopped as soon as its first line is reached, so nothing talks to aws or bluesky.
+
+	usage:
+		python tools/startup_benchmark.py
+		python tools/startup_benchmark.py --runs 10 --json startup.json rickybot_lambda_delete
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+MODULES = [
+	'rickybot_lambda_add_follows',
+	'rickybot_lambda_delete',
+	'rickybot_lambda_status_update',
+	'rickybot_lambda_aggregator'
+]
+
+# this runs in the child process. it imports the module, then traces calls until lambda_handler's first line and bails out right there
+CHILD_SCRIPT = '''
+import importlib, json, sys, time
+process_start = float(sys.argv[2])
+import_start = time.time()
+module = importlib.import_module(sys.argv[1])
+import_done = time.time()
+handler_code = module.lambda_handler.__code__
+
+class ReachedHandler(Exception):
+	pass
+
+def tracer(frame, event, arg):
+	if event == 'call' and frame.f_code is handler_code:
+		raise ReachedHandler()
+	return None
+
+sys.settrace(tracer)
+try:
+	module.lambda_handler({}, None)
+except ReachedHandler:
+	pass
+first_line = time.time()
+sys.settrace(None)
+print(json.dumps({'import_s': import_done - import_start, 'first_handler_line_s': first_line - process_start}))
+'''
+
+
+def measure_once(module):
+	process_start = time.time()
+	result = subprocess.run([sys.executable, '-c', CHILD_SCRIPT, module, repr(process_start)], cwd=REPO_ROOT, capture_output=True, text=True)
+	if result.returncode != 0:
+		raise RuntimeError(f'{module} failed to start:\n{result.stderr.strip()}')
+	return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(module, top):
+	# -X importtime writes "import time: self [us] | cumulative | imported package" lines to stderr, children before their parent and indented two spaces per level.
+	# we want the module's direct imports, which are the one-level-deep lines right before the module's own line
+	result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=REPO_ROOT, capture_output=True, text=True)
+	direct = []
+	imports = []
+	for line in result.stderr.splitlines():
+		if not line.startswith('import time:') or 'cumulative' in line:
+			continue
+		self_us, cumulative_us, name = line[len('import time:'):].split('|')
+		depth = (len(name) - len(name.lstrip()) - 1) // 2
+		if depth == 0:
+			if name.strip() == module:
+				imports = direct
+			direct = []
+		elif depth == 1:
+			direct.append((int(cumulative_us.strip()), name.strip()))
+	imports.sort(reverse=True)
+	return [{'module': name, 'cumulative_ms': us / 1000} for us, name in imports[:top]]
+
+
+def main():
+	parser = argparse.ArgumentParser(description='measure import time and time to first handler line for the lambdas')
+	parser.add_argument('modules', nargs='*', default=MODULES, help='lambda modules to measure, defaults to all four')
+	parser.add_argument('--runs', type=int, default=5, help='fresh processes per module, the median is reported')
+	parser.add_argument('--top', type=int, default=5, help='how many of the slowest imports to list per module')
+	parser.add_argument('--json', help='also write the results to this file')
+	args = parser.parse_args()
+
+	results = {}
+	for module in args.modules:
+		try:
+			runs = [measure_once(module) for _ in range(args.runs)]
+		except RuntimeError as e:
+			print(e)
+			results[module] = {'error': str(e)}
+			continue
+		results[module] = {
+			'import_ms': statistics.median(r['import_s'] for r in runs) * 1000,
+			'first_handler_line_ms': statistics.median(r['first_handler_line_s'] for r in runs) * 1000,
+			'runs': args.runs,
+			'slowest_imports': slowest_imports(module, args.top)
+		}
+		print(f'{module}: import {results[module]["import_ms"]:.1f} ms | first handler line {results[module]["first_handler_line_ms"]:.1f} ms (median of {args.runs})')
+		for entry in results[module]['slowest_imports']:
+			print(f'    {entry["cumulative_ms"]:8.1f} ms  {entry["module"]}')
+
+	if args.json:
+		with open(args.json, 'w') as f:
+			json.dump(results, f, indent=2)
+	return 1 if any('error' in r for r in results.values()) else 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,109 @@
+"""vision_parity.py
+compares the cat/not-cat verdicts of the fullsize image path against the thumbnail + reduced decode path on a labeled set of images,
+so we can check that switching the add follows lambda's image_fetch_mode secret to 'thumb' doesn't change who gets followed.
+	also reports the bytes downloaded and the download/decode time per image for each path.
+
+	the labeled set is a json lines file, one image per line:
+		{"fullsize": "https://cdn.bsky.app/img/feed_fullsize/...", "thumb": "https://cdn.bsky.app/img/feed_thumbnail/...", "cat": true}
+	"cat" is optional, it's whether a person looked at it and called it a real cat pic. when it's there we also report accuracy.
+
+	usage:
+		python tools/vision_parity.py labeled_images.jsonl --model ./vit
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+# run from the repo root or from tools/, either way rickybot_vision needs to be importable
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import requests
+import torch
+from transformers import ViTImageProcessor, ViTForImageClassification
+
+from rickybot_vision import fetch_image_bytes, decode_image, preprocess_image, score_batch, FETCH_FULLSIZE, FETCH_THUMB
+
+
+def load_labeled_set(path):
+	entries = []
+	with open(path) as f:
+		for line in f:
+			line = line.strip()
+			if line:
+				entries.append(json.loads(line))
+	return entries
+
+
+def run_path(entries, fetch_mode, feature_extractor, model, session):
+	# classifies every entry one at a time so the timings are per image. returns one dict per entry
+	results = []
+	reduced = fetch_mode == FETCH_THUMB
+	for entry in entries:
+		url = entry.get(fetch_mode) or entry['fullsize']
+		result = {'url': url, 'verdict': None, 'bytes': 0, 'download_s': 0.0, 'decode_s': 0.0, 'error': None}
+		try:
+			start = time.perf_counter()
+			image_data = fetch_image_bytes(url, session)
+			result['download_s'] = time.perf_counter() - start
+			result['bytes'] = len(image_data)
+			start = time.perf_counter()
+			pixel_values = preprocess_image(decode_image(image_data, reduced), feature_extractor)
+			result['decode_s'] = time.perf_counter() - start
+			with torch.inference_mode():
+				logits = model(pixel_values).logits
+			result['verdict'] = score_batch(logits)[0].passed
+		except Exception as e:
+			result['error'] = f'{repr(e)}: {e}'
+		results.append(result)
+	return results
+
+
+def summarize(name, entries, results):
+	ok = [r for r in results if r['error'] is None]
+	count = max(len(ok), 1)
+	line = f'{name}: {len(ok)}/{len(results)} classified | avg {sum(r["bytes"] for r in ok) / count / 1024:.1f} KB | avg download {sum(r["download_s"] for r in ok) / count * 1000:.1f} ms | avg decode+preprocess {sum(r["decode_s"] for r in ok) / count * 1000:.1f} ms'
+	labeled = [(e['cat'], r['verdict']) for e, r in zip(entries, results) if 'cat' in e and r['error'] is None]
+	accuracy = None
+	if labeled:
+		accuracy = sum(1 for label, verdict in labeled if label == verdict) / len(labeled)
+		line += f' | accuracy {accuracy * 100:.2f}% on {len(labeled)} labeled'
+	print(line)
+	return accuracy
+
+
+def main():
+	parser = argparse.ArgumentParser(description='compare fullsize vs thumbnail cat verdicts on a labeled image set')
+	parser.add_argument('labeled_set', help='json lines file of {"fullsize", "thumb", "cat"} entries')
+	parser.add_argument('--model', default='./vit', help='folder with the ViT config, weights and preprocessor config')
+	parser.add_argument('--min-agreement', type=float, default=0.98, help='fail if fewer than this fraction of verdicts match')
+	parser.add_argument('--max-accuracy-drop', type=float, default=0.01, help='fail if thumb accuracy is this much below fullsize accuracy')
+	args = parser.parse_args()
+
+	entries = load_labeled_set(args.labeled_set)
+	feature_extractor = ViTImageProcessor.from_pretrained(args.model, local_files_only=True)
+	model = ViTForImageClassification.from_pretrained(args.model, local_files_only=True)
+	session = requests.Session()
+
+	fullsize_results = run_path(entries, FETCH_FULLSIZE, feature_extractor, model, session)
+	thumb_results = run_path(entries, FETCH_THUMB, feature_extractor, model, session)
+	fullsize_accuracy = summarize(FETCH_FULLSIZE, entries, fullsize_results)
+	thumb_accuracy = summarize(FETCH_THUMB, entries, thumb_results)
+
+	compared = [(f, t) for f, t in zip(fullsize_results, thumb_results) if f['error'] is None and t['error'] is None]
+	mismatches = [(f, t) for f, t in compared if f['verdict'] != t['verdict']]
+	agreement = (len(compared) - len(mismatches)) / max(len(compared), 1)
+	print(f'agreement: {agreement * 100:.2f}% of {len(compared)} images classified by both paths')
+	for f, t in mismatches:
+		print(f'  MISMATCH fullsize={f["verdict"]} thumb={t["verdict"]} {f["url"]}')
+
+	passed = agreement >= args.min_agreement
+	if fullsize_accuracy is not None and thumb_accuracy is not None and fullsize_accuracy - thumb_accuracy > args.max_accuracy_drop:
+		passed = False
+	print('PARITY OK' if passed else 'PARITY FAILED')
+	return 0 if passed else 1
+
+
+if __name__ == '__main__':
+	sys.exit(main())